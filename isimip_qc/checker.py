@@ -0,0 +1,182 @@
+import threading
+import time
+from pathlib import Path
+
+from .checks import checks
+from .config import Settings
+from .exceptions import FileCritical, FileError, FileWarning
+from .models import File, Finding
+from .utils.netcdf import netcdf_lock
+
+WRONG_SUFFIX = 'File has wrong suffix. Use "%s" for this simulation round'
+OPEN_FAILED = 'File could not be opened: %s'
+
+LEVELS = ['infos', 'warnings', 'errors', 'criticals']
+
+# the protocols of all Checkers of this process, they are fetched once and then only read
+protocols = {}
+protocols_lock = threading.Lock()
+
+
+class Checker(object):
+    '''
+    Checks files for one schema_path, independent of the settings of the command line:
+
+        checker = Checker('ISIMIP3b/OutputData/water_global', {'minmax': 10})
+        result = checker.check('/path/to/file.nc')
+
+    The options are the lower case names of Settings.API_OPTIONS, the files are only
+    checked and never fixed, moved or copied. Checkers for different schema_paths can
+    be used in one process and check() can be called from many threads at once, since
+    the settings and the protocol of a Checker are only read by the checks.
+
+    The netCDF library itself is not thread-safe, so the checks are serialized: every
+    check holds netcdf_lock of all Checkers of the process. Only the processing of the
+    slabs of the data checks (--minmax, --sample) runs in parallel with other threads,
+    the reads of the slabs are serialized, too. For checks of many files in parallel,
+    use processes (e.g. a ProcessPoolExecutor with a Checker per process).
+    '''
+
+    def __init__(self, schema_path, options=None):
+        self.settings = Settings(shared=False)
+
+        with protocols_lock:
+            if not self.settings.configure(schema_path, options or {}, protocols):
+                raise ValueError('No protocol found for schema_path "{}".'.format(schema_path))
+
+    def check(self, file_path):
+        start = time.time()
+
+        file_path = Path(file_path).expanduser()
+        if not file_path.is_absolute() and self.settings.UNCHECKED_PATH is not None:
+            file_path = self.settings.UNCHECKED_PATH / file_path
+
+        result = get_check_result(file_path, self.settings)
+        return Result(file_path, self.settings.SCHEMA_PATH, result, time.time() - start)
+
+
+class Result(object):
+    '''
+    The result of the check of one file: the findings and the formatted messages for
+    each level, which are only formatted when they are accessed.
+    '''
+
+    def __init__(self, path, schema_path, result, duration):
+        self.path = path
+        self.schema_path = schema_path
+        self.specifiers = result['specifiers']
+        self.findings = result['findings']
+        self.duration = duration
+
+    def __repr__(self):
+        return '<Result {} ({} warnings, {} errors, {} criticals)>'.format(
+            self.path, len(self.warnings), len(self.errors), len(self.criticals))
+
+    @property
+    def infos(self):
+        return self.get_messages('infos')
+
+    @property
+    def warnings(self):
+        return self.get_messages('warnings')
+
+    @property
+    def errors(self):
+        return self.get_messages('errors')
+
+    @property
+    def criticals(self):
+        return self.get_messages('criticals')
+
+    @property
+    def is_clean(self):
+        return not any(finding.level in ['warnings', 'errors', 'criticals'] for finding in self.findings)
+
+    @property
+    def json(self):
+        return get_json_result({
+            'path': str(self.path),
+            'schema_path': self.schema_path.as_posix(),
+            'specifiers': self.specifiers,
+            'findings': self.findings,
+            'duration': self.duration
+        })
+
+    def get_messages(self, level):
+        return [finding.text for finding in self.findings if finding.level == level]
+
+
+def get_check_result(file_path, context):
+    '''
+    Check a file with the settings in context and return the result of the File. The
+    file is only checked and never fixed, moved or copied, and the dataset and the log
+    are closed, also if a check raises an exception.
+    '''
+    if file_path.suffix not in context.PATTERN['suffix']:
+        return get_error_result(WRONG_SUFFIX, context.PATTERN['suffix'][0])
+
+    file = File(file_path, context)
+    file.lock = netcdf_lock
+    file.open_log(console=False)
+    try:
+        file.match()
+        if file.matched:
+            try:
+                with file.locked():
+                    file.open_dataset()
+            except OSError as e:
+                file.critical(OPEN_FAILED, e)
+            else:
+                try:
+                    run_checks(file, checks)
+                finally:
+                    with file.locked():
+                        file.close_dataset()
+    finally:
+        file.close_log()
+
+    return file.result
+
+
+def run_checks(file, selected_checks):
+    for check in selected_checks:
+        if not file.settings.CHECK or check.__name__ == file.settings.CHECK:
+            file.check = check.__name__
+            start = time.perf_counter()
+            try:
+                with file.locked():
+                    check(file)
+            except FileWarning:
+                pass
+            except FileError:
+                pass
+            except FileCritical:
+                pass
+            # checks which are performed again after a fix are counted twice
+            file.durations[check.__name__] = file.durations.get(check.__name__, 0) + time.perf_counter() - start
+            file.check = None
+
+    file.check = 'validate'
+    with file.locked():
+        file.validate()
+    file.check = None
+
+
+def get_error_result(message, *args, level='errors'):
+    return {
+        'specifiers': {},
+        'findings': [Finding(level, None, message, args)]
+    }
+
+
+def get_json_result(result):
+    # the result with the formatted messages for each level and the findings as
+    # (level, check, message template), e.g. for the queue or the server
+    json_result = {key: value for key, value in result.items() if key != 'findings'}
+    json_result.update({level: [] for level in LEVELS})
+    json_result['findings'] = []
+    for finding in result['findings']:
+        json_result[finding.level].append(finding.text)
+        json_result['findings'].append(finding.key)
+
+    return json_result
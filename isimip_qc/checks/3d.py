@@ -1,3 +1,7 @@
+from ..utils.header import reads
+
+
+@reads('dimensions', 'variables')
 def check_3d(file):
     crop = file.specifiers.get('crop')
     irrigation = file.specifiers.get('irrigation')
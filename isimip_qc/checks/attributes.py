@@ -3,10 +3,11 @@ from email.utils import parseaddr
 from datetime import datetime
 
 from .. import __version__
-from ..config import settings
 from ..fixes import fix_set_global_attr, fix_remove_global_attr
+from ..utils.header import reads
 
 
+@reads('global_attributes')
 def check_isimip_id(file):
     try:
         isimip_id = file.dataset.getncattr('isimip_id')
@@ -18,6 +19,7 @@ def check_isimip_id(file):
         })
 
 
+@reads('global_attributes')
 def check_isimip_qc_version(file):
     try:
         version = file.dataset.getncattr('isimip_qc_version')
@@ -38,8 +40,9 @@ def check_isimip_qc_version(file):
                   })
 
 
+@reads('global_attributes')
 def check_isimip_protocol_version(file):
-    protocol_version = settings.DEFINITIONS['commit']
+    protocol_version = file.settings.DEFINITIONS['commit']
 
     try:
         version = file.dataset.getncattr('isimip_protocol_version')
@@ -60,6 +63,7 @@ def check_isimip_protocol_version(file):
                   })
 
 
+@reads('global_attributes')
 def check_institution(file):
     try:
         file.dataset.getncattr('institution')
@@ -67,6 +71,7 @@ def check_institution(file):
         file.error('Global attribute "institution" is missing.')
 
 
+@reads('global_attributes')
 def check_contact(file):
     try:
         contact = file.dataset.getncattr('contact')
@@ -79,6 +84,7 @@ def check_contact(file):
         file.error('Global attribute "contact" is missing.')
 
 
+@reads('global_attributes')
 def check_isimip_qc_date(file):
     datetime_now = datetime.utcnow().strftime("%Y-%m-%d %H:%M UTC")
     try:
@@ -97,6 +103,7 @@ def check_isimip_qc_date(file):
                   })
 
 
+@reads('global_attributes')
 def check_history(file):
     try:
         file.dataset.getncattr('history')
@@ -1,7 +1,10 @@
 from ..fixes import (fix_remove_variable_attr, fix_rename_dimension,
                      fix_rename_variable, fix_rename_variable_attr)
+from ..utils.chunkindex import get_chunk_index
+from ..utils.header import reads
 
 
+@reads('data_model')
 def check_data_model(file):
     '''
     File must use the NetCDF4 classic data model
@@ -12,6 +15,7 @@ def check_data_model(file):
         file.info('Data model looks good (%s).', file.dataset.data_model)
 
 
+@reads('storage')
 def check_zip(file):
     '''
     Data variables must be compressed with at least compression level 4. Skip check for dimension variables.
@@ -33,6 +37,28 @@ def check_zip(file):
         file.warn('Variable "%s" is not compressed.', file.variable_name, fix_datamodel=True)
 
 
+@reads('data_model', 'variables', 'storage')
+def check_chunk_index(file):
+    '''
+    Report the chunk layout and compression of the data variable, using only the chunk index
+    of the file (requires h5py), and predict the run time of --minmax and --fix-datamodel.
+    '''
+    if file.variable_name not in file.dataset.variables or not file.dataset.data_model.startswith('NETCDF4'):
+        return
+
+    index = get_chunk_index(file.abs_path, file.variable_name)
+    if index is None:
+        return
+
+    file.chunk_index = index
+    file.info('Variable "%s" has %i of %i chunks stored (%i empty), %.1f MB on disk, %.1f MB uncompressed (ratio %.1f).',
+              file.variable_name, index.chunks, index.chunks_total, index.empty_chunks,
+              index.stored_bytes / 1024 ** 2, index.uncompressed_bytes / 1024 ** 2, index.ratio)
+    file.info('Estimated run time for --minmax: %.1f s, for --fix-datamodel: %.1f s.',
+              index.minmax_time, index.fix_datamodel_time)
+
+
+@reads('dimensions', 'variables')
 def check_lower_case(file):
     '''
     Internal names of dimensions and variables are lowercase.
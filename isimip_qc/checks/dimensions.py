@@ -1,9 +1,10 @@
-from ..config import settings
+from ..utils.header import reads
 
 
+@reads('dimensions')
 def check_lon_dimension(file):
     model = file.specifiers.get('model')
-    if settings.SECTOR not in ['marine-fishery_regional', 'water_regional', 'lakes_local']:
+    if file.settings.SECTOR not in ['marine-fishery_regional', 'water_regional', 'lakes_local']:
 
         if file.dataset.dimensions.get('lon') is None:
             file.error('Longitude dimension "lon" is missing.')
@@ -11,7 +12,7 @@ def check_lon_dimension(file):
             if model == 'dbem':
                 lon_size = 720
             else:
-                lon_size = settings.DEFINITIONS['dimensions'].get('lon')['size']
+                lon_size = file.settings.DEFINITIONS['dimensions'].get('lon')['size']
 
             if lon_size != file.dataset.dimensions.get('lon').size:
                 file.warn('Unexpected number of longitudes found (%s). Should be %s', file.dataset.dimensions.get('lon').size, lon_size)
@@ -19,9 +20,10 @@ def check_lon_dimension(file):
                 file.info('%s longitudes defined.', lon_size)
 
 
+@reads('dimensions')
 def check_lat_dimension(file):
     model = file.specifiers.get('model')
-    if settings.SECTOR not in ['marine-fishery_regional', 'water_regional', 'lakes_local']:
+    if file.settings.SECTOR not in ['marine-fishery_regional', 'water_regional', 'lakes_local']:
 
         if file.dataset.dimensions.get('lat') is None:
             file.error('Latitude dimension "lat" is missing.')
@@ -29,7 +31,7 @@ def check_lat_dimension(file):
             if model == 'dbem':
                 lat_size = 360
             else:
-                lat_size = settings.DEFINITIONS['dimensions'].get('lat')['size']
+                lat_size = file.settings.DEFINITIONS['dimensions'].get('lat')['size']
 
             if lat_size != file.dataset.dimensions.get('lat').size:
                 file.warn('Unexpected number of latitudes found (%s). Should be %s', file.dataset.dimensions.get('lat').size, lat_size)
@@ -37,17 +39,20 @@ def check_lat_dimension(file):
                 file.info('%s latitudes defined.', lat_size)
 
 
+@reads('dimensions')
 def check_time_dimension(file):
     if file.dataset.dimensions.get('time') is None:
         file.error('Dimension "time" is missing.')
 
 
+@reads('dimensions')
 def check_depth_dimension(file):
     if file.is_3d:
         if file.dataset.dimensions.get(file.dim_vertical) is None:
             file.error('Valid 4th dimension is missing. Should be of of [depth, bins]. Found "%s" instead.', file.dim_vertical)
 
 
+@reads('dimensions', 'variables')
 def check_dimensions(file):
     # check dimension order
     variable = file.dataset.variables.get(file.variable_name)
@@ -67,7 +72,7 @@ def check_dimensions(file):
         file.error('Variable "%s" neither holds 2d or 3d data. (dim=%s)', dim_len)
 
     for dimension_name, dimension in file.dataset.dimensions.items():
-        dimension_definition = settings.DEFINITIONS['dimensions'].get(dimension_name)
+        dimension_definition = file.settings.DEFINITIONS['dimensions'].get(dimension_name)
 
         if dimension_definition:
             # size of lat and lon are checked above 
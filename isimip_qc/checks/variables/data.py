@@ -0,0 +1,398 @@
+import tracemalloc
+
+import netCDF4
+import numpy as np
+from isimip_qc.utils.chunks import get_chunk_reader
+from isimip_qc.utils.header import reads
+from isimip_qc.utils.landseamask import get_landseamask
+from isimip_qc.utils.netcdf3 import get_mmap_reader
+from isimip_qc.utils.sample import get_read_bytes, iter_samples, wilson_interval
+from isimip_qc.utils.slabs import get_offset, get_read_plan, iter_slabs
+from isimip_qc.utils.stats import THRESHOLD, TimeSeries, get_weights, get_z_scores
+from isimip_qc.utils.throttle import get_storage_ratio
+
+# sectors with values on all land cells (and only there) of the global grid
+LANDSEAMASK_SECTORS = ['agriculture', 'biomes', 'fire', 'groundwater', 'permafrost', 'water_global']
+
+
+@reads('variables', 'fill_values', 'coordinates', 'data')
+def check_data(file):
+    '''
+    Data checks (only with --minmax or --sample). The variable is read only once, slab
+    by slab, using at most MEMORY_LIMIT. With --sample, only a sample of the time steps
+    is read and the share of affected time steps is estimated.
+    '''
+    variable = file.dataset.variables.get(file.variable_name)
+    definition = file.settings.DEFINITIONS.get('variable', {}).get(file.specifiers.get('variable'))
+
+    if not (file.settings.MINMAX or file.settings.SAMPLE) or variable is None or not definition:
+        return
+
+    valid_min = definition.get('valid_min')
+    valid_max = definition.get('valid_max')
+    check_range = (valid_min is not None) and (valid_max is not None)
+
+    if check_range:
+        file.info("Checking values for valid minimum and maximum range defined in the protocol. This could take some time...")
+    else:
+        file.info('No min and/or max definition found for variable "%s".', file.variable_name)
+
+    mismatches = get_mismatches(file, variable)
+    series = get_time_series(file, variable)
+
+    tracing = not tracemalloc.is_tracing()
+    if tracing:
+        tracemalloc.start()
+
+    nan_count = 0
+    too_low = Extremes(file.settings.MINMAX or 10, reverse=False)
+    too_high = Extremes(file.settings.MINMAX or 10, reverse=True)
+
+    reader = None
+    try:
+        reader = get_chunk_reader(file.abs_path, variable, file.settings.READ_THREADS)
+        if reader:
+            file.debug('Reading "%s" with %s threads.', file.variable_name, file.settings.READ_THREADS)
+        else:
+            reader = get_mmap_reader(file.abs_path, variable)
+            if reader:
+                file.debug('Reading "%s" using a memory map.', file.variable_name)
+
+        if file.settings.SAMPLE:
+            slabs = iter_samples(variable, file.settings.SAMPLE, str(file.path), reader)
+        else:
+            plan = get_read_plan(variable, file.settings.MEMORY_LIMIT)
+            if not plan.aligned:
+                file.debug('Chunks of "%s" do not fit into a slab, chunk cache of %.1f MB, every chunk is read %.1f times.',
+                           file.variable_name, (plan.cache_size or 0) / 1024 ** 2, plan.reads)
+            slabs = iter_slabs(variable, plan, reader)
+
+        # for --sample, count the slabs (time steps) and the slabs with values out of range
+        slab_count = 0
+        flagged_count = 0
+        data_bytes = 0
+        read_bytes = get_read_bytes()
+
+        # with --io-limit, the bytes read from the file system are limited
+        governor = file.governor
+        if governor:
+            storage_ratio = get_storage_ratio(file.abs_path, variable)
+        waited = 0
+
+        for index, data in slabs:
+            # the slab is read while the lock of the netCDF library is held (see Checker), but processed without it
+            with file.unlocked():
+                values = np.ma.getdata(data)
+                valid = ~np.ma.getmaskarray(data)
+
+                if governor:
+                    waited += governor.consume(int(values.nbytes * storage_ratio))
+
+                if np.issubdtype(values.dtype, np.floating):
+                    nan_count += np.count_nonzero(np.isnan(values) & valid)
+
+                if check_range:
+                    offset = get_offset(index)
+                    count = too_low.count + too_high.count
+                    too_low.update(values, (values < valid_min) & valid, offset)
+                    too_high.update(values, (values > valid_max) & valid, offset)
+                    if too_low.count + too_high.count > count:
+                        flagged_count += 1
+
+                if mismatches:
+                    mismatches.update(index, valid)
+
+                if series:
+                    series.update(index, values, valid)
+
+                slab_count += 1
+                data_bytes += values.nbytes
+    finally:
+        # also if reading fails, so that no threads, memory maps or tracing are left behind
+        if reader:
+            reader.close()
+        if tracing:
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+    if waited:
+        file.debug('Waited %.1f s for the I/O limit while reading "%s".', waited, file.variable_name)
+
+    if file.settings.SAMPLE:
+        total_bytes = variable.size * variable.dtype.itemsize
+        file.info('Sampled %i time steps of "%s": %.1f MB of %.1f MB of data (%.1f%%).', slab_count, file.variable_name,
+                  data_bytes / 1024 ** 2, total_bytes / 1024 ** 2, 100.0 * data_bytes / total_bytes if total_bytes else 0)
+        if read_bytes is not None:
+            file.info('Read %i bytes from the file system for the sample.', get_read_bytes() - read_bytes)
+
+    if tracing:
+        file.peak_memory = peak
+        file.info('Peak memory of the data checks was %.1f MB (limit %.1f MB).',
+                  peak / 1024 ** 2, file.settings.MEMORY_LIMIT / 1024 ** 2)
+
+    if nan_count:
+        if file.settings.SAMPLE:
+            file.error('%i sampled values of variable "%s" are NaN. Use the missing value (1e+20) instead.', nan_count, file.variable_name)
+        else:
+            file.error('%i values of variable "%s" are NaN. Use the missing value (1e+20) instead.', nan_count, file.variable_name)
+
+    if check_range:
+        units = definition.get('units')
+        if too_low.count:
+            if file.settings.SAMPLE:
+                file.warn('%i sampled values are lower than the valid minimum (%.2E %s).', too_low.count, valid_min, units)
+            else:
+                file.warn('%i values are lower than the valid minimum (%.2E %s).', too_low.count, valid_min, units)
+            if file.settings.LOG_LEVEL == 'WARN':
+                file.warn('%i lowest values are :', min(too_low.size, too_low.count))
+                log_extremes(file, too_low, units)
+
+        if too_high.count:
+            if file.settings.SAMPLE:
+                file.warn('%i sampled values are higher than the valid maximum (%.2E %s).', too_high.count, valid_max, units)
+            else:
+                file.warn('%i values are higher than the valid maximum (%.2E %s).', too_high.count, valid_max, units)
+            if file.settings.LOG_LEVEL == 'WARN':
+                file.warn('%i highest values are :', min(too_high.size, too_high.count))
+                log_extremes(file, too_high, units)
+
+        if file.settings.SAMPLE:
+            lower, upper = wilson_interval(flagged_count, slab_count)
+            file.info('%i of %i sampled time steps have values out of the valid range, '
+                      'estimated share of all time steps: %.1f%% to %.1f%% (95%% confidence).',
+                      flagged_count, slab_count, 100 * lower, 100 * upper)
+
+        if not too_low.count and not too_high.count:
+            if file.settings.SAMPLE:
+                file.info('Sampled values are within valid range (%.2E to %.2E).', valid_min, valid_max)
+            else:
+                file.info('Values are within valid range (%.2E to %.2E).', valid_min, valid_max)
+
+    if mismatches:
+        log_mismatches(file, mismatches)
+
+    if series:
+        log_time_series(file, series, definition.get('units'))
+
+
+@reads('variables', 'fill_values', 'coordinates', 'data')
+def check_landseamask(file):
+    '''
+    Compare the valid cells of the first and the last time step with the land-sea mask
+    (only with --landseamask). With --minmax or --sample, the time steps read by
+    check_data are compared instead.
+    '''
+    variable = file.dataset.variables.get(file.variable_name)
+    definition = file.settings.DEFINITIONS.get('variable', {}).get(file.specifiers.get('variable'))
+
+    if ((file.settings.MINMAX or file.settings.SAMPLE) and definition) or variable is None:
+        return
+
+    mismatches = get_mismatches(file, variable)
+    if mismatches:
+        storage_ratio = get_storage_ratio(file.abs_path, variable) if file.governor else None
+        for index, data in iter_samples(variable, 2):
+            if file.governor:
+                file.governor.consume(int(data.nbytes * storage_ratio))
+            mismatches.update(index, ~np.ma.getmaskarray(data))
+
+        log_mismatches(file, mismatches)
+
+
+def get_mismatches(file, variable):
+    # return a Mismatches object if the variable can be compared with the land-sea mask
+    if not file.settings.LANDSEAMASK or file.settings.SECTOR not in LANDSEAMASK_SECTORS or variable.ndim < 3:
+        return None
+
+    landseamask = get_landseamask(file.settings.LANDSEAMASK)
+    lat = file.dataset.variables.get('lat')
+    lon = file.dataset.variables.get('lon')
+    if landseamask is None or lat is None or lon is None or variable.dimensions[-2:] != ('lat', 'lon'):
+        return None
+
+    bits = landseamask.get_bits(lat[:], lon[:])
+    if bits is None:
+        file.info('Grid of variable "%s" does not match the land-sea mask, skipping the comparison.', file.variable_name)
+        return None
+
+    return Mismatches(landseamask, bits, variable.shape[:-2])
+
+
+def log_mismatches(file, mismatches):
+    if mismatches.ocean_values:
+        file.warn('%i fields of variable "%s" have values on ocean cells (up to %i cells, first at time step %i).',
+                  mismatches.ocean_fields, file.variable_name, mismatches.ocean_values, mismatches.ocean_first + 1)
+    if mismatches.land_missing:
+        file.warn('%i fields of variable "%s" are missing values on land cells (up to %i of %i cells, first at time step %i).',
+                  mismatches.land_fields, file.variable_name, mismatches.land_missing,
+                  mismatches.landseamask.land_count, mismatches.land_first + 1)
+    if not mismatches.ocean_values and not mismatches.land_missing:
+        file.info('Valid cells of %i compared fields match the land-sea mask.', mismatches.fields)
+
+
+def get_time_series(file, variable):
+    # the time series are only computed with --minmax, a sample has gaps between the time steps
+    if not file.settings.MINMAX or file.settings.SAMPLE or variable.dimensions[0] != 'time' \
+            or variable.dimensions[-2:] != ('lat', 'lon') or 'lat' not in file.dataset.variables:
+        return None
+
+    return TimeSeries(variable.shape[0], get_weights(file.dataset.variables['lat'][:]))
+
+
+def log_time_series(file, series, units):
+    mean = series.mean
+    for i, values in enumerate(zip(mean, series.minimum, series.maximum, series.count)):
+        file.debug('time step %i: mean=%E min=%E max=%E valid=%i', i + 1, *values)
+
+    if np.isfinite(mean).any():
+        file.info('Area-weighted mean of "%s" is between %.2E and %.2E %s, %i to %i valid values per time step.',
+                  file.variable_name, np.nanmin(mean), np.nanmax(mean), units, series.count.min(), series.count.max())
+
+    z_scores = get_z_scores(mean)
+    steps = np.flatnonzero(np.abs(np.nan_to_num(z_scores)) > THRESHOLD)
+    if steps.size:
+        file.warn('%i discontinuities found in the area-weighted mean of "%s" (z-score of the change > %.1f).',
+                  steps.size, file.variable_name, THRESHOLD)
+
+        time, time_units, time_calendar = get_time_calendar(file)
+        for step in steps[np.argsort(-np.abs(z_scores[steps]))][:file.settings.MINMAX]:
+            try:
+                date = netCDF4.num2date(time[step], time_units, time_calendar)
+            except (TypeError, ValueError):
+                date = 'unknown date'
+            file.warn('Discontinuity at %s (time step %i): mean %E -> %E %s (z-score %.1f).',
+                      date, step + 1, mean[step - 1], mean[step], units, z_scores[step])
+
+
+def get_time_calendar(file):
+    time = file.dataset.variables.get('time')
+    time_resolution = file.specifiers.get('time_step')
+
+    try:
+        time_units = time.units
+    except AttributeError:
+        time_units = None
+
+    time_calendar = None
+    if time_resolution == 'daily':
+        try:
+            time_calendar = time.calendar
+        except AttributeError:
+            pass
+    if time_resolution in ['monthly', 'annual']:
+        time_calendar = '360_day'
+
+    return time, time_units, time_calendar
+
+
+def log_extremes(file, extremes, units):
+    lat = file.dataset.variables.get('lat')
+    lon = file.dataset.variables.get('lon')
+    time, time_units, time_calendar = get_time_calendar(file)
+
+    for value, index in extremes.values:
+        if file.is_2d:
+            file.warn('date: %s, lat/lon: %4.2f/%4.2f, value: %E %s',
+                      netCDF4.num2date(time[index[0]], time_units, time_calendar),
+                      lat[index[-2]], lon[index[-1]], value, units)
+        elif file.is_3d:
+            file.warn('date: %s, lat/lon: %4.2f/%4.2f, level: %s, value: %E %s',
+                      netCDF4.num2date(time[index[0]], time_units, time_calendar),
+                      lat[index[-2]], lon[index[-1]], index[-3] + 1, value, units)
+
+
+class Mismatches(object):
+    '''
+    Counts, for every field (time step, or level of a time step) of the variable, the
+    values on ocean cells and the missing values on land cells. The slabs may be read
+    in any order and may contain only a part of a field (e.g. for time series chunks).
+    '''
+
+    def __init__(self, landseamask, bits, shape):
+        self.landseamask = landseamask
+        self.bits = bits
+        self.land = None
+        self.seen = np.zeros(shape, dtype=bool)
+        self.ocean_counts = np.zeros(shape, dtype=np.int32)
+        self.land_counts = np.zeros(shape, dtype=np.int32)
+
+    def update(self, index, valid):
+        if valid.shape[-2:] == self.landseamask.shape:
+            ocean_values, land_missing = self.landseamask.count(self.bits, valid)
+        else:
+            if self.land is None:
+                self.land = self.landseamask.get_land(self.bits)
+            land = self.land[index[-2], index[-1]]
+            ocean_values = np.count_nonzero(valid & ~land, axis=(-2, -1))
+            land_missing = np.count_nonzero(~valid & land, axis=(-2, -1))
+
+        fields = index[:-2]
+        self.seen[fields] = True
+        self.ocean_counts[fields] += ocean_values.astype(np.int32)
+        self.land_counts[fields] += land_missing.astype(np.int32)
+
+    @property
+    def fields(self):
+        return int(np.count_nonzero(self.seen))
+
+    @property
+    def ocean_fields(self):
+        return int(np.count_nonzero(self.ocean_counts))
+
+    @property
+    def land_fields(self):
+        return int(np.count_nonzero(self.land_counts))
+
+    @property
+    def ocean_values(self):
+        return int(self.ocean_counts.max(initial=0))
+
+    @property
+    def land_missing(self):
+        return int(self.land_counts.max(initial=0))
+
+    @property
+    def ocean_first(self):
+        return get_first_time_step(self.ocean_counts)
+
+    @property
+    def land_first(self):
+        return get_first_time_step(self.land_counts)
+
+
+def get_first_time_step(counts):
+    # the first time step with a count in any of its fields
+    time_steps = np.flatnonzero(counts.reshape(counts.shape[0], -1).any(axis=1))
+    return int(time_steps[0]) if time_steps.size else None
+
+
+class Extremes(object):
+    '''
+    Counts the values flagged in a series of slabs and keeps the `size` most extreme
+    ones together with their index in the full variable.
+    '''
+
+    def __init__(self, size, reverse=False):
+        self.size = size
+        self.reverse = reverse
+        self.count = 0
+        self.values = []
+
+    def update(self, values, flags, offset):
+        flat_indexes = np.flatnonzero(flags)
+        if not flat_indexes.size:
+            return
+
+        self.count += flat_indexes.size
+
+        flat_values = values.flat[flat_indexes]
+        if flat_indexes.size > self.size:
+            order = np.argpartition(-flat_values if self.reverse else flat_values, self.size - 1)[:self.size]
+            flat_indexes, flat_values = flat_indexes[order], flat_values[order]
+
+        indexes = np.unravel_index(flat_indexes, values.shape)
+        for i, value in enumerate(flat_values.tolist()):
+            index = tuple(int(axis_indexes[i]) + start for axis_indexes, start in zip(indexes, offset))
+            self.values.append((value, index))
+
+        self.values = sorted(self.values, key=lambda value: value[0], reverse=self.reverse)[:self.size]
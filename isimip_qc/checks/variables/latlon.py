@@ -1,13 +1,14 @@
 import numpy as np
-from isimip_qc.config import settings
 from isimip_qc.fixes import fix_set_variable_attr
+from isimip_qc.utils.header import reads
 
 
+@reads('variables', 'attributes', 'coordinates')
 def check_latlon_variable(file):
     model = file.specifiers.get('model')
     for variable in  ['lat', 'lon']:
         var = file.dataset.variables.get(variable)
-        var_definition = settings.DEFINITIONS['dimensions'].get(variable)
+        var_definition = file.settings.DEFINITIONS['dimensions'].get(variable)
 
         if var is None:
             file.error('Variable "%s" is missing.', variable)
@@ -75,7 +76,7 @@ def check_latlon_variable(file):
                     'args': (file, variable, 'units', units)
                 })
 
-            if settings.SECTOR not in ['marine-fishery_regional', 'water_regional', 'lakes_local']:
+            if file.settings.SECTOR not in ['marine-fishery_regional', 'water_regional', 'lakes_local']:
 
                 # check minimum and maximum
                 if model == 'dbem':
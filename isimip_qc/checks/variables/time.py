@@ -1,13 +1,14 @@
 import calendar
 
 import netCDF4
-from isimip_qc.config import settings
 from isimip_qc.fixes import fix_set_variable_attr
+from isimip_qc.utils.header import reads
 
 
+@reads('variables', 'attributes', 'coordinates')
 def check_time_variable(file):
     time = file.dataset.variables.get('time')
-    time_definition = settings.DEFINITIONS['dimensions'].get('time')
+    time_definition = file.settings.DEFINITIONS['dimensions'].get('time')
 
     if time is None:
         file.error('Variable time is missing.')
@@ -63,8 +64,8 @@ def check_time_variable(file):
 
         # check units
         time_step = file.specifiers.get('time_step')
-        increment = settings.DEFINITIONS['time_step'][time_step]['increment']
-        minimum = settings.DEFINITIONS['time_span']['minimum']['value']
+        increment = file.settings.DEFINITIONS['time_step'][time_step]['increment']
+        minimum = file.settings.DEFINITIONS['time_span']['minimum']['value']
         units_templates = [
             "%s since %i-01-01",
             "%s since %i-01-01 00:00:00",
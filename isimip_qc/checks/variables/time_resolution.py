@@ -1,12 +1,13 @@
 import calendar
 
 import netCDF4
-from isimip_qc.config import settings
+from isimip_qc.utils.header import reads
 
 
+@reads('data_model', 'variables', 'attributes', 'coordinates')
 def check_time_resolution(file):
     time = file.dataset.variables.get('time')
-    time_definition = settings.DEFINITIONS['dimensions'].get('time')
+    time_definition = file.settings.DEFINITIONS['dimensions'].get('time')
     time_resolution = file.specifiers.get('time_step')
 
     try:
@@ -1,14 +1,17 @@
 import math
 
-import netCDF4
-import numpy as np
-from isimip_qc.config import settings
 from isimip_qc.fixes import fix_set_variable_attr
+from isimip_qc.utils.header import reads
+from isimip_qc.utils.slabs import get_read_plan
 
+# chunkings for which a full scan of the data decompresses every chunk more often are reported
+MAX_READS = 2.0
 
+
+@reads('dimensions', 'variables', 'attributes', 'storage')
 def check_variable(file):
     variable = file.dataset.variables.get(file.variable_name)
-    definition = settings.DEFINITIONS.get('variable', {}).get(file.specifiers.get('variable'))
+    definition = file.settings.DEFINITIONS.get('variable', {}).get(file.specifiers.get('variable'))
     model = file.specifiers.get('model')
 
     if not variable:
@@ -27,7 +30,7 @@ def check_variable(file):
         # check chunking
         chunking = variable.chunking()
         if chunking:
-            if settings.SECTOR in ['marine-fishery_regional', 'water_regional', 'lakes_local']:
+            if file.settings.SECTOR in ['marine-fishery_regional', 'water_regional', 'lakes_local']:
                 lat_size = file.dataset.variables.get('lat').shape[0]
                 lon_size = file.dataset.variables.get('lon').shape[0]
             else:
@@ -35,18 +38,20 @@ def check_variable(file):
                     lat_size = 360
                     lon_size = 720
                 else:
-                    lat_size = settings.DEFINITIONS['dimensions'].get('lat')['size']
-                    lon_size = settings.DEFINITIONS['dimensions'].get('lon')['size']
+                    lat_size = file.settings.DEFINITIONS['dimensions'].get('lat')['size']
+                    lon_size = file.settings.DEFINITIONS['dimensions'].get('lon')['size']
 
             if file.is_2d:
                 if chunking[0] != 1 or chunking[1] != lat_size or chunking[2] != lon_size:
                     file.warn('%s.chunking=%s should be [1, %s, %s] (with proper depencency order).', file.variable_name, chunking, lat_size, lon_size)
+                    report_read_plan(file, variable)
                 else:
                     file.info('Variable properly chunked [1, %s, %s].', lat_size, lon_size)
             if file.is_3d:
                 var3d_len = file.dataset.dimensions.get(file.dim_vertical).size
                 if chunking[0] != 1 or chunking[1] != var3d_len or chunking[2] != lat_size or chunking[3] != lon_size:
                     file.warn('%s.chunking=%s. Should be [1, %s, %s, %s] (with proper depencency order).', file.variable_name, chunking, var3d_len, lat_size, lon_size)
+                    report_read_plan(file, variable)
                 else:
                     file.info('Variable properly chunked [1, %s, %s, %s].', var3d_len, lat_size, lon_size)
         else:
@@ -139,85 +144,10 @@ def check_variable(file):
                 else:
                     file.error('"%s" attribute for variable "%s" is missing. Should be set to 1e+20 and must be set when variable is created.', name, file.variable_name)
 
-        # check valid range
-        if settings.MINMAX:
-            valid_min = definition.get('valid_min')
-            valid_max = definition.get('valid_max')
-            if (valid_min is not None) and (valid_max is not None):
-                file.info("Checking values for valid minimum and maximum range defined in the protocol. This could take some time...")
-                lat = file.dataset.variables.get('lat')
-                lon = file.dataset.variables.get('lon')
-                time = file.dataset.variables.get('time')
-
-                too_low = np.argwhere(variable[:] < valid_min)
-                too_high = np.argwhere(variable[:] > valid_max)
-
-                time = file.dataset.variables.get('time')
-                time_resolution = file.specifiers.get('time_step')
-
-                try:
-                    time_units = time.units
-                except AttributeError:
-                    pass
-
-                if time_resolution == 'daily':
-                    try:
-                        time_calendar = time.calendar
-                    except AttributeError:
-                        pass
-                if time_resolution in ['monthly', 'annual']:
-                    time_calendar = '360_day'
-
-                if too_low.size:
-                    file.warn('%i values are lower than the valid minimum (%.2E %s).', too_low.shape[0], valid_min, units)
-                    if settings.LOG_LEVEL == 'WARN':
-                        file.warn('%i lowest values are :', min(settings.MINMAX, too_low.shape[0]))
-
-                        too_low_list = []
-                        for index in too_low[0:too_low.shape[0]]:
-                            too_low_list.append([tuple(index), variable[tuple(index)].data.tolist()])
-                        too_low_sorted = sorted(too_low_list, key=lambda value: value[1], reverse=False)
-                        for i in range(0, min(settings.MINMAX, too_low.shape[0])):
-                            if file.is_2d:
-                                file.warn('date: %s, lat/lon: %4.2f/%4.2f, value: %E %s',
-                                          netCDF4.num2date(time[too_low_sorted[i][0][0]], time_units, time_calendar),
-                                          lat[too_low_sorted[i][0][-2]],
-                                          lon[too_low_sorted[i][0][-1]],
-                                          too_low_sorted[i][1], units)
-                            elif file.is_3d:
-                                file.warn('date: %s, lat/lon: %4.2f/%4.2f, level: %s, value: %E %s',
-                                          netCDF4.num2date(time[too_low_sorted[i][0][0]], time_units, time_calendar),
-                                          lat[too_low_sorted[i][0][-2]],
-                                          lon[too_low_sorted[i][0][-1]],
-                                          too_low_sorted[i][0][-3] + 1,
-                                          too_low_sorted[i][1], units)
-
-                if too_high.size:
-                    file.warn('%i values are higher than the valid maximum (%.2E %s).', too_high.shape[0], valid_max, units)
-                    if settings.LOG_LEVEL == 'WARN':
-                        file.warn('%i highest values are :', min(settings.MINMAX, too_high.shape[0]))
-
-                        too_high_list = []
-                        for index in too_high[0:too_high.shape[0]]:
-                            too_high_list.append([tuple(index), variable[tuple(index)].data.tolist()])
-                        too_high_sorted = sorted(too_high_list, key=lambda value: value[1], reverse=True)
-                        for i in range(0, min(settings.MINMAX, too_high.shape[0])):
-                            if file.is_2d:
-                                file.warn('date: %s, lat/lon: %4.2f/%4.2f, value: %E %s',
-                                          netCDF4.num2date(time[too_high_sorted[i][0][0]], time_units, time_calendar),
-                                          lat[too_high_sorted[i][0][-2]],
-                                          lon[too_high_sorted[i][0][-1]],
-                                          too_high_sorted[i][1], units)
-                            elif file.is_3d:
-                                file.warn('date: %s, lat/lon: %4.2f/%4.2f, level: %s, value: %E %s',
-                                          netCDF4.num2date(time[too_high_sorted[i][0][0]], time_units, time_calendar),
-                                          lat[too_high_sorted[i][0][-2]],
-                                          lon[too_high_sorted[i][0][-1]],
-                                          too_high_sorted[i][0][-3] + 1,
-                                          too_high_sorted[i][1], units)
-
-                if not too_low.shape and not too_high.shape:
-                    file.info('Values are within valid range (%.2E to %.2E).', valid_min, valid_max)
 
-            else:
-                file.info('No min and/or max definition found for variable "%s".', file.variable_name)
+def report_read_plan(file, variable):
+    # with some chunkings, a chunk does not fit into memory and is read several times by the data checks
+    plan = get_read_plan(variable, file.settings.MEMORY_LIMIT)
+    if plan.reads > MAX_READS:
+        file.warn('Reading all values of "%s" decompresses every chunk %.1f times with chunking %s (memory limit %.1f MB).',
+                  file.variable_name, plan.reads, variable.chunking(), file.settings.MEMORY_LIMIT / 1024 ** 2)
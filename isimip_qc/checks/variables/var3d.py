@@ -1,8 +1,9 @@
 import numpy as np
-from isimip_qc.config import settings
 from isimip_qc.fixes import fix_set_variable_attr
+from isimip_qc.utils.header import reads
 
 
+@reads('dimensions', 'variables', 'attributes', 'coordinates')
 def check_3d_variable(file):
 
     def check_attribute(var3d, attr_type, attribute):
@@ -22,7 +23,7 @@ def check_3d_variable(file):
     if file.is_3d:
 
         var3d = file.dataset.variables.get(file.dim_vertical)
-        var3d_definition = settings.DEFINITIONS['dimensions'].get(file.dim_vertical)
+        var3d_definition = file.settings.DEFINITIONS['dimensions'].get(file.dim_vertical)
 
         # check if vertical dimension ha a variable associated
         if var3d is None and file.dim_vertical:
@@ -41,7 +42,7 @@ def check_3d_variable(file):
 
             # check attributes
             for attribute in ['axis', 'standard_name', 'long_name', 'units']:
-                if settings.SIMULATION_ROUND in ['ISIMIP2a', 'ISIMIP2b'] and var3d.name == 'levlak':
+                if file.settings.SIMULATION_ROUND in ['ISIMIP2a', 'ISIMIP2b'] and var3d.name == 'levlak':
                     continue
                 attr_definition = var3d_definition.get(attribute)
                 check_attribute(var3d, attribute, attr_definition)
@@ -66,7 +67,7 @@ def check_3d_variable(file):
                 else:
                     file.info('"levlak" order looks good (positive down).')
 
-                if settings.SIMULATION_ROUND not in ['ISIMIP2a', 'ISIMIP2b']:
+                if file.settings.SIMULATION_ROUND not in ['ISIMIP2a', 'ISIMIP2b']:
 
                     depth_file = file.dataset.variables.get('depth')
 
@@ -85,7 +86,7 @@ def check_3d_variable(file):
                         else:
                             file.error('No proper "levlak" dependency found in "depth" variable.')
 
-                        depth_definition = settings.DEFINITIONS['dimensions'].get('depth')
+                        depth_definition = file.settings.DEFINITIONS['dimensions'].get('depth')
 
                         if depth_definition is None:
                             file.warn('Dimension "depth" is not yet defined in protocol. Skipping attribute checks for "depth".')
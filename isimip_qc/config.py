@@ -1,14 +1,24 @@
 import configparser
 import os
+import re
 from pathlib import Path
 
 import colorlog
+import jsonschema
 from dotenv import load_dotenv
 
 from .utils.fetch import fetch_definitions, fetch_pattern, fetch_schema
+from .utils.slabs import parse_size
+from .utils.throttle import IOGovernor
 
 logger = colorlog.getLogger(__name__)
 
+# directory names which start a schema_path, e.g. ISIMIP3b
+SIMULATION_ROUND_PATTERN = re.compile(r'^ISIMIP\d\w*$')
+
+# maximum number of parts of a schema_path, e.g. ISIMIP3b/InputData/climate/atmosphere/obsclim
+MAX_SCHEMA_PATH_PARTS = 5
+
 
 class Settings(object):
 
@@ -22,11 +32,37 @@ class Settings(object):
 
     DEFAULTS = {
         'LOG_LEVEL': 'WARN',
+        'MEMORY_LIMIT': '1G',
+        'READ_THREADS': 0,
+        'PREFETCH': 0,
+        'WALK_THREADS': 0,
+        'QUEUE_MODE': 'work',
+        'QUEUE_LEASE': 3600,
+        'SETTLE': 60,
+        'INTERVAL': 60,
+        'HOST': '127.0.0.1',
+        'PORT': 8000,
+        'BACKLOG': 16,
+        'JOBS': 1,
+        'TIMEOUT': 3600,
         'PROTOCOL_LOCATIONS': 'https://protocol.isimip.org https://protocol2.isimip.org'
     }
 
-    def __init__(self):
-        self.__dict__ = self._shared_state
+    PROTOCOL_KEYS = [
+        'PROTOCOLS', 'SCHEMA_PATHS', 'SIMULATION_ROUND', 'PRODUCT', 'SECTOR',
+        'DEFINITIONS', 'PATTERN', 'SCHEMA', 'VALIDATOR'
+    ]
+
+    # options of the Python API (see isimip_qc.checker.Checker), the API only checks files
+    API_OPTIONS = [
+        'UNCHECKED_PATH', 'PROTOCOL_LOCATIONS', 'LOG_LEVEL', 'LOG_PATH', 'MINMAX', 'SAMPLE',
+        'LANDSEAMASK', 'MEMORY_LIMIT', 'READ_THREADS', 'IO_LIMIT', 'MAX_OPENS', 'CHECK'
+    ]
+
+    def __init__(self, shared=True):
+        # the settings of the command line are shared by all instances (Borg pattern),
+        # the settings of a Checker are independent of them
+        self.__dict__ = self._shared_state if shared else {}
 
     def __str__(self):
         return str(vars(self))
@@ -50,6 +86,45 @@ class Settings(object):
         if self.CHECKED_PATH is not None:
             self.CHECKED_PATH = Path(self.CHECKED_PATH).expanduser()
 
+        self.MEMORY_LIMIT = parse_size(self.MEMORY_LIMIT)
+        self.READ_THREADS = int(self.READ_THREADS)
+        self.PREFETCH = int(self.PREFETCH)
+        self.WALK_THREADS = int(self.WALK_THREADS)
+        self.JOBS = int(self.JOBS)
+        self.TIMEOUT = int(self.TIMEOUT)
+        if self.WORKER_MEMORY is not None:
+            self.WORKER_MEMORY = parse_size(self.WORKER_MEMORY)
+        self.setup_governor()
+
+        # settings of the watch command
+        self.SETTLE = int(getattr(self, 'SETTLE', None) or self.DEFAULTS['SETTLE'])
+        self.INTERVAL = int(getattr(self, 'INTERVAL', None) or self.DEFAULTS['INTERVAL'])
+        self.POLL = getattr(self, 'POLL', False)
+
+        # settings of the serve command
+        self.HOST = getattr(self, 'HOST', None) or self.DEFAULTS['HOST']
+        self.PORT = int(getattr(self, 'PORT', None) or self.DEFAULTS['PORT'])
+        self.WORKERS = int(getattr(self, 'WORKERS', None) or os.cpu_count() or 1)
+        self.BACKLOG = int(getattr(self, 'BACKLOG', None) or self.DEFAULTS['BACKLOG'])
+
+        if self.QUEUE is not None:
+            self.QUEUE = Path(self.QUEUE).expanduser()
+            self.QUEUE_LEASE = int(self.QUEUE_LEASE)
+
+        if self.LANDSEAMASK is not None:
+            self.LANDSEAMASK = Path(self.LANDSEAMASK).expanduser()
+
+        if self.TIMINGS is not None:
+            self.TIMINGS = Path(self.TIMINGS).expanduser()
+
+        if self.RESULTS is not None:
+            self.RESULTS = Path(self.RESULTS).expanduser()
+
+        if self.METRICS is not None:
+            self.METRICS = Path(self.METRICS).expanduser()
+        if self.METRICS_PORT is not None:
+            self.METRICS_PORT = int(self.METRICS_PORT)
+
         self.LOG_LEVEL = self.LOG_LEVEL.upper()
         if self.LOG_PATH is not None:
             self.LOG_PATH = Path(self.LOG_PATH).expanduser()
@@ -58,18 +133,133 @@ class Settings(object):
         colorlog.basicConfig(level=self.LOG_LEVEL,
                              format=' %(log_color)s%(levelname)-8s : %(message)s%(reset)s')
 
-        # set the path
-        self.SCHEMA_PATH = Path(args.schema_path)
-        self.SIMULATION_ROUND, self.PRODUCT, self.SECTOR = self.SCHEMA_PATH.parts[0:3]
-
-        # fetch definitions pattern and schema
-        self.DEFINITIONS = fetch_definitions(self.PROTOCOL_LOCATIONS.split(), self.SCHEMA_PATH)
-        self.PATTERN = fetch_pattern(self.PROTOCOL_LOCATIONS.split(), self.SCHEMA_PATH)
-        self.SCHEMA = fetch_schema(self.PROTOCOL_LOCATIONS.split(), self.SCHEMA_PATH)
+        # fetch definitions pattern and schema for the schema_path, for "auto"
+        # the schema_path is detected for every file
+        self.PROTOCOLS = {}
+        self.SCHEMA_PATHS = {}
+        self.AUTO_SCHEMA = (args.schema_path == 'auto')
+        if args.schema_path is not None and not self.AUTO_SCHEMA:
+            self.activate(args.schema_path)
+        else:
+            self.SCHEMA_PATH = self.DEFINITIONS = self.PATTERN = self.SCHEMA = None
 
         # log settings
         colorlog.debug(self)
 
+    def configure(self, schema_path, options, protocols):
+        # setup the settings for the Python API from a dict of options (see API_OPTIONS),
+        # without argparse, environment and config files, the protocols are shared
+        unknown = set(options) - {key.lower() for key in self.API_OPTIONS}
+        if unknown:
+            raise ValueError('Unknown option(s): {}.'.format(', '.join(sorted(unknown))))
+
+        for key in self.API_OPTIONS:
+            value = options.get(key.lower())
+            setattr(self, key, self.DEFAULTS.get(key) if value is None else value)
+
+        if self.UNCHECKED_PATH is not None:
+            self.UNCHECKED_PATH = Path(self.UNCHECKED_PATH).expanduser()
+        if self.LOG_PATH is not None:
+            self.LOG_PATH = Path(self.LOG_PATH).expanduser()
+        if self.LANDSEAMASK is not None:
+            self.LANDSEAMASK = Path(self.LANDSEAMASK).expanduser()
+
+        self.MEMORY_LIMIT = parse_size(self.MEMORY_LIMIT)
+        self.READ_THREADS = int(self.READ_THREADS)
+        self.LOG_LEVEL = self.LOG_LEVEL.upper()
+        self.setup_governor()
+
+        # the options of the command line which modify files are not available
+        self.FIX = self.FIX_DATAMODEL = self.TUNE_COMPRESSION = self.MOVE = self.COPY = False
+        self.STOP_WARN = self.STOP_ERR = False
+        self.CHECKED_PATH = None
+
+        self.PROTOCOLS = protocols
+        self.SCHEMA_PATHS = {}
+        self.AUTO_SCHEMA = False
+        return self.activate(schema_path)
+
+    def setup_governor(self):
+        # the IOGovernor is shared by all processes of a run (and by all threads of a Checker),
+        # IO_LIMIT is in MB/s (or e.g. 500K/s), 0 only measures the throughput
+        if self.IO_LIMIT is not None:
+            self.IO_LIMIT = parse_size(str(self.IO_LIMIT).upper().replace('/S', ''))
+        self.MAX_OPENS = int(self.MAX_OPENS or 0)
+
+        if self.IO_LIMIT is not None or self.MAX_OPENS:
+            self.IO_GOVERNOR = IOGovernor(self.IO_LIMIT or 0, self.MAX_OPENS)
+        else:
+            self.IO_GOVERNOR = None
+
+    def activate(self, schema_path):
+        # set the protocol for this schema_path, returns False if a part could not be found
+        protocol = self.get_protocol(schema_path)
+        for key, value in protocol.items():
+            setattr(self, key, value)
+
+        return self.is_complete(protocol)
+
+    def get_protocol(self, schema_path):
+        # the protocol is fetched only once for every schema_path and then kept in self.PROTOCOLS
+        schema_path = Path(schema_path)
+        if schema_path not in self.PROTOCOLS:
+            self.PROTOCOLS[schema_path] = self.fetch_protocol(schema_path)
+
+        return self.PROTOCOLS[schema_path]
+
+    def is_complete(self, protocol):
+        return None not in (protocol['DEFINITIONS'], protocol['PATTERN'], protocol['SCHEMA'])
+
+    def detect(self, file_path):
+        # detect the schema_path from the directories of the file, e.g. for
+        # .../ISIMIP3b/OutputData/water_global/H08/file.nc, the shortest path starting with
+        # the simulation round for which a protocol exists is used, returns None if none is found
+        dir_path = Path(file_path).parent
+        if dir_path not in self.SCHEMA_PATHS:
+            self.SCHEMA_PATHS[dir_path] = None
+
+            parts = dir_path.parts
+            for i, part in enumerate(parts):
+                if SIMULATION_ROUND_PATTERN.match(part):
+                    for j in range(i + 3, min(i + MAX_SCHEMA_PATH_PARTS, len(parts)) + 1):
+                        schema_path = Path(*parts[i:j])
+                        if self.is_complete(self.get_protocol(schema_path)):
+                            self.SCHEMA_PATHS[dir_path] = schema_path
+                            break
+
+                if self.SCHEMA_PATHS[dir_path] is not None:
+                    break
+
+        return self.SCHEMA_PATHS[dir_path]
+
+    def export(self):
+        # the settings without the protocols, e.g. to set up worker processes
+        return {key: value for key, value in vars(self).items() if key not in self.PROTOCOL_KEYS}
+
+    def restore(self, state):
+        self.__dict__.update(state)
+        self.PROTOCOLS = {}
+        self.SCHEMA_PATHS = {}
+        if self.SCHEMA_PATH is not None:
+            self.activate(self.SCHEMA_PATH)
+
+    def fetch_protocol(self, schema_path):
+        protocol_locations = self.PROTOCOL_LOCATIONS.split()
+        protocol = {
+            'SCHEMA_PATH': schema_path,
+            'DEFINITIONS': fetch_definitions(protocol_locations, schema_path),
+            'PATTERN': fetch_pattern(protocol_locations, schema_path),
+            'SCHEMA': fetch_schema(protocol_locations, schema_path),
+            'VALIDATOR': None
+        }
+        protocol['SIMULATION_ROUND'], protocol['PRODUCT'], protocol['SECTOR'] = (schema_path.parts + (None, ) * 3)[0:3]
+
+        # compile the schema once, not for every file
+        if protocol['SCHEMA'] is not None:
+            protocol['VALIDATOR'] = jsonschema.validators.validator_for(protocol['SCHEMA'])(protocol['SCHEMA'])
+
+        return protocol
+
     def read_config(self, config_file_arg):
         config_files = [config_file_arg] + self.CONFIG_FILES
         for config_file in config_files:
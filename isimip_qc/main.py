@@ -1,21 +1,61 @@
 import argparse
+import re
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
 from os import path
 
 import colorlog
 
+from .checker import (OPEN_FAILED, WRONG_SUFFIX, get_check_result, get_error_result,
+                      get_json_result, run_checks)
 from .checks import checks
 from .config import settings
-from .exceptions import FileCritical, FileError, FileWarning
 from .models import File
-from .utils.files import walk_files
+from .utils.files import filter_files, glob_files, list_files, walk_files
+from .utils.header import get_changed_fields, get_header
+from .utils.metrics import Metrics, format_bar
+from .utils.prefetch import prefetch_files
+from .utils.schedule import Progress, Timings, estimate_cost, format_duration
+from .utils.server import CheckServer
+from .utils.results import ResultsDatabase
+from .utils.summary import LEVELS, SPECIFIERS, Summary
+from .utils.supervisor import Supervisor
+from .utils.watch import watch_files
+from .utils.workqueue import WorkQueue
 
 logger = colorlog.getLogger(__name__)
 
+QUEUE_FAILED = 'Check did not finish after %s attempts (worker crashed or timed out).'
+NO_SCHEMA_PATH = 'No schema_path could be detected from the directories of the file.'
 
-def get_parser():
-    parser = argparse.ArgumentParser(description='Check ISIMIP files for matching protocol definitions')
+# the criticals for the files which could not be checked with --isolate
+ISOLATE_FAILED = {
+    'timeout': 'Check did not finish within %s seconds and was aborted (the file is probably corrupted).',
+    'memory': 'Check exceeded the memory limit of %s MB and was aborted.',
+    'crashed': 'Check crashed (%s), the file is probably corrupted.',
+    'error': 'Check failed with an unexpected error: %s'
+}
+
+SCHEMA_PATH_PATTERN = re.compile(r'^[\w-]+/[\w-]+/[\w-]+$')
+
+COMMANDS = {
+    'watch': 'Watch UNCHECKED_PATH and check new files as soon as they are complete',
+    'serve': 'Check files below UNCHECKED_PATH on request (POST /check) using a local HTTP server',
+    'report': 'Report what got worse in a run, or which models fail a check, from the RESULTS database'
+}
+
+
+def get_parser(command=None):
+    if command:
+        parser = argparse.ArgumentParser(prog='isimip-qc ' + command, description=COMMANDS[command])
+    else:
+        parser = argparse.ArgumentParser(description='Check ISIMIP files for matching protocol definitions',
+                                         epilog='commands: ' + ', '.join(COMMANDS) + ' (see isimip-qc COMMAND -h)')
     # mandatory
-    parser.add_argument('schema_path', help='ISIMIP schema_path, e.g. ISIMIP3a/OutputData/water_global')
+    parser.add_argument('schema_path', nargs='?' if command in ['serve', 'report'] else None,
+                        help='ISIMIP schema_path, e.g. ISIMIP3a/OutputData/water_global, '
+                             'or "auto" to detect it from the directories of each file')
     # optional
     parser.add_argument('--config-file', dest='config_file',
                         help='File path of the config file')
@@ -35,6 +75,12 @@ def get_parser():
                         help='Log level (ERROR, WARN, INFO, or DEBUG)')
     parser.add_argument('--log-path', dest='log_path',
                         help='base path for the individual log files')
+    parser.add_argument('--files-from', dest='files_from',
+                        help='check only the files listed in this file (one per line, "-" for stdin)')
+    parser.add_argument('--glob', dest='glob',
+                        help='check only the files matching this glob pattern, relative to UNCHECKED_PATH')
+    parser.add_argument('--walk-threads', dest='walk_threads', action='store', type=int,
+                        help='number of threads used to read the directories below UNCHECKED_PATH')
     parser.add_argument('--include', dest='variables_include',
                         help='include only this comma-separated list of variables')
     parser.add_argument('--exclude', dest='variables_exclude',
@@ -47,26 +93,152 @@ def get_parser():
                         help='stop execution on errors')
     parser.add_argument('-r', '--minmax', dest='minmax', action='store', nargs='?', const=10, type=int,
                         help='test values for valid range (slow, argument MINMAX defaults to show the top 10 values)')
+    parser.add_argument('--sample', dest='sample', action='store', nargs='?', const=20, type=int,
+                        help='run the data checks only on a sample of time steps (fast, argument SAMPLE defaults to 20 time steps)')
+    parser.add_argument('--landseamask', dest='landseamask',
+                        help='NetCDF file with the land-sea mask to compare the valid cells of the data with (first and last time step by default)')
+    parser.add_argument('--memory-limit', dest='memory_limit',
+                        help='maximum memory used to read data for the data checks, e.g. 512M or 4G (default: 1G)')
+    parser.add_argument('--read-threads', dest='read_threads', action='store', type=int,
+                        help='number of threads to decompress the data for the data checks (requires h5py)')
     parser.add_argument('--fix', dest='fix', action='store_true', default=False,
                         help='try to fix warnings detected on the original files')
     parser.add_argument('--fix-datamodel', dest='fix_datamodel', action='store', nargs='?', const='nccopy', type=str,
                         help='also fix warnings on data model found using NCCOPY or CDO (slow). Choose preferred tool per lower case argument.')
+    parser.add_argument('--tune-compression', dest='tune_compression', action='store_true', default=False,
+                        help='with --fix-datamodel, choose the compression level and shuffle filter by compressing a sample of the data')
     parser.add_argument('--check', dest='check',
                         help='perform only one particular check')
+    parser.add_argument('--queue', dest='queue',
+                        help='SQLite file on a shared file system to distribute the files over several workers')
+    parser.add_argument('--queue-mode', dest='queue_mode', choices=['submit', 'work', 'report'],
+                        help='submit files to the QUEUE, work on the QUEUE, or report the results from the QUEUE')
+    parser.add_argument('--queue-lease', dest='queue_lease', action='store', type=int,
+                        help='seconds after which files claimed by a crashed worker are checked again (default: 3600)')
+    parser.add_argument('-s', '--summary', dest='summary', action='store_true', default=False,
+                        help='print a summary of the findings of all files, grouped by check and message')
+    parser.add_argument('--prefetch', dest='prefetch', action='store', type=int,
+                        help='read the headers of the next PREFETCH files in the background')
+    parser.add_argument('-j', '--jobs', dest='jobs', action='store', type=int,
+                        help='number of processes to check files in parallel (default: 1)')
+    parser.add_argument('--isolate', dest='isolate', action='store_true', default=False,
+                        help='check every file in a supervised worker process, crashes and timeouts are reported as criticals')
+    parser.add_argument('--timeout', dest='timeout', action='store', type=int,
+                        help='seconds after which the check of a file is aborted with --isolate (default: 3600)')
+    parser.add_argument('--worker-memory', dest='worker_memory',
+                        help='memory limit of the worker processes with --isolate, e.g. 4G (default: no limit)')
+    parser.add_argument('--io-limit', dest='io_limit',
+                        help='maximum rate at which files are read, in MB/s or e.g. 500K (0 for no limit, only report the throughput)')
+    parser.add_argument('--max-opens', dest='max_opens', action='store', type=int,
+                        help='maximum number of files which are open at the same time, in all processes')
+    parser.add_argument('--largest-first', dest='largest_first', action='store_true', default=False,
+                        help='check the files with the longest predicted duration first and show an ETA')
+    parser.add_argument('--timings', dest='timings',
+                        help='JSON file to store the durations of the checks, used to predict the next runs')
+    parser.add_argument('--results', dest='results',
+                        help='SQLite file to record the findings of every run (see isimip-qc report)')
+    parser.add_argument('--metrics', dest='metrics',
+                        help='file to write metrics of the run to in the Prometheus text format, e.g. for the textfile collector')
+    parser.add_argument('--metrics-port', dest='metrics_port', action='store', type=int,
+                        help='serve the metrics of the run on http://HOST:METRICS_PORT/metrics')
+    parser.add_argument('--progress', dest='progress', action='store_true', default=False,
+                        help='show a progress bar with the throughput and an ETA after each file')
+
+    if command == 'watch':
+        parser.add_argument('--settle', dest='settle', action='store', type=int,
+                            help='seconds a file must be unchanged before it is checked (default: 60)')
+        parser.add_argument('--interval', dest='interval', action='store', type=int,
+                            help='seconds between scans for new files when polling (default: 60)')
+        parser.add_argument('--poll', dest='poll', action='store_true', default=False,
+                            help='scan for new files instead of using inotify (e.g. on network file systems)')
+
+    if command == 'serve':
+        parser.add_argument('--host', dest='host',
+                            help='address the server listens on (default: 127.0.0.1)')
+        parser.add_argument('--port', dest='port', action='store', type=int,
+                            help='port the server listens on (default: 8000)')
+        parser.add_argument('--workers', dest='workers', action='store', type=int,
+                            help='number of worker processes, i.e. concurrent checks (default: number of CPUs)')
+        parser.add_argument('--backlog', dest='backlog', action='store', type=int,
+                            help='number of requests which can wait for a worker before 503 is returned (default: 16)')
+
+    if command == 'report':
+        parser.add_argument('--run', dest='run', action='store', type=int,
+                            help='compare the files of this run with their previous results (default: the last run)')
+        parser.add_argument('--by', dest='by', choices=SPECIFIERS,
+                            help='with --check, group the files which fail the check by this specifier (default: model)')
+
     return parser
 
 
+def get_file_paths():
+    if settings.FILES_FROM:
+        file_paths = list_files(settings.FILES_FROM, settings.UNCHECKED_PATH)
+    elif settings.GLOB:
+        file_paths = glob_files(settings.UNCHECKED_PATH, settings.GLOB)
+    else:
+        file_paths = walk_files(settings.UNCHECKED_PATH, settings.WALK_THREADS)
+
+    return filter_files(file_paths, get_file_pattern if settings.AUTO_SCHEMA else settings.PATTERN['file'],
+                        settings.VARIABLES_INCLUDE, settings.VARIABLES_EXCLUDE)
+
+
+def get_file_pattern(file_path):
+    schema_path = settings.detect(file_path)
+    if schema_path is not None:
+        return settings.get_protocol(schema_path)['PATTERN']['file']
+
+
+def get_variable_name(file_path):
+    # the name of the data variable from the file name, like in check_3d
+    pattern = get_file_pattern(file_path) if settings.AUTO_SCHEMA else settings.PATTERN['file']
+    match = pattern.match(file_path.name) if pattern else None
+    if match:
+        specifiers = match.groupdict()
+        if specifiers.get('variable'):
+            return '-'.join(specifiers[key] for key in ['variable', 'crop', 'irrigation', 'pft'] if specifiers.get(key))
+
+
+def get_cost(file_path):
+    return estimate_cost(file_path, get_variable_name(file_path), data=bool(settings.MINMAX and not settings.SAMPLE))
+
+
+def get_timings():
+    if settings.SAMPLE:
+        mode = 'sample'
+    elif settings.MINMAX:
+        mode = 'minmax'
+    else:
+        mode = 'header'
+    return Timings(settings.TIMINGS, mode)
+
+
+def schedule_files(file_paths, timings):
+    # order the files by their predicted duration, longest first (LPT), returns the ordered
+    # list and a dict with the estimated cost and the predicted duration for each file
+    costs = {}
+    for file_path in file_paths:
+        cost = get_cost(file_path)
+        costs[file_path] = (cost, timings.predict(file_path, cost))
+
+    return sorted(costs, key=lambda file_path: costs[file_path][1], reverse=True), costs
+
+
 def main():
-    parser = get_parser()
-    args = parser.parse_args()
+    argv = sys.argv[1:]
+    command = argv.pop(0) if argv and argv[0] in COMMANDS else None
+
+    parser = get_parser(command)
+    args = parser.parse_args(argv)
     settings.setup(args)
 
-    if settings.DEFINITIONS is None:
-        parser.error('no definitions could be found. Check schema_path argument.')
-    if settings.PATTERN is None:
-        parser.error('no pattern could be found. Check schema_path argument.')
-    if settings.SCHEMA is None:
-        parser.error('no schema could be found. Check schema_path argument.')
+    if settings.SCHEMA_PATH is not None:
+        if settings.DEFINITIONS is None:
+            parser.error('no definitions could be found. Check schema_path argument.')
+        if settings.PATTERN is None:
+            parser.error('no pattern could be found. Check schema_path argument.')
+        if settings.SCHEMA is None:
+            parser.error('no schema could be found. Check schema_path argument.')
 
     if settings.UNCHECKED_PATH:
         if not path.exists(settings.UNCHECKED_PATH):
@@ -78,88 +250,504 @@ def main():
             print('CHECKED_PATH does not exist:', settings.CHECKED_PATH)
             quit()
 
+    if command == 'watch':
+        watch()
+        return
+
+    if command == 'serve':
+        if settings.FIX or settings.FIX_DATAMODEL or settings.MOVE or settings.COPY:
+            parser.error('--fix, --fix-datamodel, --move and --copy can not be used with serve, files are only checked.')
+        serve()
+        return
+
+    if command == 'report':
+        if settings.RESULTS is None:
+            parser.error('the RESULTS database is required, use --results.')
+        report()
+        return
+
+    if settings.QUEUE:
+        queue = WorkQueue(settings.QUEUE, lease=settings.QUEUE_LEASE)
+        if settings.QUEUE_MODE == 'submit':
+            submit_files(queue)
+        elif settings.QUEUE_MODE == 'work':
+            work_queue(queue)
+        elif settings.QUEUE_MODE == 'report':
+            report_queue(queue)
+        return
+
+    summary = Summary()
+    timings = get_timings()
+    metrics = start_metrics()
+
+    file_paths = get_file_paths()
+    costs = {}
+    progress = None
+    if settings.LARGEST_FIRST:
+        file_paths, costs = schedule_files(file_paths, timings)
+        progress = Progress([predicted for _, predicted in costs.values()], settings.JOBS)
+        print('SCHEDULED : %s files, largest first, ETA %s' % (progress.files, format_duration(progress.eta)))
+    elif settings.PROGRESS:
+        # without predictions, every file counts the same
+        file_paths = list(file_paths)
+        progress = Progress([1.0] * len(file_paths), settings.JOBS)
+
+    if progress:
+        metrics.set_files_left(progress.files)
+
+    # record the run in the results database
+    results = run_id = None
+    if settings.RESULTS:
+        results = ResultsDatabase(settings.RESULTS)
+        run_id = results.start_run('auto' if settings.AUTO_SCHEMA else settings.SCHEMA_PATH,
+                                   settings.UNCHECKED_PATH, sys.argv[1:])
+
     # walk over unchecked files
-    for file_path in walk_files(settings.UNCHECKED_PATH):
+    file_paths = prefetch_files(file_paths, settings.PREFETCH, data=bool(settings.MINMAX and not settings.SAMPLE),
+                                metrics=metrics)
+    try:
+        for file_path, result, stop in check_files(file_paths):
+            summary.add(file_path, result['specifiers'], [finding.key for finding in result['findings']],
+                        result.get('bytes_saved', 0))
+            metrics.add(result)
+
+            if results:
+                results.add_file(run_id, file_path, result)
+
+            if settings.TIMINGS or settings.LARGEST_FIRST:
+                abs_path = settings.UNCHECKED_PATH / file_path
+                cost, predicted = costs.get(abs_path) or (get_cost(abs_path), None)
+                timings.record(abs_path, cost, result['duration'])
+                if progress:
+                    progress.update(predicted, result['duration'])
+            elif progress:
+                progress.update(1.0, result['duration'])
+
+            if settings.PROGRESS:
+                print_progress(progress, metrics)
+            elif progress:
+                print('PROGRESS  : %s of %s files, ETA %s' % (progress.done, progress.files, format_duration(progress.eta)))
+
+            # stop if flag is set
+            if settings.FIRST_FILE or stop:
+                break
+
+        if results:
+            results.finish_run(run_id)
+    finally:
+        # the files checked so far are kept, an interrupted run is not marked as finished
+        if results:
+            results.close()
+        metrics.close()
+
+    timings.save()
+    print_throughput()
+
+    if settings.SUMMARY:
+        print_summary(summary)
+
+
+def watch():
+    print('WATCHING  : %s' % settings.UNCHECKED_PATH)
+    file_paths = watch_files(settings.UNCHECKED_PATH, settle=settings.SETTLE,
+                             interval=settings.INTERVAL, poll=settings.POLL)
+    pattern = get_file_pattern if settings.AUTO_SCHEMA else settings.PATTERN['file']
+    try:
+        for file_path in filter_files(file_paths, pattern, settings.VARIABLES_INCLUDE, settings.VARIABLES_EXCLUDE):
+            check_file(file_path)
+    except KeyboardInterrupt:
+        pass
+
+
+def serve():
+    executor = ProcessPoolExecutor(max_workers=settings.WORKERS, initializer=settings.restore,
+                                   initargs=(settings.export(), ))
+    if settings.AUTO_SCHEMA:
+        default_schema_path = 'auto'
+    elif settings.SCHEMA_PATH is not None:
+        default_schema_path = settings.SCHEMA_PATH.as_posix()
+    else:
+        default_schema_path = None
+
+    server = CheckServer((settings.HOST, settings.PORT), executor, check_path,
+                         slots=settings.WORKERS + settings.BACKLOG,
+                         default_schema_path=default_schema_path)
+
+    print('SERVING   : http://%s:%s/check (%s workers)' % (settings.HOST, settings.PORT, settings.WORKERS))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        executor.shutdown()
+
+
+def check_path(schema_path, file_path):
+    # runs in the worker processes of the server, returns (status, result)
+    unchecked_path = settings.UNCHECKED_PATH.resolve()
+    abs_path = (unchecked_path / file_path).resolve()
+    try:
+        abs_path.relative_to(unchecked_path)
+    except ValueError:
+        return 403, {'error': 'Path "%s" is not below UNCHECKED_PATH.' % file_path}
+
+    if not abs_path.is_file():
+        return 404, {'error': 'File "%s" not found.' % file_path}
+
+    if schema_path == 'auto':
+        schema_path = settings.detect(abs_path)
+        if schema_path is None:
+            return 400, {'error': NO_SCHEMA_PATH}
+        schema_path = schema_path.as_posix()
+
+    if not SCHEMA_PATH_PATTERN.match(schema_path) or not settings.activate(schema_path):
+        return 400, {'error': 'No protocol found for schema_path "%s".' % schema_path}
+
+    # only check the file, a request never fixes, moves or copies it
+    result = get_json_result(get_check_result(settings.UNCHECKED_PATH / abs_path.relative_to(unchecked_path), settings))
+    result['path'] = file_path
+    result['schema_path'] = schema_path
+    return 200, result
+
+
+def check_files(file_paths):
+    # yields (path, result, stop) for every file, with --jobs the files are checked
+    # in worker processes and yielded as soon as they are finished
+    if settings.ISOLATE:
+        yield from isolate_files(file_paths)
+        return
+
+    if settings.JOBS < 2:
+        for file_path in file_paths:
+            yield check_file(file_path)
+        return
+
+    executor = ProcessPoolExecutor(max_workers=settings.JOBS, initializer=settings.restore,
+                                   initargs=(settings.export(), ))
+    futures = set()
+    try:
+        for file_path in file_paths:
+            futures.add(executor.submit(check_file, file_path))
+
+            # submit only a few files ahead, so that a stop does not need to wait for all files
+            if len(futures) >= 2 * settings.JOBS:
+                done, futures = wait(futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+
+        while futures:
+            done, futures = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+    finally:
+        for future in futures:
+            future.cancel()
+        executor.shutdown()
+
+
+def isolate_files(file_paths):
+    # like check_files, but the files are checked in supervised worker processes, so that
+    # a file which crashes or hangs the netCDF library does not stop the run
+    supervisor = Supervisor(settings.JOBS, timeout=settings.TIMEOUT, memory_limit=settings.WORKER_MEMORY,
+                            initializer=settings.restore, initargs=(settings.export(), ))
+
+    for file_path, status, value, duration in supervisor.map(check_file, file_paths):
+        if status == 'done':
+            yield value
+            continue
+
+        if status == 'memory':
+            value = value // 1024 ** 2
+
+        logger.critical('%s: %s', file_path, ISOLATE_FAILED[status] % value)
+        result = get_error_result(ISOLATE_FAILED[status], value, level='criticals')
+        result['duration'] = duration
+        yield file_path.relative_to(settings.UNCHECKED_PATH), result, bool(settings.STOP_ERR)
+
+
+def check_file(file_path):
+    # check one file (also in the worker processes of --jobs), returns (path, result, stop)
+    start = time.time()
+    size = get_size(file_path)
+
+    schema_path = settings.detect(file_path) if settings.AUTO_SCHEMA else settings.SCHEMA_PATH
+    if schema_path is None:
         print('CHECKING  : %s' % file_path)
-        if file_path.suffix in settings.PATTERN['suffix']:
-            file = File(file_path)
-            file.open_log()
+        logger.error('%s: %s', file_path, NO_SCHEMA_PATH)
+        result, stop = get_error_result(NO_SCHEMA_PATH), False
+    else:
+        if settings.AUTO_SCHEMA:
+            settings.activate(schema_path)
+
+        file = process_file(file_path)
+        result, stop = get_result(file), bool(file and file.stop)
+
+    result['duration'] = time.time() - start
+    result['size'] = size
+    return file_path.relative_to(settings.UNCHECKED_PATH), result, stop
+
+
+def get_size(file_path):
+    # the size of the file before it is checked (and maybe moved or rewritten)
+    try:
+        return file_path.stat().st_size
+    except OSError:
+        return 0
+
 
-            # 1st pass: perform checks
+def process_file(file_path):
+    print('CHECKING  : %s' % file_path)
+    if file_path.suffix not in settings.PATTERN['suffix']:
+        logger.error('%s has wrong suffix. Use "%s" for this simulation round', file_path, settings.PATTERN['suffix'][0])
+        return
+
+    file = File(file_path)
+    file.open_log()
+    file.match()
+
+    if file.matched:
+        # 1st pass: perform checks, a file which can not be opened is neither fixed nor moved
+        opened = False
+        try:
             file.open_dataset()
-            file.match()
-
-            if file.matched:
-
-                if settings.VARIABLES_INCLUDE is not None and file.specifiers['variable'] not in settings.VARIABLES_INCLUDE.split(sep=','):
-                    logger.info('skipped by include option')
-                    continue
-
-                if settings.VARIABLES_EXCLUDE is not None and file.specifiers['variable'] in settings.VARIABLES_EXCLUDE.split(sep=','):
-                    logger.info('skipped by exclude option')
-                    continue
-
-                for check in checks:
-                    if not settings.CHECK or check.__name__ == settings.CHECK:
-                        try:
-                            check(file)
-                        except FileWarning:
-                            pass
-                        except FileError:
-                            pass
-                        except FileCritical:
-                            pass
-
-                file.validate()
-                file.close_dataset()
+        except OSError as e:
+            file.critical(OPEN_FAILED, e)
+        else:
+            opened = True
+            try:
+                run_checks(file, checks)
 
-                # log result of checks, stop if flags are set
-                if file.is_clean:
-                    logger.info('File has successfully passed all checks')
-                elif file.has_warnings and not file.has_errors:
-                    logger.info('File passed all checks without unfixable issues.')
-                elif file.has_errors:
-                    logger.critical('File did not pass all checks. Unfixable issues detected.')
-
-                if file.has_warnings and settings.STOP_WARN:
-                    break
-
-                if file.has_errors and settings.STOP_ERR:
-                    break
-
-                # 2nd pass: fix warnings and fixable infos
-                if settings.FIX:
-                    file.open_dataset(write=True)
-                    if file.has_infos_fixable:
-                        print(' FIX INFOS...')
-                        file.fix_infos()
-                    if file.has_warnings:
-                        print(' FIX WARNINGS...')
-                        file.fix_warnings()
-                    file.close_dataset()
-
-                # 2nd pass: fix warnings
-                if file.has_warnings and settings.FIX_DATAMODEL:
-                    print(' FIX DATAMODEL...')
-                    file.fix_datamodel()
-
-                # copy/move files to checked_path
-                if file.is_clean:
-                    if settings.MOVE:
-                        print(' MOVE FILE...')
-                        file.move()
-                    elif settings.COPY:
-                        print(' COPY FILE...')
-                        file.copy()
-
-            else:
+                # keep a snapshot of the header to find the checks affected by the fixes
+                if settings.FIX or settings.FIX_DATAMODEL:
+                    file.header = get_header(file.dataset)
+            finally:
+                # also if a check raises, so that the slot of --max-opens is released
                 file.close_dataset()
 
-            # close the log for this file
-            file.close_log()
-        else:
-            logger.error('%s has wrong suffix. Use "%s" for this simulation round', file_path, settings.PATTERN['suffix'][0])
+        # log result of checks, stop if flags are set
+        if file.is_clean:
+            logger.info('File has successfully passed all checks')
+        elif file.has_warnings and not file.has_errors:
+            logger.info('File passed all checks without unfixable issues.')
+        elif file.has_errors:
+            logger.critical('File did not pass all checks. Unfixable issues detected.')
+
+        if file.has_warnings and settings.STOP_WARN:
+            file.stop = True
+
+        if file.has_errors and settings.STOP_ERR:
+            file.stop = True
+
+        if opened and not file.stop:
+            fix_file(file)
+
+    # close the log for this file
+    file.close_log()
+
+    return file
+
+
+def verify_fixes(file):
+    # 3rd pass: perform the checks again which read a part of the header
+    # which was changed by the fixes, the findings of these checks are replaced
+    try:
+        file.open_dataset()
+    except OSError as e:
+        # e.g. a file rewritten by --fix-datamodel
+        file.critical(OPEN_FAILED, e)
+        return
+
+    try:
+        header = get_header(file.dataset)
+        changed_fields = get_changed_fields(file.header, header)
+
+        if changed_fields:
+            affected_checks = [check for check in checks
+                               if not hasattr(check, 'reads') or changed_fields.intersection(check.reads)]
+            print(' VERIFY FIXES...')
+            logger.info('%s changed, performing %s checks again', ', '.join(sorted(changed_fields)), len(affected_checks))
+
+            file.discard([check.__name__ for check in affected_checks] + ['validate'])
+            run_checks(file, affected_checks)
+
+        file.header = header
+    finally:
+        file.close_dataset()
+
+
+def fix_file(file):
+    # 2nd pass: fix warnings and fixable infos
+    fixed = False
+    if settings.FIX:
+        try:
+            file.open_dataset(write=True)
+        except OSError as e:
+            file.critical(OPEN_FAILED, e)
+            return
+
+        try:
+            if file.has_infos_fixable:
+                print(' FIX INFOS...')
+                file.fix_infos()
+                fixed = True
+            if file.has_warnings:
+                print(' FIX WARNINGS...')
+                file.fix_warnings()
+                fixed = True
+        finally:
+            file.close_dataset()
+
+    # 2nd pass: fix warnings
+    if file.has_warnings and settings.FIX_DATAMODEL:
+        print(' FIX DATAMODEL...')
+        fixed = file.fix_datamodel() or fixed
+
+    # the fixes are only trusted after the affected checks passed
+    if fixed and file.header is not None:
+        verify_fixes(file)
+
+    # copy/move files to checked_path
+    if file.is_clean:
+        if settings.MOVE:
+            print(' MOVE FILE...')
+            file.move()
+        elif settings.COPY:
+            print(' COPY FILE...')
+            file.copy()
+
+
+def report():
+    results = ResultsDatabase(settings.RESULTS)
+    try:
+        if settings.CHECK:
+            by = settings.BY or 'model'
+            print('FAILING   : %s, latest result of every file, by %s' % (settings.CHECK, by))
+            for value, failing, files in results.get_failing(settings.CHECK, by):
+                print('            %s: %s of %s files' % (value, failing, files))
+            return
+
+        for run_id, started, finished, schema_path, files, counts in results.get_runs(limit=10):
+            print('RUN %-6s: %s %s, %s files, %s' % (
+                run_id, time.strftime('%Y-%m-%d %H:%M', time.localtime(started)), schema_path, files,
+                ', '.join('%s with %s' % (counts[level], level) for level in ['criticals', 'errors', 'warnings'])) +
+                ('' if finished else ' (not finished)'))
+
+        run_id = settings.RUN or results.get_last_run()
+        if run_id is None:
+            return
+
+        changes = results.get_changes(run_id)
+        print('CHANGES   : run %s compared to the previous results: %s files worse, %s files better, %s new files' % (
+            run_id, len(changes['worse']), len(changes['better']), len(changes['new'])))
+
+        for file_path, findings in changes['worse']:
+            print('%s' % file_path)
+            for level, check, message, text in findings:
+                print(' %-9s: %s%s' % (LEVELS[level], text, ' (%s)' % check if check else ''))
+    finally:
+        results.close()
+
+
+def print_throughput():
+    # the bytes read by the data checks, copies, moves and rewrites of all processes
+    governor = settings.IO_GOVERNOR
+    if governor:
+        limit = '%.1f MB/s' % (governor.rate / 1024 ** 2) if governor.rate else 'none'
+        print('I/O       : %.1f MB in %s, %.1f MB/s (limit %s, waited %s)' % (
+            governor.total_bytes / 1024 ** 2, format_duration(governor.elapsed),
+            governor.throughput / 1024 ** 2, limit, format_duration(governor.total_waited)))
+
+
+def start_metrics():
+    metrics = Metrics(settings.METRICS, settings.IO_GOVERNOR)
+    if settings.METRICS_PORT:
+        metrics.start_server(settings.HOST, settings.METRICS_PORT)
+        print('METRICS   : http://%s:%s/metrics' % (settings.HOST, settings.METRICS_PORT))
+    return metrics
+
+
+def print_progress(progress, metrics):
+    print('PROGRESS  : %s %s of %s files, %.2f files/s, %.1f MB/s, ETA %s' % (
+        format_bar(progress.done, progress.files), progress.done, progress.files,
+        metrics.files_rate, metrics.bytes_rate / 1024 ** 2, format_duration(progress.eta)))
+
+
+def print_summary(summary):
+    if settings.LOG_LEVEL in ['INFO', 'DEBUG']:
+        summary.print(levels=('criticals', 'errors', 'warnings', 'infos'))
+    else:
+        summary.print()
+
+
+def submit_files(queue):
+    # the workers claim the files in the order they were submitted
+    file_paths = get_file_paths()
+    if settings.LARGEST_FIRST:
+        file_paths, _ = schedule_files(file_paths, get_timings())
+
+    file_paths = [file_path.relative_to(settings.UNCHECKED_PATH) for file_path in file_paths]
+    count = queue.submit(file_paths)
+    print('SUBMITTED : %s files to %s (%s already queued)' % (count, settings.QUEUE, len(file_paths) - count))
+
+
+def work_queue(queue):
+    metrics = start_metrics()
+    try:
+        run_queue(queue, metrics)
+    finally:
+        metrics.close()
+
+    print_throughput()
+
+
+def run_queue(queue, metrics):
+    while True:
+        metrics.set_queue_counts(queue.counts())
+        file_path = queue.claim()
+        if file_path is None:
+            if queue.is_finished:
+                break
+
+            # wait for other workers, files are claimed again when their lease expires
+            time.sleep(min(60, settings.QUEUE_LEASE / 10))
+            continue
+
+        with queue.heartbeat(file_path):
+            _, result, _ = check_file(settings.UNCHECKED_PATH / file_path)
+
+        queue.complete(file_path, get_json_result(result))
+        metrics.add(result)
+
+
+def get_result(file):
+    if file is None:
+        return get_error_result(WRONG_SUFFIX, settings.PATTERN['suffix'][0])
+    else:
+        return file.result
+
+
+def report_queue(queue):
+    counts = queue.counts()
+    print('QUEUE     : %s files (%s)' % (sum(counts.values()),
+                                        ', '.join('%s: %s' % item for item in sorted(counts.items()))))
+
+    if settings.SUMMARY:
+        summary = Summary()
+        for file_path, status, attempts, result in queue.results():
+            if status == 'failed':
+                summary.add(file_path, {}, [('criticals', None, QUEUE_FAILED)])
+            elif result:
+                summary.add(file_path, result.get('specifiers', {}), result.get('findings', []))
+        print_summary(summary)
+        return
 
-        # stop if flag is set
-        if settings.FIRST_FILE:
-            break
+    for file_path, status, attempts, result in queue.results():
+        if status == 'failed':
+            print('%s' % file_path)
+            print(' CRITICAL : ' + QUEUE_FAILED % attempts)
+        elif result and any(result.get(key) for key in ['warnings', 'errors', 'criticals']):
+            print('%s' % file_path)
+            for key, level in [('warnings', 'WARNING'), ('errors', 'ERROR'), ('criticals', 'CRITICAL')]:
+                for message in result.get(key, []):
+                    print(' %-9s: %s' % (level, message))
@@ -1,12 +1,16 @@
 import logging
 import shutil
+from contextlib import contextmanager
+from pathlib import Path
 
-import colorlog
 import jsonschema
 
+from . import fixes
 from .config import settings
+from .utils.compression import get_advice
 from .utils.datamodel import call_cdo, call_nccopy
 from .utils.files import copy_file, move_file
+from .utils.logs import LogSink
 from .utils.netcdf import (get_dimensions, get_global_attributes,
                            get_variables, open_dataset_read,
                            open_dataset_write)
@@ -14,8 +18,14 @@ from .utils.netcdf import (get_dimensions, get_global_attributes,
 
 class File(object):
 
-    def __init__(self, file_path):
-        self.path = file_path.relative_to(settings.UNCHECKED_PATH)
+    def __init__(self, file_path, context=None):
+        # the settings used for this file, the settings of the command line by default
+        self.settings = settings if context is None else context
+
+        if self.settings.UNCHECKED_PATH is None:
+            self.path = Path(file_path.name)
+        else:
+            self.path = file_path.relative_to(self.settings.UNCHECKED_PATH)
         self.abs_path = file_path
 
         self.infos = []
@@ -24,15 +34,36 @@ class File(object):
         self.criticals = []
 
         self.logger = None
-        self.handler = None
-        self.file_handler = None
 
         self.dataset = None
         self.specifiers = {}
 
+        # the IOGovernor for --io-limit and --max-opens and the slot of the open dataset
+        self.governor = self.settings.IO_GOVERNOR
+        self.slot = None
+
+        # the lock for the netCDF library, if files are checked in several threads (see Checker)
+        self.lock = None
+
         self.is_2d = False
         self.is_3d = False
 
+        self.stop = False
+        self.peak_memory = None
+
+        # the change of the size of the file by --fix-datamodel
+        self.bytes_saved = 0
+
+        # the seconds spent in each check
+        self.durations = {}
+        self.chunk_index = None
+
+        # snapshot of the header, to find the checks which need to be performed again after a fix
+        self.header = None
+
+        # the name of the check which is currently performed, stored with the findings
+        self.check = None
+
     @property
     def json(self):
         return {
@@ -42,91 +73,189 @@ class File(object):
             'specifiers': self.specifiers
         }
 
-    def open_log(self):
-        self.logger = self.get_logger()
+    @property
+    def findings(self):
+        return self.infos + self.warnings + self.errors + self.criticals
+
+    @property
+    def result(self):
+        # the findings are kept unformatted, so that the result is small and can be pickled
+        return {
+            'specifiers': self.specifiers,
+            'findings': self.findings,
+            'bytes_saved': self.bytes_saved,
+            'check_durations': self.durations
+        }
+
+    def open_log(self, console=True):
+        log_path = self.settings.LOG_PATH / self.path.with_suffix('.log') if self.settings.LOG_PATH else None
+        self.logger = LogSink(str(self.path), self.settings.LOG_LEVEL, log_path, console)
 
     def close_log(self):
-        if self.handler:
-            self.handler.close()
+        if self.logger:
+            self.logger.close()
 
     def open_dataset(self, write=False):
-        if write:
-            self.dataset = open_dataset_write(self.abs_path)
-        else:
-            self.dataset = open_dataset_read(self.abs_path)
+        # with --max-opens, wait until less than MAX_OPENS files are open
+        if self.governor:
+            self.slot = self.governor.acquire()
+
+        try:
+            if write:
+                self.dataset = open_dataset_write(self.abs_path)
+            else:
+                self.dataset = open_dataset_read(self.abs_path)
+        except OSError:
+            self.release_slot()
+            raise
 
     def close_dataset(self):
         self.dataset.close()
+        self.release_slot()
+
+    def release_slot(self):
+        if self.governor:
+            self.governor.release(self.slot)
+            self.slot = None
+
+    @contextmanager
+    def locked(self):
+        # hold the lock while the netCDF library is used
+        if self.lock is None:
+            yield
+        else:
+            with self.lock:
+                yield
+
+    @contextmanager
+    def unlocked(self):
+        # release the lock held by locked() while data is processed without the netCDF library,
+        # so that other threads can read their files in the meantime
+        if self.lock is None:
+            yield
+        else:
+            self.lock.release()
+            try:
+                yield
+            finally:
+                self.lock.acquire()
 
     def debug(self, message, *args):
-        self.logger.debug(message, *args)
+        self.logger.log(logging.DEBUG, message, args)
 
     def info(self, message, *args, fix=None):
-        self.logger.info(message, *args)
-        self.infos.append((message % args, fix))
+        # the messages are stored with their arguments and only formatted when needed
+        self.logger.log(logging.INFO, message, args)
+        self.infos.append(Finding('infos', self.check, message, args, self.get_fix(fix)))
 
     def warn(self, message, *args, fix=None, fix_datamodel=None):
-        self.logger.warn(message, *args)
-        self.warnings.append((message % args, fix, fix_datamodel))
+        self.logger.log(logging.WARNING, message, args)
+        self.warnings.append(Finding('warnings', self.check, message, args, self.get_fix(fix), bool(fix_datamodel)))
 
     def error(self, message, *args):
-        self.logger.error(message, *args)
-        self.errors.append((message % args))
+        self.logger.log(logging.ERROR, message, args)
+        self.errors.append(Finding('errors', self.check, message, args))
 
     def critical(self, message, *args):
-        self.logger.critical(message, *args)
-        self.criticals.append((message % args))
+        self.logger.log(logging.CRITICAL, message, args)
+        self.criticals.append(Finding('criticals', self.check, message, args))
+
+    def get_fix(self, fix):
+        # store the name of the function in isimip_qc.fixes and its arguments after the file,
+        # instead of the function and the file itself
+        if fix is None:
+            return None
+
+        function, args = fix['func'], fix['args']
+        if getattr(fixes, function.__name__, None) is not function or args[0] is not self:
+            raise ValueError('Fixes need to be functions of isimip_qc.fixes with the file as first argument.')
+
+        return (function.__name__, tuple(args[1:]))
+
+    def discard(self, checks):
+        # remove the findings of these checks, before they are performed again
+        self.infos = [info for info in self.infos if info.check not in checks]
+        self.warnings = [warning for warning in self.warnings if warning.check not in checks]
+        self.errors = [error for error in self.errors if error.check not in checks]
+        self.criticals = [critical for critical in self.criticals if critical.check not in checks]
 
     def fix_infos(self):
-        for info in self.infos[:]:
-            message, fix = info
-            if fix:
-                fix['func'](*fix['args'])
-                self.infos.remove(info)
+        # the infos are not removed here, but when the checks are performed again
+        for info in self.infos:
+            if info.fix:
+                info.apply(self)
 
     def fix_warnings(self):
-        for warning in self.warnings[:]:
-            message, fix, _ = warning
-            if fix:
-                fix['func'](*fix['args'])
-                self.warnings.remove(warning)
+        # the warnings are not removed here, but when the checks are performed again
+        for warning in self.warnings:
+            if warning.fix:
+                warning.apply(self)
 
     def fix_datamodel(self):
-        # check if we need to fix using cdu
-        if any([fix_datamodel for _, _, fix_datamodel in self.warnings]):
+        # check if we need to fix using cdu, returns True if the file was rewritten
+        if any(warning.fix_datamodel for warning in self.warnings):
+            if self.settings.FIX_DATAMODEL not in ['cdo', 'nccopy']:
+                self.error('"' + self.settings.FIX_DATAMODEL + '" is not a valid argument for --fix-datamodel option. Chose "nccopy" or "cdo"')
+                return False
+            if not shutil.which(self.settings.FIX_DATAMODEL):
+                self.error('"%s" is not available for execution. Please install before.', self.settings.FIX_DATAMODEL)
+                return False
+
+            # the compression of the rewritten file, level 5 without shuffle unless it is tuned,
+            # cdo can not apply the shuffle filter
+            if self.settings.TUNE_COMPRESSION:
+                complevel, shuffle = self.tune_compression(shuffle=self.settings.FIX_DATAMODEL == 'nccopy')
+            else:
+                complevel, shuffle = 5, False
+            size = self.abs_path.stat().st_size
+
             # fix using tmpfile
             tmp_abs_path = self.abs_path.parent / ('.' + self.abs_path.name + '-fix')
-            if settings.FIX_DATAMODEL == 'cdo':
-                if shutil.which('cdo'):
-                    self.info('Rewriting file with fixed data model using "cdo"')
-                    call_cdo(['--history', '-s', '-z', 'zip_5', '-f', 'nc4c', '-b', 'F32', '-k', 'grid', '-copy'], self.abs_path, tmp_abs_path)
-                else:
-                    self.error('"cdo" is not available for execution. Please install before.')
-            elif settings.FIX_DATAMODEL == 'nccopy':
-                if shutil.which('nccopy'):
-                    self.info('Rewriting file with fixed data model using "nccopy"')
-                    call_nccopy(['-k4', '-d5'], self.abs_path, tmp_abs_path)
-                else:
-                    self.error('"nccopy" is not available for execution. Please install before.')
+            if self.settings.FIX_DATAMODEL == 'cdo':
+                self.info('Rewriting file with fixed data model using "cdo"')
+                with self.rewriting():
+                    call_cdo(['--history', '-s', '-z', 'zip_%i' % complevel, '-f', 'nc4c', '-b', 'F32', '-k', 'grid', '-copy'], self.abs_path, tmp_abs_path)
             else:
-                self.error('"' + settings.FIX_DATAMODEL + '" is not a valid argument for --fix-datamodel option. Chose "nccopy" or "cdo"')
+                self.info('Rewriting file with fixed data model using "nccopy"')
+                with self.rewriting():
+                    call_nccopy(['-k4', '-d%i' % complevel] + (['-s'] if shuffle else []), self.abs_path, tmp_abs_path)
 
-            if settings.FIX_DATAMODEL in ['nccopy', 'cdo']:
+            if tmp_abs_path.exists():
                 # move tmp file to original file
                 move_file(tmp_abs_path, self.abs_path)
-
-                # remove warnings after fix
-                for warning in self.warnings[:]:
-                    message, _, fix_datamodel = warning
-                    if fix_datamodel:
-                        self.warnings.remove(warning)
+                self.bytes_saved = size - self.abs_path.stat().st_size
+                return True
+
+        return False
+
+    def tune_compression(self, shuffle=True):
+        # compress a sample of the data with different settings and use the fastest of the smallest
+        definition = self.settings.DEFINITIONS.get('variable', {}).get(self.specifiers.get('variable')) or {}
+        advice = get_advice(self.abs_path, self.variable_name, definition.get('least_significant_digit'), shuffle)
+        if advice is None:
+            return 5, False
+
+        for candidate in advice.candidates:
+            self.info('Compression %s: %.1f MB, %.1f s to compress (estimated from %i time steps).',
+                      str(candidate), candidate.size / 1024 ** 2, candidate.seconds, advice.sample_size)
+
+        self.info('Using compression %s for the rewrite.', str(advice.chosen))
+        return advice.chosen.complevel, advice.chosen.shuffle
+
+    @contextmanager
+    def rewriting(self):
+        # the external tools can not be throttled, so the bytes of the file are taken from
+        # the IOGovernor before the file is rewritten, which limits the rate on average
+        if self.governor:
+            with self.governor.opened():
+                self.governor.consume(self.abs_path.stat().st_size)
+                yield
+        else:
+            yield
 
     @property
     def has_infos_fixable(self):
-        for info in self.infos[:]:
-            message, fix = info
-            if fix:
-                return bool(self.infos)
+        return any(info.fix for info in self.infos)
 
     @property
     def has_warnings(self):
@@ -144,46 +273,8 @@ class File(object):
     def is_clean(self):
         return not (self.has_warnings or self.has_errors or self.has_criticals)
 
-    def get_logger(self):
-        # setup a log handler for the command line and one for the file
-        logger_name = str(self.path)
-        logger = colorlog.getLogger(logger_name)
-
-        # do not propagate messages to the root logger,
-        # which is configured in settings.setup()
-        logger.propagate = False
-
-        # add handlers
-        logger.addHandler(self.get_stream_handler())
-        if settings.LOG_PATH:
-            self.handler = self.get_file_handler()
-            logger.addHandler(self.handler)
-
-        return logger
-
-    def get_stream_handler(self):
-        formatter = colorlog.ColoredFormatter(' %(log_color)s%(levelname)-9s: %(message)s%(reset)s')
-
-        handler = colorlog.StreamHandler()
-        handler.setLevel(settings.LOG_LEVEL)
-        handler.setFormatter(formatter)
-
-        return handler
-
-    def get_file_handler(self):
-        log_path = settings.LOG_PATH / self.path.with_suffix('.log')
-        log_path.parent.mkdir(parents=True, exist_ok=True)
-
-        formatter = logging.Formatter(' %(levelname)-9s: %(message)s')
-
-        handler = logging.FileHandler(log_path, 'w')
-        handler.setLevel(logging.INFO)
-        handler.setFormatter(formatter)
-
-        return handler
-
     def match(self):
-        match = settings.PATTERN['file'].match(self.path.name)
+        match = self.settings.PATTERN['file'].match(self.path.name)
         if match:
             for key, value in match.groupdict().items():
                 if value is not None:
@@ -199,13 +290,48 @@ class File(object):
             self.matched = False
 
     def validate(self):
-        try:
-            jsonschema.validate(schema=settings.SCHEMA, instance=self.json)
-        except jsonschema.exceptions.ValidationError as e:
-            self.error('Failed to validate with JSON schema: %s\n%s', self.json, e)
+        instance = self.json
+        error = jsonschema.exceptions.best_match(self.settings.VALIDATOR.iter_errors(instance))
+        if error is not None:
+            self.error('Failed to validate with JSON schema: %s\n%s', instance, error)
 
     def copy(self):
-        copy_file(self.abs_path, settings.CHECKED_PATH / self.path)
+        copy_file(self.abs_path, self.settings.CHECKED_PATH / self.path, self.governor)
 
     def move(self):
-        move_file(self.abs_path, settings.CHECKED_PATH / self.path)
+        move_file(self.abs_path, self.settings.CHECKED_PATH / self.path, self.governor)
+
+
+class Finding(object):
+    '''
+    A finding of a check: the level (infos, warnings, errors or criticals), the name of
+    the check, the message template with its arguments and, for fixable findings, the
+    fix as (name of the function in isimip_qc.fixes, arguments after the file).
+    Findings do not refer to the file, so they can be pickled and sent to other processes.
+    '''
+
+    __slots__ = ('level', 'check', 'message', 'args', 'fix', 'fix_datamodel')
+
+    def __init__(self, level, check, message, args=(), fix=None, fix_datamodel=False):
+        self.level = level
+        self.check = check
+        self.message = message
+        self.args = args
+        self.fix = fix
+        self.fix_datamodel = fix_datamodel
+
+    def __repr__(self):
+        return '<Finding {} {}: {}>'.format(self.level, self.check, self.text)
+
+    @property
+    def key(self):
+        # findings are grouped by level, check and the message template
+        return (self.level, self.check, self.message)
+
+    @property
+    def text(self):
+        return self.message % self.args
+
+    def apply(self, file):
+        function_name, args = self.fix
+        getattr(fixes, function_name)(file, *args)
@@ -0,0 +1,107 @@
+import math
+from functools import reduce
+from operator import mul
+
+import colorlog
+
+try:
+    import h5py
+except ImportError:
+    h5py = None
+
+logger = colorlog.getLogger(__name__)
+
+# rough throughput (in bytes per second) to predict the run time of --minmax and
+# --fix-datamodel: reading from disk, inflating (uncompressed bytes), deflating
+# with level 5 (uncompressed bytes) and scanning the values with numpy
+READ_RATE = 200 * 1024 ** 2
+INFLATE_RATE = 300 * 1024 ** 2
+DEFLATE_RATE = 40 * 1024 ** 2
+SCAN_RATE = 500 * 1024 ** 2
+
+# time (in seconds) to locate and read a single chunk, independent of its size
+CHUNK_TIME = 0.0002
+
+
+def get_chunk_index(file_path, variable_name):
+    '''
+    Return the ChunkIndex of a variable, or None if it can not be read (h5py not
+    installed, NETCDF3 file, or the variable is missing).
+    '''
+    if h5py is None:
+        return None
+
+    try:
+        with h5py.File(file_path, 'r') as h5file:
+            return ChunkIndex(h5file[variable_name])
+    except (OSError, KeyError, ValueError) as e:
+        logger.debug('could not read the chunk index of %s: %s', file_path, e)
+        return None
+
+
+class ChunkIndex(object):
+    '''
+    Statistics of the chunks of a HDF5 dataset. Only the chunk index (B-tree) is
+    read, the chunks themselves are neither read nor decompressed.
+    '''
+
+    def __init__(self, dataset):
+        self.shape = dataset.shape
+        self.chunk_shape = dataset.chunks
+        self.itemsize = dataset.dtype.itemsize
+        self.data_bytes = reduce(mul, self.shape, 1) * self.itemsize
+        self.compressed = dataset.compression is not None
+
+        self.chunks = 0
+        self.stored_bytes = 0
+
+        if self.chunk_shape is None:
+            # contiguous storage
+            self.chunks_total = 1
+            self.chunk_bytes = self.data_bytes
+            self.stored_bytes = dataset.id.get_storage_size()
+            self.chunks = 1 if self.stored_bytes else 0
+        else:
+            self.chunks_total = reduce(mul, (math.ceil(size / chunk_size)
+                                             for size, chunk_size in zip(self.shape, self.chunk_shape)), 1)
+            self.chunk_bytes = reduce(mul, self.chunk_shape, 1) * self.itemsize
+
+            if hasattr(dataset.id, 'chunk_iter'):
+                # one pass over the index, needs HDF5 >= 1.12.3
+                dataset.id.chunk_iter(self.add)
+            else:
+                for i in range(dataset.id.get_num_chunks()):
+                    self.add(dataset.id.get_chunk_info(i))
+
+    def add(self, chunk_info):
+        self.chunks += 1
+        self.stored_bytes += chunk_info.size
+
+    @property
+    def empty_chunks(self):
+        # chunks which were never written and are read as fill values
+        return self.chunks_total - self.chunks
+
+    @property
+    def uncompressed_bytes(self):
+        return self.chunks * self.chunk_bytes
+
+    @property
+    def ratio(self):
+        return self.uncompressed_bytes / self.stored_bytes if self.stored_bytes else 0.0
+
+    @property
+    def minmax_time(self):
+        # read and inflate the stored chunks, then scan all values
+        seconds = self.chunks * CHUNK_TIME + self.stored_bytes / READ_RATE + self.data_bytes / SCAN_RATE
+        if self.compressed:
+            seconds += self.uncompressed_bytes / INFLATE_RATE
+        return seconds
+
+    @property
+    def fix_datamodel_time(self):
+        # read and inflate the stored chunks, deflate all data and write about the same amount
+        seconds = self.chunks * CHUNK_TIME + 2 * self.stored_bytes / READ_RATE + self.data_bytes / DEFLATE_RATE
+        if self.compressed:
+            seconds += self.uncompressed_bytes / INFLATE_RATE
+        return seconds
@@ -0,0 +1,134 @@
+import itertools
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+import colorlog
+import netCDF4
+import numpy as np
+
+try:
+    import h5py
+except ImportError:
+    h5py = None
+
+logger = colorlog.getLogger(__name__)
+
+# HDF5 filter ids, see H5Zpublic.h
+FILTER_DEFLATE = 1
+FILTER_SHUFFLE = 2
+FILTER_FLETCHER32 = 3
+
+SUPPORTED_FILTERS = [FILTER_DEFLATE, FILTER_SHUFFLE, FILTER_FLETCHER32]
+
+# attributes which netCDF4 applies when reading, those variables are read using netCDF4
+UNSUPPORTED_ATTRIBUTES = ['scale_factor', 'add_offset', 'valid_min', 'valid_max', 'valid_range']
+
+
+def get_chunk_reader(file_path, variable, threads):
+    '''
+    Return a ChunkReader for the netCDF variable, or None if the variable can not be
+    read chunk by chunk (h5py not installed, NETCDF3 file, contiguous storage,
+    unsupported filters), in which case the variable is read using netCDF4.
+    '''
+    if not threads or h5py is None:
+        return None
+
+    if not variable.group().data_model.startswith('NETCDF4') or not isinstance(variable.chunking(), list):
+        return None
+
+    if any(attr in variable.ncattrs() for attr in UNSUPPORTED_ATTRIBUTES):
+        return None
+
+    try:
+        reader = ChunkReader(file_path, variable, threads)
+    except (OSError, KeyError, ValueError) as e:
+        logger.debug('could not open %s with h5py: %s', file_path, e)
+        return None
+
+    if not reader.is_supported:
+        reader.close()
+        return None
+
+    return reader
+
+
+class ChunkReader(object):
+    '''
+    Reads a chunked netCDF4/HDF5 variable using h5py direct chunk reads. The chunks
+    of each slab are inflated on a thread pool, which scales with the number of
+    cores since zlib releases the GIL.
+    '''
+
+    def __init__(self, file_path, variable, threads):
+        self.h5file = h5py.File(file_path, 'r')
+        self.dataset = self.h5file[variable.name]
+        self.chunk_shape = self.dataset.chunks
+        self.dtype = self.dataset.dtype
+
+        plist = self.dataset.id.get_create_plist()
+        self.filters = [plist.get_filter(i)[0] for i in range(plist.get_nfilters())]
+
+        try:
+            self.fill_values = [variable.getncattr('_FillValue')]
+        except AttributeError:
+            self.fill_values = [netCDF4.default_fillvals[self.dtype.str[1:]]]
+        try:
+            self.fill_values.append(variable.getncattr('missing_value'))
+        except AttributeError:
+            pass
+
+        self.executor = ThreadPoolExecutor(max_workers=threads)
+
+    @property
+    def is_supported(self):
+        return self.chunk_shape is not None and all(code in SUPPORTED_FILTERS for code in self.filters)
+
+    def close(self):
+        self.executor.shutdown()
+        self.h5file.close()
+
+    def read(self, index):
+        shape = self.dataset.shape
+        starts = [i.start or 0 for i in index]
+        stops = [shape[axis] if i.stop is None else i.stop for axis, i in enumerate(index)]
+
+        data = np.empty([stop - start for start, stop in zip(starts, stops)], dtype=self.dtype)
+
+        # the origins of all chunks which overlap with the slab
+        ranges = [range(start - start % size, stop, size)
+                  for start, stop, size in zip(starts, stops, self.chunk_shape)]
+        origins = list(itertools.product(*ranges))
+
+        for origin, chunk in zip(origins, self.executor.map(self.read_chunk, origins)):
+            source = tuple(slice(max(start, o) - o, min(stop, o + size) - o)
+                           for o, start, stop, size in zip(origin, starts, stops, self.chunk_shape))
+            target = tuple(slice(max(start, o) - start, min(stop, o + size) - start)
+                           for o, start, stop, size in zip(origin, starts, stops, self.chunk_shape))
+            data[target] = chunk[source]
+
+        mask = np.zeros(data.shape, dtype=bool)
+        for fill_value in self.fill_values:
+            mask |= (data == fill_value)
+
+        return np.ma.MaskedArray(data, mask=mask)
+
+    def read_chunk(self, origin):
+        try:
+            filter_mask, buffer = self.dataset.id.read_direct_chunk(origin)
+        except (KeyError, ValueError, RuntimeError):
+            # the chunk was never written
+            return np.full(self.chunk_shape, self.fill_values[0], dtype=self.dtype)
+
+        # undo the filters in reverse order, a set bit in filter_mask means the filter was skipped
+        for i, code in reversed(list(enumerate(self.filters))):
+            if filter_mask & (1 << i):
+                continue
+            if code == FILTER_DEFLATE:
+                buffer = zlib.decompress(buffer)
+            elif code == FILTER_SHUFFLE:
+                buffer = np.frombuffer(buffer, dtype=np.uint8) \
+                           .reshape(self.dtype.itemsize, -1).T.tobytes()
+            elif code == FILTER_FLETCHER32:
+                buffer = buffer[:-4]
+
+        return np.frombuffer(buffer, dtype=self.dtype).reshape(self.chunk_shape)
@@ -0,0 +1,127 @@
+import math
+import time
+import zlib
+
+import colorlog
+import numpy as np
+
+from .netcdf import open_dataset_read
+from .sample import get_samples
+
+logger = colorlog.getLogger(__name__)
+
+# check_zip requires at least this compression level
+MIN_COMPLEVEL = 4
+
+# the compression levels which are tried, with and without the shuffle filter
+COMPLEVELS = [4, 5, 6, 9]
+
+# number of time steps which are compressed to compare the candidates
+SAMPLE_SIZE = 8
+
+# candidates which are at most this share larger than the smallest one are
+# considered, of those the fastest is chosen
+SIZE_TOLERANCE = 0.05
+
+
+class Candidate(object):
+
+    def __init__(self, complevel, shuffle, least_significant_digit=None):
+        self.complevel = complevel
+        self.shuffle = shuffle
+        self.least_significant_digit = least_significant_digit
+        self.size = 0
+        self.seconds = 0.0
+
+    def __str__(self):
+        return 'level {}{}{}'.format(self.complevel, ' with shuffle' if self.shuffle else '',
+                                     '' if self.least_significant_digit is None else
+                                     ', least_significant_digit={}'.format(self.least_significant_digit))
+
+    @property
+    def is_lossy(self):
+        return self.least_significant_digit is not None
+
+    def compress(self, data, mask):
+        if self.is_lossy:
+            data = quantize(data, mask, self.least_significant_digit)
+
+        start = time.perf_counter()
+        buffer = data.tobytes()
+        if self.shuffle:
+            # the HDF5 shuffle filter: the first bytes of all values, then the second bytes, ...
+            buffer = np.frombuffer(buffer, dtype=np.uint8).reshape(-1, data.dtype.itemsize).T.tobytes()
+        self.size += len(zlib.compress(buffer, self.complevel))
+        self.seconds += time.perf_counter() - start
+
+
+class Advice(object):
+    '''
+    The candidates with their size and the time to compress, extrapolated from the
+    sample to the whole variable, and the chosen lossless candidate: the fastest one
+    which is at most SIZE_TOLERANCE larger than the smallest. Lossy candidates are
+    only reported, since they change the data.
+    '''
+
+    def __init__(self, candidates, data_bytes, sample_bytes, sample_size):
+        self.candidates = candidates
+        self.sample_size = sample_size
+
+        factor = data_bytes / sample_bytes if sample_bytes else 0
+        for candidate in candidates:
+            candidate.size = int(candidate.size * factor)
+            candidate.seconds *= factor
+
+        lossless = [candidate for candidate in candidates if not candidate.is_lossy]
+        smallest = min(candidate.size for candidate in lossless)
+        self.chosen = min((candidate for candidate in lossless if candidate.size <= smallest * (1 + SIZE_TOLERANCE)),
+                          key=lambda candidate: candidate.seconds)
+
+
+def get_candidates(least_significant_digit=None, shuffle=True):
+    # without shuffle, only candidates without the shuffle filter are tried (e.g. for cdo)
+    filters = [False, True] if shuffle else [False]
+    candidates = [Candidate(complevel, shuffle_filter) for complevel in COMPLEVELS for shuffle_filter in filters]
+    if least_significant_digit is not None:
+        candidates += [Candidate(MIN_COMPLEVEL, shuffle_filter, least_significant_digit) for shuffle_filter in filters]
+    return candidates
+
+
+def get_advice(file_path, variable_name, least_significant_digit=None, shuffle=True):
+    '''
+    Compress a sample of time steps of the variable in memory with the candidate
+    settings (see get_candidates) and return the Advice, or None if the variable can
+    not be read. least_significant_digit (from the protocol) adds lossy candidates,
+    shuffle=False leaves out the candidates with the shuffle filter.
+    '''
+    try:
+        dataset = open_dataset_read(file_path)
+    except OSError as e:
+        logger.error('could not read %s: %s', file_path, e)
+        return None
+
+    try:
+        variable = dataset.variables.get(variable_name)
+        if variable is None or not variable.ndim:
+            return None
+
+        candidates = get_candidates(least_significant_digit, shuffle)
+        sample_bytes = 0
+        samples = get_samples(variable.shape, SAMPLE_SIZE, str(file_path))
+        for index in samples:
+            data = variable[index]
+            values = np.ascontiguousarray(np.ma.getdata(data))
+            mask = np.ma.getmaskarray(data)
+            sample_bytes += values.nbytes
+            for candidate in candidates:
+                candidate.compress(values, mask)
+
+        return Advice(candidates, variable.size * variable.dtype.itemsize, sample_bytes, len(samples))
+    finally:
+        dataset.close()
+
+
+def quantize(data, mask, least_significant_digit):
+    # the quantization of netCDF4 for least_significant_digit, missing values are kept
+    scale = 2.0 ** math.ceil(math.log2(10 ** least_significant_digit))
+    return np.where(mask, data, np.around(scale * data) / scale).astype(data.dtype)
@@ -1,26 +1,144 @@
 import os
 import shutil
+import sys
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 import colorlog
 
 logger = colorlog.getLogger(__name__)
 
+# size of the blocks of a throttled copy
+COPY_BUFFER_SIZE = 8 * 1024 * 1024
 
-def walk_files(path):
-    for root, dirs, file_names in sorted(os.walk(path)):
-        for file_name in sorted(file_names):
-            file_path = Path(root) / file_name
+
+def walk_files(path, threads=0):
+    '''
+    Yield the files below path in sorted order, one directory at a time, so that
+    the first file is available before the rest of the tree was visited. With
+    threads, the listings of the subdirectories are read ahead in parallel.
+    '''
+    executor = ThreadPoolExecutor(max_workers=threads) if threads else None
+    try:
+        yield from walk_dir(Path(path), executor)
+    finally:
+        if executor:
+            executor.shutdown(wait=False)
+
+
+def walk_dir(path, executor=None, listing=None):
+    file_names, dir_names = listing.result() if listing else scan_dir(path)
+
+    if executor:
+        listings = [executor.submit(scan_dir, path / dir_name) for dir_name in dir_names]
+    else:
+        listings = [None] * len(dir_names)
+
+    for file_name in file_names:
+        yield path / file_name
+
+    for dir_name, dir_listing in zip(dir_names, listings):
+        yield from walk_dir(path / dir_name, executor, dir_listing)
+
+
+def scan_dir(path):
+    file_names, dir_names = [], []
+    try:
+        with os.scandir(path) as entries:
+            for entry in entries:
+                if entry.is_dir():
+                    # like os.walk, do not follow symlinks to directories
+                    if not entry.is_symlink():
+                        dir_names.append(entry.name)
+                else:
+                    file_names.append(entry.name)
+    except OSError as e:
+        logger.error('could not read directory %s: %s', path, e)
+
+    return sorted(file_names), sorted(dir_names)
+
+
+def list_files(list_path, base_path):
+    # read the files from a list file (or stdin for "-"), one path per line,
+    # relative paths are taken relative to base_path
+    list_file = sys.stdin if str(list_path) == '-' else open(Path(list_path).expanduser())
+    try:
+        for line in list_file:
+            line = line.strip()
+            if line and not line.startswith('#'):
+                file_path = base_path / Path(line).expanduser()
+                # also for relative paths with "..", the file must be below base_path
+                relative_path = Path(os.path.relpath(file_path, base_path))
+                if relative_path.parts[:1] == ('..', ):
+                    logger.error('%s is not located in UNCHECKED_PATH (%s)', file_path, base_path)
+                else:
+                    yield base_path / relative_path
+    finally:
+        if list_file is not sys.stdin:
+            list_file.close()
+
+
+def glob_files(base_path, pattern):
+    for file_path in base_path.glob(pattern):
+        if file_path.is_file():
             yield file_path
 
 
-def move_file(source_path, target_path):
+def filter_files(file_paths, pattern, include=None, exclude=None):
+    # apply the --include/--exclude options on the file name alone, before any
+    # file is opened, files which do not match the pattern are passed on, so that
+    # they are reported as usual, pattern can also be a function which returns
+    # the pattern for a file path (or None)
+    include = include.split(sep=',') if include else None
+    exclude = exclude.split(sep=',') if exclude else None
+
+    for file_path in file_paths:
+        if include or exclude:
+            file_pattern = pattern(file_path) if callable(pattern) else pattern
+            match = file_pattern.match(file_path.name) if file_pattern else None
+            if match:
+                variable = match.groupdict().get('variable')
+                if include and variable not in include:
+                    logger.debug('%s skipped by include option', file_path)
+                    continue
+                if exclude and variable in exclude:
+                    logger.debug('%s skipped by exclude option', file_path)
+                    continue
+
+        yield file_path
+
+
+def move_file(source_path, target_path, governor=None):
     logger.debug('source_path=%s target_path=%s', source_path, target_path)
     target_path.parent.mkdir(parents=True, exist_ok=True)
-    shutil.move(source_path, target_path)
+    if governor is None:
+        shutil.move(source_path, target_path)
+    else:
+        # a move within the file system is a rename, otherwise the file is copied
+        shutil.move(source_path, target_path,
+                    copy_function=lambda source, target: copy_throttled(source, target, governor, stat=True))
 
 
-def copy_file(source_path, target_path):
+def copy_file(source_path, target_path, governor=None):
     logger.debug('source_path=%s target_path=%s', source_path, target_path)
     target_path.parent.mkdir(parents=True, exist_ok=True)
-    shutil.copy(source_path, target_path)
+    if governor is None:
+        shutil.copy(source_path, target_path)
+    else:
+        copy_throttled(source_path, target_path, governor)
+
+
+def copy_throttled(source_path, target_path, governor, stat=False):
+    # copy block by block, so that the bytes read are limited by the governor
+    with open(source_path, 'rb') as source, open(target_path, 'wb') as target:
+        while True:
+            buffer = source.read(COPY_BUFFER_SIZE)
+            if not buffer:
+                break
+            governor.consume(len(buffer))
+            target.write(buffer)
+
+    if stat:
+        shutil.copystat(source_path, target_path)
+    else:
+        shutil.copymode(source_path, target_path)
@@ -0,0 +1,82 @@
+import hashlib
+
+import netCDF4
+import numpy as np
+
+# the parts of a file a check can read:
+# data_model, dimensions (names and sizes), global_attributes, variables (names, dtypes
+# and dimensions), attributes (of the variables), storage (chunking and compression),
+# fill_values (_FillValue and missing_value), coordinates (values of the coordinate
+# variables) and data (values of all other variables, which are never changed by a fix)
+HEADER_FIELDS = [
+    'data_model', 'dimensions', 'global_attributes', 'variables',
+    'attributes', 'storage', 'fill_values', 'coordinates'
+]
+
+
+def reads(*fields):
+    '''
+    Declare the parts of the file a check reads (see HEADER_FIELDS). After --fix or
+    --fix-datamodel, only the checks which read a changed part are performed again.
+    Checks without this declaration are always performed again.
+    '''
+    def decorator(function):
+        function.reads = fields
+        return function
+    return decorator
+
+
+def get_header(dataset):
+    # a snapshot of the parts of the header which can be changed by a fix
+    header = {
+        'data_model': dataset.data_model,
+        'dimensions': {name: dimension.size for name, dimension in dataset.dimensions.items()},
+        'global_attributes': {name: get_value(dataset.getncattr(name)) for name in dataset.ncattrs()},
+        'variables': {},
+        'attributes': {},
+        'storage': {},
+        'fill_values': {},
+        'coordinates': {}
+    }
+
+    for name, variable in dataset.variables.items():
+        header['variables'][name] = (str(variable.dtype), variable.dimensions)
+        header['attributes'][name] = {attr: get_value(variable.getncattr(attr)) for attr in variable.ncattrs()}
+        header['storage'][name] = (variable.chunking(), variable.filters())
+        header['fill_values'][name] = get_fill_values(variable)
+
+        if variable.dimensions == (name, ):
+            values = np.ascontiguousarray(np.ma.getdata(variable[:]))
+            header['coordinates'][name] = hashlib.sha1(values.tobytes()).hexdigest()
+
+    return header
+
+
+def get_changed_fields(header, new_header):
+    return {field for field in HEADER_FIELDS if header.get(field) != new_header.get(field)}
+
+
+def get_value(value):
+    # attributes can be numpy arrays, which can not be compared with ==
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    elif isinstance(value, np.generic):
+        return value.item()
+    else:
+        return value
+
+
+def get_fill_values(variable):
+    # the values which are masked when the data is read
+    try:
+        fill_values = [get_value(variable.getncattr('_FillValue'))]
+    except AttributeError:
+        fill_values = [netCDF4.default_fillvals.get(getattr(variable.dtype, 'str', '')[1:])]
+    try:
+        missing_value = get_value(variable.getncattr('missing_value'))
+        if missing_value not in fill_values:
+            fill_values.append(missing_value)
+    except AttributeError:
+        pass
+
+    return fill_values
@@ -0,0 +1,86 @@
+from functools import lru_cache
+
+import colorlog
+import netCDF4
+import numpy as np
+
+logger = colorlog.getLogger(__name__)
+
+# number of set bits for every byte, used if numpy has no bitwise_count (numpy < 2.0)
+POPCOUNT = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+
+@lru_cache(maxsize=None)
+def get_landseamask(mask_path):
+    '''
+    Return the LandSeaMask read from the NetCDF file mask_path, or None if it can not be
+    read. The mask is read only once per process and kept as a packed bitset.
+    '''
+    try:
+        with netCDF4.Dataset(mask_path) as dataset:
+            for variable in dataset.variables.values():
+                if variable.dimensions[-2:] == ('lat', 'lon') and variable.size == variable.shape[-2] * variable.shape[-1]:
+                    data = variable[:].reshape(variable.shape[-2:])
+                    land = ~np.ma.getmaskarray(data) & (np.ma.getdata(data) != 0)
+                    return LandSeaMask(dataset.variables['lat'][:], dataset.variables['lon'][:], land)
+
+            logger.error('no variable with the dimensions (lat, lon) found in %s', mask_path)
+    except (OSError, KeyError) as e:
+        logger.error('could not read the land-sea mask %s: %s', mask_path, e)
+
+
+def popcount(bits, axis):
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(bits).sum(axis=axis, dtype=np.int64)
+    else:
+        return POPCOUNT[bits].sum(axis=axis, dtype=np.int64)
+
+
+class LandSeaMask(object):
+    '''
+    The land cells of a grid as a packed bitset (one bit per cell, row by row). The
+    valid cells of a field are packed the same way, so that the cells which do not
+    match the mask are counted with a bitwise AND/XOR and a popcount.
+    '''
+
+    def __init__(self, lat, lon, land):
+        self.lat = np.ma.getdata(lat)
+        self.lon = np.ma.getdata(lon)
+        self.shape = land.shape
+        self.land_count = int(np.count_nonzero(land))
+        self.bits = np.packbits(land.ravel())
+
+        # the mask with reversed latitudes, for files ordered S to N
+        self.bits_reversed = np.packbits(land[::-1].ravel())
+
+    def get_bits(self, lat, lon):
+        # return the bitset for a file with these coordinates, or None if the grids differ
+        lat, lon = np.ma.getdata(lat), np.ma.getdata(lon)
+        if lat.shape != self.lat.shape or lon.shape != self.lon.shape or not np.allclose(lon, self.lon):
+            return None
+        elif np.allclose(lat, self.lat):
+            return self.bits
+        elif np.allclose(lat[::-1], self.lat):
+            return self.bits_reversed
+
+    def get_land(self, bits):
+        # the unpacked mask for one of the bitsets, to compare parts of fields
+        size = self.shape[0] * self.shape[1]
+        return np.unpackbits(bits, count=size).reshape(self.shape).astype(bool)
+
+    def count(self, bits, valid):
+        '''
+        Count, for every field of valid (shape [..., lat, lon]), the ocean cells with
+        values and the land cells without values. Returns two arrays with the shape of
+        the leading dimensions of valid.
+        '''
+        fields = valid.reshape(-1, self.shape[0] * self.shape[1])
+        valid_bits = np.packbits(fields, axis=1)
+
+        # the padding bits are 0 in both bitsets and are never counted
+        mismatch = valid_bits ^ bits
+        ocean_values = popcount(mismatch & valid_bits, axis=1)
+        land_missing = popcount(mismatch & bits, axis=1)
+
+        shape = valid.shape[:-2]
+        return ocean_values.reshape(shape), land_missing.reshape(shape)
@@ -0,0 +1,106 @@
+import io
+import logging
+import threading
+
+import colorlog
+
+CONSOLE_FORMAT = ' %(log_color)s%(levelname)-9s: %(message)s%(reset)s'
+FILE_FORMAT = ' %(levelname)-9s: %(message)s'
+
+# size of the write buffer of the log files, they are written when full or when closed
+FILE_BUFFER_SIZE = 64 * 1024
+
+console_handler = None
+
+file_handlers = []
+file_handlers_lock = threading.Lock()
+
+
+def get_console_handler(level):
+    # all files share one handler for the command line
+    global console_handler
+
+    if console_handler is None:
+        console_handler = colorlog.StreamHandler()
+        console_handler.setFormatter(colorlog.ColoredFormatter(CONSOLE_FORMAT))
+
+    console_handler.setLevel(level)
+    return console_handler
+
+
+def acquire_file_handler(log_path):
+    with file_handlers_lock:
+        handler = file_handlers.pop() if file_handlers else BufferedFileHandler()
+
+    handler.open(log_path)
+    return handler
+
+
+def release_file_handler(handler):
+    handler.close()
+    with file_handlers_lock:
+        file_handlers.append(handler)
+
+
+class BufferedFileHandler(logging.Handler):
+    '''
+    A file handler which is re-used for many log files and does not flush after
+    every record, in contrast to logging.FileHandler.
+    '''
+
+    def __init__(self):
+        super().__init__(logging.INFO)
+        self.setFormatter(logging.Formatter(FILE_FORMAT))
+        self.stream = None
+
+    def open(self, log_path):
+        log_path.parent.mkdir(parents=True, exist_ok=True)
+        self.stream = io.open(log_path, 'w', buffering=FILE_BUFFER_SIZE)
+
+    def emit(self, record):
+        try:
+            self.stream.write(self.format(record) + '\n')
+        except Exception:
+            self.handleError(record)
+
+    def close(self):
+        if self.stream is not None:
+            self.stream.close()
+            self.stream = None
+
+
+class LogSink(object):
+    '''
+    Receives the log messages for one file and passes them to the shared console
+    handler and (optionally) to a log file. In contrast to a logging.Logger, a
+    LogSink is not registered in the logging manager and can be discarded with
+    the file. Records are only created (and formatted) if a handler will use them.
+    '''
+
+    def __init__(self, name, level, log_path=None, console=True):
+        self.name = name
+        self.handlers = [get_console_handler(level)] if console else []
+        self.file_handler = None
+
+        if log_path is not None:
+            self.file_handler = acquire_file_handler(log_path)
+            self.handlers.append(self.file_handler)
+
+        # without handlers, no records are created at all
+        self.level = min((handler.level for handler in self.handlers), default=logging.CRITICAL + 1)
+
+    def is_enabled_for(self, level):
+        return level >= self.level
+
+    def log(self, level, message, args):
+        if level >= self.level:
+            record = logging.LogRecord(self.name, level, self.name, 0, message, args, None)
+            for handler in self.handlers:
+                if level >= handler.level:
+                    handler.handle(record)
+
+    def close(self):
+        if self.file_handler is not None:
+            release_file_handler(self.file_handler)
+            self.handlers.remove(self.file_handler)
+            self.file_handler = None
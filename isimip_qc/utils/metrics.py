@@ -0,0 +1,229 @@
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+
+import colorlog
+
+from .summary import LEVELS
+
+logger = colorlog.getLogger(__name__)
+
+PREFIX = 'isimip_qc'
+
+# upper bounds (in seconds) of the buckets of the histograms of durations
+DURATION_BUCKETS = [0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 300, 900, 3600, 14400]
+
+# minimum number of seconds between two writes of the textfile
+WRITE_INTERVAL = 15
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+class Histogram(object):
+
+    def __init__(self, buckets=DURATION_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+
+    def render(self, name, labels=''):
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            lines.append('%s_bucket{%sle="%s"} %s' % (name, labels + ',' if labels else '', bound, cumulative))
+        lines.append('%s_bucket{%sle="+Inf"} %s' % (name, labels + ',' if labels else '', self.count))
+        lines.append('%s_sum%s %s' % (name, '{%s}' % labels if labels else '', self.sum))
+        lines.append('%s_count%s %s' % (name, '{%s}' % labels if labels else '', self.count))
+        return lines
+
+
+class Metrics(object):
+    '''
+    Counters and histograms of a run in the text format of Prometheus: the checked
+    files and their size, the findings by level, the durations of the files and of
+    every check, the prefetched headers which were ready in time, the files left to
+    check (or the files in the queue by status) and the I/O of the IOGovernor. The
+    metrics are written to textfile_path (e.g. for the textfile collector of the node
+    exporter) at most every WRITE_INTERVAL seconds, and/or served on GET /metrics by
+    start_server(). A stall (e.g. a file which hangs in a recall from tape) shows as a
+    last_file_timestamp_seconds which does not advance.
+    '''
+
+    def __init__(self, textfile_path=None, governor=None):
+        self.textfile_path = textfile_path
+        self.governor = governor
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.written = 0
+        self.server = None
+
+        self.files = 0
+        self.bytes = 0
+        self.last_file = None
+        self.files_left = None
+        self.queue_counts = None
+        self.findings = dict.fromkeys(LEVELS, 0)
+        self.file_durations = Histogram()
+        self.check_durations = {}
+        self.prefetch = {'hit': 0, 'miss': 0}
+
+    @property
+    def elapsed(self):
+        return time.time() - self.started
+
+    @property
+    def files_rate(self):
+        elapsed = self.elapsed
+        return self.files / elapsed if elapsed > 0 else 0
+
+    @property
+    def bytes_rate(self):
+        elapsed = self.elapsed
+        return self.bytes / elapsed if elapsed > 0 else 0
+
+    def add(self, result):
+        # result is the result of check_file, with Finding objects
+        with self.lock:
+            self.files += 1
+            self.bytes += result.get('size', 0)
+            self.last_file = time.time()
+            if self.files_left:
+                self.files_left -= 1
+
+            for finding in result['findings']:
+                self.findings[finding.level] += 1
+
+            if result.get('duration') is not None:
+                self.file_durations.observe(result['duration'])
+            for check, duration in result.get('check_durations', {}).items():
+                self.check_durations.setdefault(check, Histogram()).observe(duration)
+
+        self.write()
+
+    def add_prefetch(self, hit):
+        with self.lock:
+            self.prefetch['hit' if hit else 'miss'] += 1
+
+    def set_files_left(self, files):
+        with self.lock:
+            self.files_left = files
+
+    def set_queue_counts(self, counts):
+        with self.lock:
+            self.queue_counts = dict(counts)
+
+    def render(self):
+        with self.lock:
+            lines = []
+            add_metric(lines, 'started_timestamp_seconds', 'gauge', 'Start of the run.', self.started)
+            add_metric(lines, 'last_file_timestamp_seconds', 'gauge', 'Time the last file was finished.',
+                       self.last_file)
+            add_metric(lines, 'files_total', 'counter', 'Files checked.', self.files)
+            add_metric(lines, 'bytes_total', 'counter', 'Size of the files checked.', self.bytes)
+            add_metric(lines, 'findings_total', 'counter', 'Findings by level.',
+                       *[('level="%s"' % level, count) for level, count in self.findings.items()])
+            add_metric(lines, 'files_left', 'gauge', 'Files which are not checked yet.', self.files_left)
+            if self.queue_counts is not None:
+                add_metric(lines, 'queue_files', 'gauge', 'Files in the queue by status.',
+                           *[('status="%s"' % status, count) for status, count in sorted(self.queue_counts.items())])
+            add_metric(lines, 'prefetch_total', 'counter', 'Prefetched headers which were ready or not in time.',
+                       *[('result="%s"' % result, count) for result, count in self.prefetch.items()])
+
+            name = '%s_file_duration_seconds' % PREFIX
+            lines += ['# HELP %s Duration of the check of a file.' % name, '# TYPE %s histogram' % name]
+            lines += self.file_durations.render(name)
+
+            name = '%s_check_duration_seconds' % PREFIX
+            lines += ['# HELP %s Duration of each check.' % name, '# TYPE %s histogram' % name]
+            for check, histogram in sorted(self.check_durations.items()):
+                lines += histogram.render(name, 'check="%s"' % check)
+
+        if self.governor:
+            add_metric(lines, 'io_read_bytes_total', 'counter', 'Bytes read in all processes.',
+                       self.governor.total_bytes)
+            add_metric(lines, 'io_waited_seconds_total', 'counter', 'Time waited for --io-limit.',
+                       self.governor.total_waited)
+
+        return '\n'.join(lines) + '\n'
+
+    def write(self, force=False):
+        # the file is replaced atomically, so that the collector never reads a partial file
+        if not self.textfile_path or not (force or time.time() - self.written >= WRITE_INTERVAL):
+            return
+
+        self.written = time.time()
+        tmp_path = self.textfile_path.with_name('.' + self.textfile_path.name + '-tmp')
+        try:
+            with open(tmp_path, 'w') as f:
+                f.write(self.render())
+            os.replace(tmp_path, self.textfile_path)
+        except OSError as e:
+            logger.warning('could not write metrics to %s: %s', self.textfile_path, e)
+
+    def start_server(self, host, port):
+        # serve GET /metrics from a background thread until close()
+        self.server = MetricsServer((host, port), self)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.write(force=True)
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+
+
+class MetricsServer(ThreadingMixIn, HTTPServer):
+
+    daemon_threads = True
+
+    def __init__(self, address, metrics):
+        super().__init__(address, MetricsRequestHandler)
+        self.metrics = metrics
+
+
+class MetricsRequestHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        if self.path != '/metrics':
+            self.send_response(404)
+            self.end_headers()
+            return
+
+        body = self.server.metrics.render().encode()
+        self.send_response(200)
+        self.send_header('Content-Type', CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug('%s - %s', self.address_string(), format % args)
+
+
+def add_metric(lines, name, metric_type, description, *values):
+    # values is a single value or (labels, value) tuples, metrics without a value are left out
+    if len(values) == 1 and not isinstance(values[0], tuple):
+        if values[0] is None:
+            return
+        values = [('', values[0])]
+
+    name = '%s_%s' % (PREFIX, name)
+    lines += ['# HELP %s %s' % (name, description), '# TYPE %s %s' % (name, metric_type)]
+    lines += ['%s%s %s' % (name, '{%s}' % labels if labels else '', value) for labels, value in values]
+
+
+def format_bar(done, total, width=20):
+    filled = int(width * done / total) if total else width
+    return '[%s%s] %3i%%' % ('#' * filled, '-' * (width - filled), 100 * done / total if total else 100)
@@ -1,5 +1,10 @@
+import threading
+
 from netCDF4 import Dataset
 
+# the netCDF library is not thread-safe, threads which read files need to hold this lock
+netcdf_lock = threading.RLock()
+
 
 def open_dataset_read(file_path):
     return Dataset(file_path, 'r')
@@ -0,0 +1,79 @@
+import warnings
+
+import colorlog
+import netCDF4
+import numpy as np
+
+try:
+    from scipy.io import netcdf_file
+except ImportError:
+    netcdf_file = None
+
+from .chunks import UNSUPPORTED_ATTRIBUTES
+
+logger = colorlog.getLogger(__name__)
+
+# data models which can be read by scipy.io.netcdf_file
+SUPPORTED_DATA_MODELS = ['NETCDF3_CLASSIC', 'NETCDF3_64BIT_OFFSET']
+
+
+def get_mmap_reader(file_path, variable):
+    '''
+    Return a MmapReader for the netCDF variable, or None if the variable can not be
+    memory mapped (scipy not installed, no NETCDF3 file), in which case the variable
+    is read using netCDF4.
+    '''
+    if netcdf_file is None:
+        return None
+
+    if variable.group().data_model not in SUPPORTED_DATA_MODELS:
+        return None
+
+    if any(attr in variable.ncattrs() for attr in UNSUPPORTED_ATTRIBUTES):
+        return None
+
+    try:
+        return MmapReader(file_path, variable)
+    except (OSError, KeyError, ValueError, TypeError) as e:
+        logger.debug('could not memory map %s: %s', file_path, e)
+        return None
+
+
+class MmapReader(object):
+    '''
+    Reads a variable of a NETCDF3 file using scipy.io.netcdf_file with mmap. The data
+    of NETCDF3 files is neither chunked nor compressed, so every slab is a view on the
+    mapped file and the values are not copied to the heap. Only the mask is created.
+    '''
+
+    def __init__(self, file_path, variable):
+        self.netcdf_file = netcdf_file(file_path, 'r', mmap=True, maskandscale=False)
+        self.data = self.netcdf_file.variables[variable.name].data
+
+        dtype = self.data.dtype
+        try:
+            self.fill_values = [variable.getncattr('_FillValue')]
+        except AttributeError:
+            self.fill_values = [netCDF4.default_fillvals[dtype.kind + str(dtype.itemsize)]]
+        try:
+            self.fill_values.append(variable.getncattr('missing_value'))
+        except AttributeError:
+            pass
+
+    def close(self):
+        self.data = None
+
+        # netcdf_file warns if slabs still refer to the mapped file, the mapping is then
+        # closed by the garbage collector once the slabs are gone
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning)
+            self.netcdf_file.close()
+
+    def read(self, index):
+        data = self.data[index]
+
+        mask = np.zeros(data.shape, dtype=bool)
+        for fill_value in self.fill_values:
+            mask |= (data == fill_value)
+
+        return np.ma.MaskedArray(data, mask=mask, copy=False)
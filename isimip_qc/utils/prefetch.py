@@ -0,0 +1,69 @@
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import colorlog
+
+logger = colorlog.getLogger(__name__)
+
+# netCDF4/HDF5 put the superblock and most of the header at the start of the file
+HEADER_SIZE = 1024 * 1024
+
+
+def prefetch_files(file_paths, size, data=False, metrics=None):
+    '''
+    Yield from file_paths, while the headers of the next `size` files are read
+    in background threads. libnetcdf/HDF5 are not thread-safe, so the files are
+    not opened with netCDF4 here. Instead, the header is read into the page cache,
+    which hides the latency of the parallel file system for the Dataset() call
+    in the main thread. If metrics are given, they count whether the header of
+    each file was read before the file was yielded.
+    '''
+    if not size:
+        yield from file_paths
+        return
+
+    executor = ThreadPoolExecutor(max_workers=size)
+    queue = deque()
+    try:
+        for file_path in file_paths:
+            queue.append((file_path, executor.submit(prefetch_file, file_path, data)))
+            if len(queue) > size:
+                yield pop_prefetched(queue, metrics)
+
+        while queue:
+            yield pop_prefetched(queue, metrics)
+    finally:
+        for file_path, future in queue:
+            future.cancel()
+        executor.shutdown(wait=True)
+
+
+def pop_prefetched(queue, metrics=None):
+    file_path, future = queue.popleft()
+    if metrics:
+        metrics.add_prefetch(future.done())
+    return file_path
+
+
+def prefetch_file(file_path, data=False):
+    # only the first HEADER_SIZE bytes are read into a buffer, so that at most
+    # `size` headers are held in memory at the same time, the rest is left to
+    # the kernel via posix_fadvise (if available)
+    try:
+        fd = os.open(file_path, os.O_RDONLY)
+    except OSError as e:
+        logger.debug('prefetch failed for %s: %s', file_path, e)
+        return
+
+    try:
+        if hasattr(os, 'posix_fadvise'):
+            length = 0 if data else HEADER_SIZE
+            os.posix_fadvise(fd, 0, length, os.POSIX_FADV_WILLNEED)
+
+        os.read(fd, HEADER_SIZE)
+        logger.debug('prefetched %s', file_path)
+    except OSError as e:
+        logger.debug('prefetch failed for %s: %s', file_path, e)
+    finally:
+        os.close(fd)
@@ -0,0 +1,192 @@
+import json
+import os
+import socket
+import sqlite3
+import time
+
+import colorlog
+
+from .summary import SPECIFIERS
+
+logger = colorlog.getLogger(__name__)
+
+# the worst level of the findings of a file, infos do not count
+SEVERITIES = {
+    'warnings': 1,
+    'errors': 2,
+    'criticals': 3
+}
+
+# number of files which are written to the database in one transaction
+COMMIT_INTERVAL = 100
+
+SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS runs (
+        id INTEGER PRIMARY KEY,
+        started REAL NOT NULL,
+        finished REAL,
+        host TEXT,
+        schema_path TEXT,
+        unchecked_path TEXT,
+        arguments TEXT
+    );
+    CREATE TABLE IF NOT EXISTS files (
+        id INTEGER PRIMARY KEY,
+        run_id INTEGER NOT NULL REFERENCES runs (id),
+        path TEXT NOT NULL,
+        severity INTEGER NOT NULL,
+        duration REAL,
+        specifiers TEXT,
+        {specifiers}
+    );
+    CREATE TABLE IF NOT EXISTS findings (
+        file_id INTEGER NOT NULL REFERENCES files (id),
+        level TEXT NOT NULL,
+        check_name TEXT,
+        message TEXT NOT NULL,
+        text TEXT
+    );
+    CREATE INDEX IF NOT EXISTS files_run ON files (run_id);
+    CREATE INDEX IF NOT EXISTS files_path ON files (path, run_id);
+    CREATE INDEX IF NOT EXISTS files_model ON files (model);
+    CREATE INDEX IF NOT EXISTS files_variable ON files (variable);
+    CREATE INDEX IF NOT EXISTS files_climate_forcing ON files (climate_forcing);
+    CREATE INDEX IF NOT EXISTS findings_file ON findings (file_id);
+    CREATE INDEX IF NOT EXISTS findings_check ON findings (check_name, level);
+'''.format(specifiers=',\n        '.join('{} TEXT'.format(specifier) for specifier in SPECIFIERS))
+
+# the files of a run with the id of the previous result for the same path
+PREVIOUS_FILES = '''
+    SELECT f.id AS id, f.path AS path, f.severity AS severity, p.id AS previous_id, p.severity AS previous_severity
+    FROM files f LEFT JOIN files p ON p.id = (
+        SELECT id FROM files WHERE path = f.path AND run_id < f.run_id ORDER BY run_id DESC LIMIT 1
+    )
+    WHERE f.run_id = ?
+'''
+
+# the findings (without infos) of the first file which are not in the findings of the second file
+MISSING_FINDINGS = '''
+    SELECT level, check_name, message, text FROM findings n
+    WHERE file_id = ? AND level != 'infos' AND NOT EXISTS (
+        SELECT 1 FROM findings o
+        WHERE o.file_id = ? AND o.level = n.level AND o.check_name IS n.check_name AND o.message = n.message
+    )
+'''
+
+
+class ResultsDatabase(object):
+    '''
+    The results of all runs with --results in a SQLite database: one row per run, per
+    checked file (the specifiers are indexed columns) and per finding (with the message
+    template and the formatted text). Only the main process writes to the database,
+    the files are committed in batches of COMMIT_INTERVAL and at the end of the run.
+    A run without finished time was interrupted.
+    '''
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.connection = sqlite3.connect(str(db_path), timeout=60)
+        self.connection.executescript(SCHEMA)
+        self.pending = 0
+
+    def close(self):
+        self.connection.commit()
+        self.connection.close()
+
+    def start_run(self, schema_path=None, unchecked_path=None, arguments=None):
+        cursor = self.connection.execute('''
+            INSERT INTO runs (started, host, schema_path, unchecked_path, arguments) VALUES (?, ?, ?, ?, ?)
+        ''', (time.time(), '{}:{}'.format(socket.gethostname(), os.getpid()),
+              None if schema_path is None else str(schema_path),
+              None if unchecked_path is None else str(unchecked_path),
+              json.dumps(arguments or [])))
+        self.connection.commit()
+        return cursor.lastrowid
+
+    def finish_run(self, run_id):
+        self.connection.execute('UPDATE runs SET finished = ? WHERE id = ?', (time.time(), run_id))
+        self.connection.commit()
+        self.pending = 0
+
+    def add_file(self, run_id, file_path, result):
+        # result is the result of check_file, with Finding objects
+        findings = result['findings']
+        specifiers = result.get('specifiers') or {}
+        severity = max([SEVERITIES.get(finding.level, 0) for finding in findings] + [0])
+
+        cursor = self.connection.execute('''
+            INSERT INTO files (run_id, path, severity, duration, specifiers, {}) VALUES (?, ?, ?, ?, ?, {})
+        '''.format(', '.join(SPECIFIERS), ', '.join('?' * len(SPECIFIERS))),
+            (run_id, str(file_path), severity, result.get('duration'), json.dumps(specifiers, default=str)) +
+            tuple(None if specifiers.get(specifier) is None else str(specifiers[specifier]) for specifier in SPECIFIERS))
+
+        self.connection.executemany('''
+            INSERT INTO findings (file_id, level, check_name, message, text) VALUES (?, ?, ?, ?, ?)
+        ''', [(cursor.lastrowid, finding.level, finding.check, finding.message, finding.text) for finding in findings])
+
+        self.pending += 1
+        if self.pending >= COMMIT_INTERVAL:
+            self.connection.commit()
+            self.pending = 0
+
+    def get_runs(self, limit=None):
+        # yield (run_id, started, finished, schema_path, files, files with findings by level) for the last runs
+        rows = self.connection.execute('''
+            SELECT r.id, r.started, r.finished, r.schema_path, COUNT(f.id),
+                   SUM(EXISTS (SELECT 1 FROM findings WHERE file_id = f.id AND level = 'warnings')),
+                   SUM(EXISTS (SELECT 1 FROM findings WHERE file_id = f.id AND level = 'errors')),
+                   SUM(EXISTS (SELECT 1 FROM findings WHERE file_id = f.id AND level = 'criticals'))
+            FROM runs r LEFT JOIN files f ON f.run_id = r.id
+            GROUP BY r.id ORDER BY r.id DESC LIMIT ?
+        ''', (-1 if limit is None else limit, )).fetchall()
+
+        for run_id, started, finished, schema_path, files, warnings, errors, criticals in reversed(rows):
+            yield run_id, started, finished, schema_path, files, {
+                'warnings': warnings or 0, 'errors': errors or 0, 'criticals': criticals or 0
+            }
+
+    def get_last_run(self):
+        row = self.connection.execute('SELECT MAX(id) FROM runs').fetchone()
+        return row[0]
+
+    def get_changes(self, run_id):
+        '''
+        Compare the files of a run with their previous result (in any earlier run).
+        Returns a dict with the lists "worse" (path, new findings as (level, check,
+        message, text)), "better" (path, resolved findings) and "new" (paths checked
+        for the first time).
+        '''
+        changes = {'worse': [], 'better': [], 'new': []}
+        for file_id, path, severity, previous_id, previous_severity in \
+                self.connection.execute(PREVIOUS_FILES + ' ORDER BY f.path', (run_id, )).fetchall():
+            if previous_id is None:
+                changes['new'].append(path)
+                continue
+
+            new_findings = self.connection.execute(MISSING_FINDINGS, (file_id, previous_id)).fetchall()
+            if new_findings or severity > previous_severity:
+                changes['worse'].append((path, new_findings))
+            elif severity < previous_severity:
+                resolved_findings = self.connection.execute(MISSING_FINDINGS, (previous_id, file_id)).fetchall()
+                changes['better'].append((path, resolved_findings))
+
+        return changes
+
+    def get_failing(self, check, by='model'):
+        '''
+        Return [(value of the specifier by, files, checked files)] for the latest result
+        of every file, where files is the number of files with warnings, errors or
+        criticals of the check, sorted by the number of files.
+        '''
+        if by not in SPECIFIERS:
+            raise ValueError('"{}" is not one of {}.'.format(by, ', '.join(SPECIFIERS)))
+
+        return self.connection.execute('''
+            WITH latest AS (SELECT MAX(id) AS id FROM files GROUP BY path)
+            SELECT f.{by},
+                   COUNT(DISTINCT CASE WHEN n.file_id IS NOT NULL THEN f.id END) AS failing,
+                   COUNT(DISTINCT f.id)
+            FROM latest JOIN files f ON f.id = latest.id
+            LEFT JOIN findings n ON n.file_id = f.id AND n.check_name = ? AND n.level != 'infos'
+            GROUP BY f.{by} HAVING failing > 0 ORDER BY failing DESC, f.{by}
+        '''.format(by=by), (check, )).fetchall()
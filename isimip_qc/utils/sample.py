@@ -0,0 +1,71 @@
+import math
+import random
+
+import colorlog
+
+logger = colorlog.getLogger(__name__)
+
+
+def get_samples(shape, size, seed=None):
+    '''
+    Return the index tuples for a sample of a variable with the shape (time, [level,]
+    lat, lon): the first and the last time step and size - 2 random time steps in
+    between. For 3D variables, the random time steps are read for a single level,
+    the levels are stratified, so that all levels are covered about equally often.
+    The sample is reproducible for the same seed (e.g. the path of the file).
+    '''
+    rng = random.Random(seed)
+    ntime = shape[0]
+    rest = (slice(None), ) * (len(shape) - 1)
+
+    middle = range(1, ntime - 1)
+    random_steps = sorted(rng.sample(middle, min(max(size - 2, 0), len(middle))))
+
+    samples = [(slice(t, t + 1), ) + rest for t in sorted({0, ntime - 1})]
+
+    if len(shape) == 4:
+        levels = [i % shape[1] for i in range(len(random_steps))]
+        rng.shuffle(levels)
+        for t, level in zip(random_steps, levels):
+            samples.append((slice(t, t + 1), slice(level, level + 1)) + rest[1:])
+    else:
+        for t in random_steps:
+            samples.append((slice(t, t + 1), ) + rest)
+
+    return sorted(samples, key=lambda index: index[0].start)
+
+
+def iter_samples(variable, size, seed=None, reader=None):
+    '''
+    Read a sample of a netCDF variable (see get_samples). Yields (index, data) like
+    iter_slabs, so that the same checks can be used on the sample.
+    '''
+    for index in get_samples(variable.shape, size, seed):
+        logger.debug('variable=%s index=%s', variable.name, index)
+        if reader is None:
+            yield index, variable[index]
+        else:
+            yield index, reader.read(index)
+
+
+def wilson_interval(count, total, z=1.96):
+    # confidence interval for the share count / total (95% for z=1.96)
+    if total == 0:
+        return 0.0, 1.0
+
+    p = count / total
+    denominator = 1 + z ** 2 / total
+    center = (p + z ** 2 / (2 * total)) / denominator
+    margin = z * math.sqrt(p * (1 - p) / total + z ** 2 / (4 * total ** 2)) / denominator
+    return max(0.0, center - margin), min(1.0, center + margin)
+
+
+def get_read_bytes():
+    # number of bytes read by this process so far (only available on Linux)
+    try:
+        with open('/proc/self/io') as f:
+            for line in f:
+                if line.startswith('rchar:'):
+                    return int(line.split()[1])
+    except OSError:
+        return None
@@ -0,0 +1,138 @@
+import json
+import os
+import time
+
+import colorlog
+
+from .chunkindex import READ_RATE, SCAN_RATE, get_chunk_index
+
+logger = colorlog.getLogger(__name__)
+
+# estimated time (in seconds) to check the header of a file, independent of its size
+HEADER_TIME = 0.05
+
+# weight of the ratio of the current run when it is merged with the stored ratio
+RATIO_WEIGHT = 0.5
+
+
+def estimate_cost(file_path, variable_name=None, data=False):
+    '''
+    Estimate the time (in seconds) to check a file from its size and, for the data
+    checks, from its chunk index (see ChunkIndex.minmax_time).
+    '''
+    try:
+        size = os.stat(file_path).st_size
+    except OSError:
+        return HEADER_TIME
+
+    if not data:
+        return HEADER_TIME + size / READ_RATE / 100
+
+    index = get_chunk_index(file_path, variable_name) if variable_name else None
+    if index is not None:
+        return HEADER_TIME + index.minmax_time
+    else:
+        # uncompressed data of unknown layout
+        return HEADER_TIME + size / READ_RATE + size / SCAN_RATE
+
+
+class Timings(object):
+    '''
+    The durations of the checks of previous runs, stored as JSON in timings_path.
+    Files which did not change since their last check are predicted with their
+    last duration, for all other files the estimated cost is multiplied with the
+    ratio of the actual and the estimated durations of previous runs.
+    '''
+
+    def __init__(self, timings_path, mode):
+        self.timings_path = timings_path
+        self.mode = mode
+        self.files = {}
+        self.ratios = {}
+
+        # the sums of the actual and the estimated durations of this run
+        self.actual = 0.0
+        self.estimated = 0.0
+
+        if timings_path and timings_path.exists():
+            try:
+                with open(timings_path) as f:
+                    timings = json.load(f)
+                self.files = timings.get('files', {})
+                self.ratios = timings.get('ratios', {})
+            except (OSError, ValueError) as e:
+                logger.warning('could not read timings from %s: %s', timings_path, e)
+
+    @property
+    def ratio(self):
+        if self.estimated:
+            return self.actual / self.estimated
+        else:
+            return self.ratios.get(self.mode, 1.0)
+
+    def get_key(self, file_path):
+        try:
+            stat = os.stat(file_path)
+            return '{}:{}'.format(stat.st_size, stat.st_mtime)
+        except OSError:
+            return None
+
+    def predict(self, file_path, cost):
+        entry = self.files.get(str(file_path), {}).get(self.mode)
+        if entry and entry[0] == self.get_key(file_path):
+            return entry[1]
+        else:
+            return cost * self.ratio
+
+    def record(self, file_path, cost, duration):
+        # the state of the file is taken after the check, since it may have been changed by --fix
+        self.actual += duration
+        self.estimated += cost
+        self.files.setdefault(str(file_path), {})[self.mode] = [self.get_key(file_path), duration]
+
+    def save(self):
+        if not self.timings_path:
+            return
+
+        if self.estimated:
+            stored = self.ratios.get(self.mode)
+            ratio = self.actual / self.estimated
+            self.ratios[self.mode] = ratio if stored is None else (1 - RATIO_WEIGHT) * stored + RATIO_WEIGHT * ratio
+
+        tmp_path = self.timings_path.with_name('.' + self.timings_path.name + '-tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump({'files': self.files, 'ratios': self.ratios}, f)
+        os.replace(tmp_path, self.timings_path)
+
+
+class Progress(object):
+    '''
+    Predicts the remaining time of a run from the predicted durations of the files,
+    corrected by the ratio of actual and predicted durations of the files done so far.
+    '''
+
+    def __init__(self, predictions, jobs=1):
+        self.files = len(predictions)
+        self.remaining = sum(predictions)
+        self.jobs = max(jobs, 1)
+        self.done = 0
+        self.predicted_done = 0.0
+        self.actual_done = 0.0
+        self.start = time.time()
+
+    def update(self, predicted, duration):
+        self.done += 1
+        self.remaining -= predicted
+        self.predicted_done += predicted
+        self.actual_done += duration
+
+    @property
+    def eta(self):
+        ratio = self.actual_done / self.predicted_done if self.predicted_done else 1.0
+        return max(self.remaining, 0.0) * ratio / self.jobs
+
+
+def format_duration(seconds):
+    minutes, seconds = divmod(int(round(seconds)), 60)
+    hours, minutes = divmod(minutes, 60)
+    return '%i:%02i:%02i' % (hours, minutes, seconds)
@@ -0,0 +1,107 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+
+import colorlog
+
+logger = colorlog.getLogger(__name__)
+
+# maximum size of a request body
+MAX_BODY_SIZE = 64 * 1024
+
+
+class CheckServer(ThreadingMixIn, HTTPServer):
+    '''
+    A small HTTP server which passes POST /check requests to a pool of workers.
+    check(schema_path, path) is called in the pool and returns (status, result).
+    At most slots requests are accepted at the same time (running or waiting for
+    a worker), further requests are answered with 503 and should be retried.
+    '''
+
+    daemon_threads = True
+
+    def __init__(self, address, executor, check, slots, default_schema_path=None):
+        super().__init__(address, CheckRequestHandler)
+        self.executor = executor
+        self.check = check
+        self.default_schema_path = default_schema_path
+
+        self.slots = slots
+        self.active = 0
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        with self.lock:
+            if self.active >= self.slots:
+                return False
+            self.active += 1
+            return True
+
+    def release(self, future=None):
+        with self.lock:
+            self.active -= 1
+
+
+class CheckRequestHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        if self.path == '/status':
+            self.send_json(200, {
+                'active': self.server.active,
+                'slots': self.server.slots
+            })
+        else:
+            self.send_json(404, {'error': 'Not found.'})
+
+    def do_POST(self):
+        if self.path != '/check':
+            return self.send_json(404, {'error': 'Not found.'})
+
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+        except ValueError:
+            return self.send_json(400, {'error': 'Invalid Content-Length.'})
+
+        if length > MAX_BODY_SIZE:
+            return self.send_json(413, {'error': 'Request body is too large.'})
+
+        try:
+            data = json.loads(self.rfile.read(length).decode())
+            path = data['path']
+            schema_path = data.get('schema_path', self.server.default_schema_path)
+            assert isinstance(path, str) and isinstance(schema_path, str)
+        except (ValueError, KeyError, TypeError, AttributeError, AssertionError):
+            return self.send_json(400, {'error': 'Expected a JSON object with "path" and "schema_path".'})
+
+        if not self.server.acquire():
+            return self.send_json(503, {'error': 'Too many requests, try again later.'}, {'Retry-After': '1'})
+
+        try:
+            future = self.server.executor.submit(self.server.check, schema_path, path)
+        except Exception as e:
+            self.server.release()
+            return self.send_json(500, {'error': str(e)})
+
+        future.add_done_callback(self.server.release)
+
+        try:
+            status, result = future.result()
+        except Exception as e:
+            logger.error('check of %s failed: %s', path, e)
+            status, result = 500, {'error': 'Check failed: {}'.format(e)}
+
+        self.send_json(status, result)
+
+    def send_json(self, status, data, headers={}):
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for key, value in headers.items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.info('%s %s', self.address_string(), format % args)
@@ -0,0 +1,181 @@
+import itertools
+import math
+import re
+from functools import reduce
+from operator import mul
+
+import colorlog
+
+logger = colorlog.getLogger(__name__)
+
+# the masked array, its mask and the temporary boolean arrays of the data checks
+# need about 3 times the memory of the slab itself
+SLAB_OVERHEAD = 3
+
+SIZE_UNITS = {
+    '': 1024 ** 2,  # plain numbers are MB
+    'K': 1024,
+    'M': 1024 ** 2,
+    'G': 1024 ** 3,
+    'T': 1024 ** 4
+}
+
+
+def parse_size(size):
+    # parse a size like 512M, 2G or 2GB into bytes
+    if isinstance(size, int):
+        return size
+
+    match = re.match(r'^\s*(\d+(?:\.\d+)?)\s*([KMGT]?)B?\s*$', str(size), re.IGNORECASE)
+    if not match:
+        raise ValueError('"{}" is not a valid size, use e.g. 512M or 2G.'.format(size))
+
+    return int(float(match.group(1)) * SIZE_UNITS[match.group(2).upper()])
+
+
+def get_chunk_shape(variable):
+    # contiguous (or NETCDF3) variables are treated as chunked by single elements
+    chunking = variable.chunking()
+    if isinstance(chunking, (list, tuple)):
+        return tuple(chunking)
+    else:
+        return (1, ) * len(variable.shape)
+
+
+def get_slabs(shape, chunk_shape, itemsize, max_bytes, axis=0, prefix=()):
+    '''
+    Yield index tuples which split an array of shape into slabs of at most max_bytes.
+    The slabs span the full extent of the trailing axes and are split along the
+    leading axis first, in multiples of the chunk size where the budget permits.
+    '''
+    if not shape:
+        return
+
+    ndim = len(shape)
+    size = shape[axis]
+    row_bytes = reduce(mul, shape[axis + 1:], 1) * itemsize
+    step = max_bytes // row_bytes
+
+    if step == 0 and axis < ndim - 1:
+        # a single row along this axis exceeds the budget, split the next axis as well
+        for i in range(size):
+            yield from get_slabs(shape, chunk_shape, itemsize, max_bytes, axis + 1, prefix + (slice(i, i + 1), ))
+        return
+
+    step = max(step, 1)
+    if step >= chunk_shape[axis]:
+        step -= step % chunk_shape[axis]
+
+    for start in range(0, size, step):
+        yield prefix + (slice(start, min(start + step, size)), ) + (slice(None), ) * (ndim - axis - 1)
+
+
+def get_chunk_slabs(shape, chunk_shape, itemsize, max_bytes):
+    '''
+    Yield index tuples which split an array of shape into slabs of whole chunks of at
+    most max_bytes (a single chunk must fit). The slabs are extended to the full
+    extent of the trailing axes first, so that for chunks like [1, lat, lon] the slabs
+    are the same as for get_slabs, but for chunks like [time, 1, 1] a slab spans all
+    time steps of a few rows. Every chunk is part of exactly one slab.
+    '''
+    if not shape:
+        return
+
+    ndim = len(shape)
+    extent = [min(size, chunk_size) for size, chunk_size in zip(shape, chunk_shape)]
+    for axis in reversed(range(ndim)):
+        other_bytes = reduce(mul, extent[:axis] + extent[axis + 1:], 1) * itemsize
+        chunks = max(max_bytes // (other_bytes * extent[axis]), 1)
+        extent[axis] = min(chunks * extent[axis], shape[axis])
+        if extent[axis] < shape[axis]:
+            break
+
+    ranges = [range(0, size, step) for size, step in zip(shape, extent)]
+    for starts in itertools.product(*ranges):
+        yield tuple(slice(start, min(start + step, size)) for start, step, size in zip(starts, extent, shape))
+
+
+def count_reads(shape, chunk_shape, slabs):
+    # the average number of slabs which overlap with a chunk, i.e. how often every
+    # chunk is read and decompressed if it is not kept in the chunk cache
+    chunks = reduce(mul, (math.ceil(size / chunk_size) for size, chunk_size in zip(shape, chunk_shape)), 1)
+    if not chunks:
+        return 1.0
+
+    reads = 0
+    for index in slabs:
+        reads += reduce(mul, (math.ceil((i.stop or size) / chunk_size) - (i.start or 0) // chunk_size
+                              for i, size, chunk_size in zip(index, shape, chunk_shape)), 1)
+
+    return reads / chunks
+
+
+class ReadPlan(object):
+    '''
+    The slabs in which a variable is read for the data checks, chosen from the layout
+    of the variable, so that every chunk is decompressed only once if possible:
+
+    * if a chunk fits into the memory for a slab, the slabs consist of whole chunks
+      (see get_chunk_slabs), e.g. all time steps of a few rows for time series chunks,
+    * otherwise, the slabs are read in the order of the time steps (see get_slabs) and,
+      if the chunks of one row of chunks along the first axis fit into half of the
+      memory_limit, the chunk cache of the variable is set to hold them,
+    * otherwise, chunks are decompressed several times (see reads).
+
+    Contiguous variables are treated as chunked by single elements and read in the
+    order of the time steps.
+    '''
+
+    def __init__(self, shape, chunk_shape, itemsize, memory_limit):
+        self.shape = shape
+        self.chunk_shape = tuple(min(size, chunk_size) for size, chunk_size in zip(shape, chunk_shape))
+        self.itemsize = itemsize
+        self.cache_size = None
+        self.cache_chunks = None
+
+        self.max_bytes = memory_limit // SLAB_OVERHEAD
+
+        chunk_bytes = reduce(mul, self.chunk_shape, 1) * itemsize
+        self.aligned = chunk_bytes <= self.max_bytes
+        if not self.aligned:
+            # the chunks of one row along the first axis, which are needed by consecutive slabs
+            cache_chunks = reduce(mul, (math.ceil(size / chunk_size)
+                                        for size, chunk_size in zip(shape[1:], self.chunk_shape[1:])), 1)
+            if cache_chunks * chunk_bytes <= memory_limit // 2:
+                self.cache_size = cache_chunks * chunk_bytes
+                self.cache_chunks = cache_chunks
+                self.max_bytes = (memory_limit - self.cache_size) // SLAB_OVERHEAD
+
+        self.reads = 1.0 if (self.aligned or self.cache_size) else count_reads(shape, self.chunk_shape, self.slabs)
+
+    @property
+    def slabs(self):
+        if self.aligned:
+            return get_chunk_slabs(self.shape, self.chunk_shape, self.itemsize, self.max_bytes)
+        else:
+            return get_slabs(self.shape, self.chunk_shape, self.itemsize, self.max_bytes)
+
+
+def get_read_plan(variable, memory_limit):
+    return ReadPlan(variable.shape, get_chunk_shape(variable), variable.dtype.itemsize, memory_limit)
+
+
+def iter_slabs(variable, plan, reader=None):
+    '''
+    Read a netCDF variable slab by slab, in the order of the ReadPlan. Yields (index,
+    data) with the index tuple of slices and the (masked) array. If a reader (e.g. a
+    ChunkReader) is given, it is used instead of netCDF4.
+    '''
+    if reader is None and plan.cache_size:
+        variable.set_var_chunk_cache(size=plan.cache_size, nelems=max(plan.cache_chunks, 1009))
+
+    for index in plan.slabs:
+        logger.debug('variable=%s index=%s', variable.name, index)
+        if reader is None:
+            yield index, variable[index]
+        else:
+            yield index, reader.read(index)
+
+
+def get_offset(index):
+    return tuple(i.start or 0 for i in index)
@@ -0,0 +1,114 @@
+import warnings
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+# number of preceding time steps used for the rolling z-score of the differences
+WINDOW = 30
+
+# minimum number of preceding differences before a z-score is computed
+MIN_PERIODS = 10
+
+# number of values before and after a change which must be at the old and the new level
+PERSISTENCE = 5
+
+# share of a change by which the medians of these values must differ
+PERSISTENT_SHARE = 0.5
+
+# differences with a larger absolute z-score are reported as discontinuities
+THRESHOLD = 6.0
+
+# scales the median absolute deviation to the standard deviation of a normal distribution
+MAD_SCALE = 1.4826
+
+# relative floor for the deviation, so that constant series do not divide by 0
+EPSILON = 1e-6
+
+
+def get_weights(lat):
+    # area weights of the grid cells for each latitude
+    return np.clip(np.cos(np.deg2rad(np.ma.getdata(lat).astype(np.float64))), 0, None)
+
+
+class TimeSeries(object):
+    '''
+    Per time step statistics (area-weighted mean, minimum, maximum and number of valid
+    cells) of a variable with the shape (time, [level,] lat, lon), computed slab by
+    slab in the pass of the data checks. Slabs may contain several time steps or only
+    a part of one.
+    '''
+
+    def __init__(self, size, weights):
+        self.weights = weights
+        self.weighted_sum = np.zeros(size)
+        self.weight_sum = np.zeros(size)
+        self.minimum = np.full(size, np.inf)
+        self.maximum = np.full(size, -np.inf)
+        self.count = np.zeros(size, dtype=np.int64)
+
+    def update(self, index, values, valid):
+        start = index[0].start or 0
+        steps = slice(start, start + values.shape[0])
+        axes = tuple(range(1, values.ndim))
+
+        valid = valid & np.isfinite(values)
+        weights = np.where(valid, self.weights[index[-2]][:, np.newaxis], 0)
+
+        self.weighted_sum[steps] += np.sum(weights * np.where(valid, values, 0), axis=axes, dtype=np.float64)
+        self.weight_sum[steps] += np.sum(weights, axis=axes)
+        self.minimum[steps] = np.minimum(self.minimum[steps], np.where(valid, values, np.inf).min(axis=axes))
+        self.maximum[steps] = np.maximum(self.maximum[steps], np.where(valid, values, -np.inf).max(axis=axes))
+        self.count[steps] += np.count_nonzero(valid, axis=axes)
+
+    @property
+    def mean(self):
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(self.weight_sum > 0, self.weighted_sum / self.weight_sum, np.nan)
+
+
+def get_z_scores(series):
+    '''
+    Return the robust z-scores of the differences of consecutive values of series,
+    compared to the median and the median absolute deviation of the WINDOW preceding
+    differences, so that a previous discontinuity does not hide the next one. The
+    deviation is at least the median absolute deviation of all differences, since
+    the one of a short window is often too small by chance. Only persistent shifts of
+    the level count: the z-score is 0 unless the medians of the PERSISTENCE values
+    before and after the change differ by at least PERSISTENT_SHARE of it, so that a
+    single outlier, which changes neither median, is not reported. The z-score of
+    series[i] - series[i - 1] is at position i, NaN where it can not be computed
+    (missing values, less than MIN_PERIODS preceding differences or less than
+    PERSISTENCE values before or after).
+    '''
+    diffs = np.diff(series)
+    if not diffs.size:
+        return np.full(len(series), np.nan)
+
+    # windows[i] are the WINDOW differences before diffs[i]
+    padded = np.concatenate([np.full(WINDOW, np.nan), diffs[:-1]])
+    windows = sliding_window_view(padded, WINDOW)
+    count = np.count_nonzero(np.isfinite(windows), axis=1)
+
+    # levels[i] is the median of the PERSISTENCE values up to series[i], i.e. the level
+    # before diffs[i], and levels[i + PERSISTENCE] the level after it
+    padding = np.full(PERSISTENCE - 1, np.nan)
+    levels = np.median(sliding_window_view(np.concatenate([padding, series, padding]), PERSISTENCE), axis=1)
+    shifts = levels[PERSISTENCE:PERSISTENCE + diffs.size] - levels[:diffs.size]
+
+    with warnings.catch_warnings(), np.errstate(invalid='ignore', divide='ignore'):
+        # all-NaN windows are expected at the start
+        warnings.simplefilter('ignore', RuntimeWarning)
+        median = np.nanmedian(windows, axis=1)
+        deviation = MAD_SCALE * np.nanmedian(np.abs(windows - median[:, np.newaxis]), axis=1)
+        total_deviation = MAD_SCALE * np.nanmedian(np.abs(diffs - np.nanmedian(diffs)))
+
+        scale = np.nanmax(np.abs(series)) if np.isfinite(series).any() else 0
+        changes = diffs - median
+        z = changes / np.maximum(np.maximum(deviation, total_deviation), EPSILON * scale)
+
+        # a trend of median per time step moves the level by PERSISTENCE * median
+        persistent = (shifts - PERSISTENCE * median) * np.sign(changes) >= PERSISTENT_SHARE * np.abs(changes)
+        z = np.where(persistent, z, 0)
+
+    z[(count < MIN_PERIODS) | ~np.isfinite(diffs) | ~np.isfinite(shifts)] = np.nan
+    return np.concatenate([[np.nan], z])
@@ -0,0 +1,121 @@
+from collections import OrderedDict
+
+LEVELS = OrderedDict([
+    ('criticals', 'CRITICAL'),
+    ('errors', 'ERROR'),
+    ('warnings', 'WARNING'),
+    ('infos', 'INFO')
+])
+
+# the specifiers for which the affected values are collected
+SPECIFIERS = ['model', 'climate_forcing', 'climate_scenario', 'soc_scenario', 'sens_scenario', 'variable']
+
+
+class Summary(object):
+    '''
+    Aggregates the findings of all files by level, check and message template
+    (before the arguments are interpolated). The memory is bounded independent of
+    the number of files: at most MAX_GROUPS groups are kept, each with at most
+    MAX_EXAMPLES example files and MAX_VALUES values per specifier.
+    '''
+
+    MAX_GROUPS = 1000
+    MAX_EXAMPLES = 3
+    MAX_VALUES = 10
+
+    def __init__(self):
+        self.groups = OrderedDict()
+        self.files = 0
+        self.files_by_level = dict.fromkeys(LEVELS, 0)
+        self.dropped = 0
+        self.bytes_saved = 0
+        self.files_rewritten = 0
+
+    def add(self, file_path, specifiers, findings, bytes_saved=0):
+        # findings is an iterable of (level, check, message template),
+        # bytes_saved the change of the size of the file by --fix-datamodel
+        self.files += 1
+        if bytes_saved:
+            self.bytes_saved += bytes_saved
+            self.files_rewritten += 1
+
+        levels = set()
+        keys = set()
+        for level, check, message in findings:
+            levels.add(level)
+
+            key = (level, check, message)
+            if key not in self.groups:
+                if len(self.groups) >= self.MAX_GROUPS:
+                    self.dropped += 1
+                    continue
+                self.groups[key] = Group()
+
+            self.groups[key].count += 1
+            keys.add(key)
+
+        # count files, example files and specifiers only once per file and group
+        for key in keys:
+            self.groups[key].add_file(file_path, specifiers, self.MAX_EXAMPLES, self.MAX_VALUES)
+
+        for level in levels:
+            self.files_by_level[level] += 1
+
+    def add_file(self, file):
+        self.add(file.path, file.specifiers, [finding.key for finding in file.findings], file.bytes_saved)
+
+    def print(self, levels=('criticals', 'errors', 'warnings')):
+        print('SUMMARY   : %s files checked, %s' % (self.files, ', '.join(
+            '%s with %s' % (self.files_by_level[level], level) for level in LEVELS if level in levels)))
+        if self.files_rewritten:
+            print('            %.1f MB saved by rewriting %s files with --fix-datamodel' % (
+                self.bytes_saved / 1024 ** 2, self.files_rewritten))
+
+        for level in LEVELS:
+            if level not in levels:
+                continue
+
+            groups = [(key, group) for key, group in self.groups.items() if key[0] == level]
+            for (_, check, message), group in sorted(groups, key=lambda item: -item[1].files):
+                print(' %-9s: %s' % (LEVELS[level], message))
+                print('            %s times in %s files%s' % (group.count, group.files,
+                                                            ' (%s)' % check if check else ''))
+                for specifier, values in group.specifiers.items():
+                    if group.files > 1:
+                        print('            %s: %s%s' % (specifier, ', '.join(str(value) for value in sorted(values, key=str)),
+                                                        ', ...' if specifier in group.truncated else ''))
+                for example in group.examples:
+                    print('            e.g. %s' % example)
+
+        if self.dropped:
+            print(' %s further findings were not aggregated (more than %s different messages).' % (self.dropped, self.MAX_GROUPS))
+
+
+class Group(object):
+
+    __slots__ = ('count', 'files', 'examples', 'specifiers', 'truncated')
+
+    def __init__(self):
+        self.count = 0
+        self.files = 0
+        self.examples = []
+        self.specifiers = OrderedDict()
+        self.truncated = set()
+
+    def add_file(self, file_path, specifiers, max_examples, max_values):
+        self.files += 1
+
+        if len(self.examples) < max_examples:
+            self.examples.append(file_path)
+
+        for specifier in SPECIFIERS:
+            value = specifiers.get(specifier)
+            if value is None:
+                continue
+
+            values = self.specifiers.setdefault(specifier, set())
+            if value not in values:
+                if len(values) < max_values:
+                    values.add(value)
+                else:
+                    self.truncated.add(specifier)
@@ -0,0 +1,189 @@
+import multiprocessing
+import signal
+import time
+from multiprocessing.connection import wait
+
+import colorlog
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+logger = colorlog.getLogger(__name__)
+
+
+def run_worker(connection, memory_limit, initializer, initargs):
+    # the loop of a worker process, it runs the tasks until it receives None
+    if memory_limit and resource is not None:
+        # RLIMIT_DATA does not include memory mapped files (e.g. NETCDF3 files read with mmap)
+        resource.setrlimit(resource.RLIMIT_DATA, (memory_limit, memory_limit))
+
+    if initializer is not None:
+        initializer(*initargs)
+
+    while True:
+        try:
+            task = connection.recv()
+        except EOFError:
+            break
+
+        if task is None:
+            break
+
+        function, args = task
+        try:
+            value = function(*args)
+        except MemoryError:
+            # the state of the process is unknown after a MemoryError, the worker is replaced
+            connection.send(('memory', None))
+            break
+        except Exception as e:
+            # an exception can leave an open dataset, a slot of the IOGovernor or the threads
+            # of a ChunkReader behind, the worker is replaced as well
+            connection.send(('error', repr(e)))
+            break
+        else:
+            connection.send(('done', value))
+
+
+class Worker(object):
+
+    def __init__(self, memory_limit, initializer, initargs):
+        self.connection, child_connection = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(target=run_worker, daemon=True,
+                                               args=(child_connection, memory_limit, initializer, initargs))
+        self.process.start()
+        child_connection.close()
+
+        self.item = None
+        self.started = None
+        self.deadline = None
+
+    @property
+    def exit_reason(self):
+        exitcode = self.process.exitcode
+        if exitcode is not None and exitcode < 0:
+            try:
+                return signal.Signals(-exitcode).name
+            except ValueError:
+                return 'signal {}'.format(-exitcode)
+        else:
+            return 'exit code {}'.format(exitcode)
+
+    def submit(self, function, item, timeout):
+        self.item = item
+        self.started = time.monotonic()
+        self.deadline = self.started + timeout if timeout else None
+        self.connection.send((function, (item, )))
+
+    def kill(self):
+        self.process.kill()
+        self.process.join()
+        self.connection.close()
+
+    def stop(self, timeout=5):
+        try:
+            self.connection.send(None)
+        except (OSError, ValueError):
+            pass
+        self.process.join(timeout)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        self.connection.close()
+
+
+class Supervisor(object):
+    '''
+    Runs a function for many items in supervised worker processes. The workers are
+    started once and re-used for the following items. A worker which crashes (e.g. a
+    segfault in a library), exceeds the memory_limit (in bytes) or does not finish an
+    item within timeout seconds is killed and replaced, and the run continues with
+    the next item. A worker in which the function raised an exception exits and is
+    replaced, too. In contrast to a ProcessPoolExecutor, a crashed worker does not
+    break the other workers and a hanging worker can be stopped.
+    '''
+
+    def __init__(self, workers, timeout=None, memory_limit=None, initializer=None, initargs=()):
+        self.workers = max(workers, 1)
+        self.timeout = timeout
+        self.memory_limit = memory_limit
+        self.initializer = initializer
+        self.initargs = initargs
+
+    def start_worker(self):
+        return Worker(self.memory_limit, self.initializer, self.initargs)
+
+    def map(self, function, items):
+        '''
+        Yield (item, status, value, duration) for every item as soon as it is finished,
+        where status is "done" (value is the return value), "error" (value describes the
+        exception), "timeout", "memory" or "crashed" (value describes the exit).
+        '''
+        items = iter(items)
+        idle = []
+        busy = []
+        started = 0
+
+        try:
+            while True:
+                # hand out items to idle workers, start workers up to the limit
+                while len(busy) < self.workers:
+                    item = next(items, None)
+                    if item is None:
+                        break
+
+                    if idle:
+                        worker = idle.pop()
+                    else:
+                        worker = self.start_worker()
+                        started += 1
+
+                    worker.submit(function, item, self.timeout)
+                    busy.append(worker)
+
+                if not busy:
+                    break
+
+                deadlines = [worker.deadline for worker in busy if worker.deadline is not None]
+                wait_timeout = max(min(deadlines) - time.monotonic(), 0) if deadlines else None
+                ready = wait([worker.connection for worker in busy] +
+                             [worker.process.sentinel for worker in busy], wait_timeout)
+
+                for worker in busy[:]:
+                    status, value = None, None
+
+                    if worker.connection in ready:
+                        try:
+                            status, value = worker.connection.recv()
+                        except (EOFError, OSError):
+                            worker.process.join()
+                            status, value = 'crashed', worker.exit_reason
+                    elif worker.process.sentinel in ready:
+                        worker.process.join()
+                        status, value = 'crashed', worker.exit_reason
+                    elif worker.deadline is not None and worker.deadline <= time.monotonic():
+                        status, value = 'timeout', self.timeout
+
+                    if status is None:
+                        continue
+
+                    busy.remove(worker)
+                    if status == 'done':
+                        idle.append(worker)
+                    elif status == 'error':
+                        # the worker exits by itself after an exception
+                        worker.stop()
+                    else:
+                        if status == 'memory':
+                            value = self.memory_limit
+                        worker.kill()
+                        logger.debug('worker for %s %s (%s), %s workers started', worker.item, status, value, started)
+
+                    yield worker.item, status, value, time.monotonic() - worker.started
+        finally:
+            for worker in busy:
+                worker.kill()
+            for worker in idle:
+                worker.stop()
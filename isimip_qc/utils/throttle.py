@@ -0,0 +1,139 @@
+import multiprocessing
+import os
+import time
+from contextlib import contextmanager
+
+import colorlog
+
+logger = colorlog.getLogger(__name__)
+
+# seconds between attempts to get a free slot for opening a file
+POLL_INTERVAL = 0.05
+
+# indexes of the shared state of the IOGovernor
+TOKENS, UPDATED, TOTAL_BYTES, TOTAL_WAITED = range(4)
+
+
+class IOGovernor(object):
+    '''
+    Limits the I/O of all processes of one run: a token bucket for the bytes read (rate
+    in bytes per second, 0 for no limit) and a maximum number of files which are open at
+    the same time (max_opens, 0 for no limit). The state is kept in shared memory, so
+    the governor is created once and passed to the worker processes (e.g. with the
+    settings). The bytes read and the time spent waiting are counted in any case.
+    '''
+
+    def __init__(self, rate=0, max_opens=0):
+        self.rate = rate
+        self.max_opens = max_opens
+        self.started = time.monotonic()
+
+        self.lock = multiprocessing.Lock()
+        self.state = multiprocessing.RawArray('d', 4)
+        self.state[TOKENS] = rate
+        self.state[UPDATED] = self.started
+
+        # the pid of the process which holds each slot, 0 for free slots
+        self.slots = multiprocessing.RawArray('i', max_opens) if max_opens else None
+
+    def consume(self, size):
+        '''
+        Take size bytes from the bucket, which holds up to one second of the rate. If the
+        bucket is empty, wait until the bytes would have been available. The tokens are
+        taken before the wait, so that concurrent readers are served in order. Returns
+        the seconds waited.
+        '''
+        with self.lock:
+            now = time.monotonic()
+            self.state[TOTAL_BYTES] += size
+
+            if not self.rate:
+                return 0
+
+            tokens = min(self.state[TOKENS] + (now - self.state[UPDATED]) * self.rate, self.rate) - size
+            self.state[TOKENS] = tokens
+            self.state[UPDATED] = now
+
+            wait = -tokens / self.rate if tokens < 0 else 0
+            self.state[TOTAL_WAITED] += wait
+
+        if wait:
+            time.sleep(wait)
+
+        return wait
+
+    def acquire(self):
+        # wait for a free slot to open a file, returns the slot or None without max_opens
+        if not self.slots:
+            return None
+
+        pid = os.getpid()
+        while True:
+            with self.lock:
+                for slot, slot_pid in enumerate(self.slots):
+                    # slots of processes which were killed while holding them are freed
+                    if slot_pid == 0 or not is_alive(slot_pid):
+                        self.slots[slot] = pid
+                        return slot
+
+            time.sleep(POLL_INTERVAL)
+
+    def release(self, slot):
+        if slot is not None:
+            with self.lock:
+                self.slots[slot] = 0
+
+    @contextmanager
+    def opened(self):
+        slot = self.acquire()
+        try:
+            yield
+        finally:
+            self.release(slot)
+
+    @property
+    def total_bytes(self):
+        return self.state[TOTAL_BYTES]
+
+    @property
+    def total_waited(self):
+        return self.state[TOTAL_WAITED]
+
+    @property
+    def elapsed(self):
+        return time.monotonic() - self.started
+
+    @property
+    def throughput(self):
+        # achieved throughput in bytes per second since the governor was created
+        elapsed = self.elapsed
+        return self.total_bytes / elapsed if elapsed > 0 else 0
+
+
+def is_alive(pid):
+    if os.name != 'posix':
+        return True
+
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+
+    return True
+
+
+def get_storage_ratio(file_path, variable):
+    '''
+    Return the ratio of the bytes on disk to the bytes in memory of a variable, estimated
+    from the size of the file, which is dominated by the variable in ISIMIP files. Used
+    to count the bytes read from the file system for compressed variables.
+    '''
+    data_bytes = variable.size * variable.dtype.itemsize
+    try:
+        file_bytes = os.stat(file_path).st_size
+    except OSError:
+        return 1.0
+
+    return min(file_bytes / data_bytes, 1.0) if data_bytes else 1.0
@@ -0,0 +1,169 @@
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import time
+from pathlib import Path
+
+import colorlog
+
+from .files import walk_files
+
+logger = colorlog.getLogger(__name__)
+
+# see inotify(7)
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_ISDIR = 0x40000000
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+
+EVENT_STRUCT = struct.Struct('iIII')
+
+
+class Inotify(object):
+    '''
+    Minimal ctypes binding to the Linux inotify API, watching a directory tree for
+    files which were written or moved into it. Raises OSError if inotify is not
+    available.
+    '''
+
+    def __init__(self):
+        library = ctypes.util.find_library('c')
+        if library is None:
+            raise OSError('libc not found')
+
+        libc = ctypes.CDLL(library, use_errno=True)
+        try:
+            self.inotify_add_watch = libc.inotify_add_watch
+        except AttributeError:
+            raise OSError('inotify is not available')
+
+        self.fd = libc.inotify_init1(IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+
+        self.watches = {}
+
+    def add_watch(self, path):
+        wd = self.inotify_add_watch(self.fd, os.fsencode(str(path)), WATCH_MASK)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_add_watch failed for {}'.format(path))
+        self.watches[wd] = Path(path)
+
+    def add_tree(self, path):
+        self.add_watch(path)
+        for root, dirs, _ in os.walk(path):
+            for dir_name in dirs:
+                self.add_watch(Path(root) / dir_name)
+
+    def read(self, timeout):
+        # returns a list of (path, mask) tuples, an empty list after the timeout
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return []
+
+        data = os.read(self.fd, 64 * 1024)
+        events = []
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = EVENT_STRUCT.unpack_from(data, offset)
+            name = data[offset + EVENT_STRUCT.size:offset + EVENT_STRUCT.size + length].rstrip(b'\0')
+            offset += EVENT_STRUCT.size + length
+
+            if mask & IN_Q_OVERFLOW:
+                events.append((None, mask))
+            elif wd in self.watches:
+                events.append((self.watches[wd] / os.fsdecode(name), mask))
+
+        return events
+
+    def close(self):
+        os.close(self.fd)
+
+
+def watch_files(path, settle=60, interval=60, poll=False):
+    '''
+    Yield the files below path which are complete, i.e. whose size and mtime did not
+    change for settle seconds. Files are yielded again when they change later. New
+    files are detected using inotify or, if not available (or poll is set), by
+    scanning the directory tree every interval seconds. Hidden files (e.g. partial
+    uploads of rsync) are ignored.
+    '''
+    inotify = None
+    if not poll:
+        try:
+            inotify = Inotify()
+            inotify.add_tree(path)
+        except OSError as e:
+            logger.warning('inotify is not available (%s), scanning for new files every %s seconds.', e, interval)
+            inotify = None
+
+    pending = {}   # path -> ((size, mtime), time when this state was first seen)
+    checked = {}   # path -> (size, mtime) when the file was checked
+
+    def add(file_path):
+        if not file_path.name.startswith('.'):
+            pending.setdefault(file_path, None)
+
+    for file_path in walk_files(path):
+        add(file_path)
+
+    last_scan = time.time()
+
+    try:
+        while True:
+            if inotify:
+                for event_path, mask in inotify.read(timeout=1 if pending else interval):
+                    if event_path is None:
+                        # the event queue overflowed, fall back to a scan
+                        last_scan = 0
+                    elif mask & IN_ISDIR:
+                        try:
+                            inotify.add_tree(event_path)
+                        except OSError as e:
+                            logger.error('could not watch %s: %s', event_path, e)
+                        for file_path in walk_files(event_path):
+                            add(file_path)
+                    elif mask & (IN_CLOSE_WRITE | IN_MOVED_TO):
+                        add(event_path)
+            else:
+                time.sleep(1 if pending else min(interval, 10))
+
+            now = time.time()
+            if (inotify is None or last_scan == 0) and now - last_scan >= interval:
+                for file_path in walk_files(path):
+                    add(file_path)
+                last_scan = now
+
+            for file_path in list(pending):
+                try:
+                    stat = os.stat(file_path)
+                except FileNotFoundError:
+                    pending.pop(file_path)
+                    continue
+
+                state = (stat.st_size, stat.st_mtime)
+                if checked.get(file_path) == state:
+                    # unchanged since it was checked
+                    pending.pop(file_path)
+                elif pending[file_path] is None or pending[file_path][0] != state:
+                    pending[file_path] = (state, now)
+                elif now - pending[file_path][1] >= settle:
+                    pending.pop(file_path)
+                    yield file_path
+
+                    # store the state after the check, so that changes made by
+                    # --fix do not trigger a second check
+                    try:
+                        stat = os.stat(file_path)
+                        checked[file_path] = (stat.st_size, stat.st_mtime)
+                    except FileNotFoundError:
+                        checked.pop(file_path, None)
+    finally:
+        if inotify:
+            inotify.close()
@@ -0,0 +1,136 @@
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+import colorlog
+
+logger = colorlog.getLogger(__name__)
+
+
+class WorkQueue(object):
+    '''
+    A queue of files in a SQLite database on a shared file system. Workers claim
+    one file at a time with a lease, which is renewed while the file is checked.
+    Files claimed by a crashed worker are claimed again once the lease expired,
+    and marked as failed after MAX_ATTEMPTS.
+    '''
+
+    MAX_ATTEMPTS = 3
+
+    def __init__(self, queue_path, lease=3600):
+        self.queue_path = queue_path
+        self.lease = lease
+        self.worker = '{}:{}'.format(socket.gethostname(), os.getpid())
+
+        self.connection = self.connect()
+        with self.transaction():
+            self.connection.execute('''
+                CREATE TABLE IF NOT EXISTS files (
+                    path TEXT PRIMARY KEY,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    worker TEXT,
+                    lease_expires REAL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    result TEXT
+                )
+            ''')
+            self.connection.execute('CREATE INDEX IF NOT EXISTS files_status ON files (status)')
+
+    def connect(self):
+        # isolation_level=None: transactions are managed explicitly in transaction()
+        return sqlite3.connect(str(self.queue_path), timeout=60, isolation_level=None)
+
+    @contextmanager
+    def transaction(self, connection=None):
+        connection = connection or self.connection
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            yield connection
+        except Exception:
+            connection.execute('ROLLBACK')
+            raise
+        else:
+            connection.execute('COMMIT')
+
+    def submit(self, file_paths):
+        with self.transaction() as connection:
+            cursor = connection.executemany('INSERT OR IGNORE INTO files (path) VALUES (?)',
+                                            [(str(file_path),) for file_path in file_paths])
+            return cursor.rowcount
+
+    def claim(self):
+        now = time.time()
+        with self.transaction() as connection:
+            # give up on files where the lease expired too often
+            connection.execute('''
+                UPDATE files SET status = 'failed'
+                WHERE status = 'claimed' AND lease_expires < ? AND attempts >= ?
+            ''', (now, self.MAX_ATTEMPTS))
+
+            row = connection.execute('''
+                SELECT path FROM files
+                WHERE status = 'pending' OR (status = 'claimed' AND lease_expires < ?)
+                ORDER BY rowid LIMIT 1
+            ''', (now, )).fetchone()
+
+            if row is not None:
+                connection.execute('''
+                    UPDATE files SET status = 'claimed', worker = ?, lease_expires = ?, attempts = attempts + 1
+                    WHERE path = ?
+                ''', (self.worker, now + self.lease, row[0]))
+                logger.debug('worker=%s claimed path=%s', self.worker, row[0])
+                return row[0]
+
+    def renew(self, file_path, connection=None):
+        with self.transaction(connection) as connection:
+            connection.execute('''
+                UPDATE files SET lease_expires = ? WHERE path = ? AND worker = ? AND status = 'claimed'
+            ''', (time.time() + self.lease, str(file_path), self.worker))
+
+    @contextmanager
+    def heartbeat(self, file_path):
+        # renew the lease in a background thread while the file is checked,
+        # sqlite3 connections can not be shared between threads
+        stop = threading.Event()
+
+        def run():
+            connection = self.connect()
+            try:
+                while not stop.wait(self.lease / 3):
+                    self.renew(file_path, connection)
+            finally:
+                connection.close()
+
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        try:
+            yield
+        finally:
+            stop.set()
+            thread.join()
+
+    def complete(self, file_path, result):
+        with self.transaction() as connection:
+            cursor = connection.execute('''
+                UPDATE files SET status = 'done', result = ? WHERE path = ? AND worker = ?
+            ''', (json.dumps(result, default=str), str(file_path), self.worker))
+
+            if not cursor.rowcount:
+                logger.warning('%s was claimed by another worker, the result was discarded.', file_path)
+
+    def counts(self):
+        return dict(self.connection.execute('SELECT status, COUNT(*) FROM files GROUP BY status').fetchall())
+
+    @property
+    def is_finished(self):
+        counts = self.counts()
+        return not (counts.get('pending') or counts.get('claimed'))
+
+    def results(self):
+        for file_path, status, attempts, result in self.connection.execute(
+                'SELECT path, status, attempts, result FROM files ORDER BY path'):
+            yield file_path, status, attempts, json.loads(result) if result else None
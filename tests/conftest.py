@@ -0,0 +1,67 @@
+import re
+
+import jsonschema
+import netCDF4
+import numpy as np
+import pytest
+
+from isimip_qc.config import settings
+
+
+@pytest.fixture
+def cli_settings(tmp_path, monkeypatch):
+    # the settings of the command line for files in tmp_path, without a protocol
+    for key, value in {
+        'UNCHECKED_PATH': tmp_path,
+        'CHECKED_PATH': None,
+        'LOG_PATH': None,
+        'LOG_LEVEL': 'CRITICAL',
+        'AUTO_SCHEMA': False,
+        'PATTERN': {
+            'suffix': ['.nc'],
+            'file': re.compile(r'^(?P<variable>\w+)\.nc$'),
+            'dataset': re.compile(r'^(?P<variable>\w+)')
+        },
+        'VALIDATOR': jsonschema.Draft7Validator({}),
+        'DEFINITIONS': {},
+        'IO_GOVERNOR': None,
+        'MINMAX': None,
+        'SAMPLE': None,
+        'CHECK': None,
+        'LANDSEAMASK': None,
+        'MEMORY_LIMIT': 1024 ** 3,
+        'READ_THREADS': 0,
+        'FIX': False,
+        'FIX_DATAMODEL': False,
+        'TUNE_COMPRESSION': False,
+        'STOP_WARN': False,
+        'STOP_ERR': False,
+        'MOVE': False,
+        'COPY': False
+    }.items():
+        monkeypatch.setattr(settings, key, value, raising=False)
+
+    return settings
+
+
+@pytest.fixture
+def make_netcdf(tmp_path):
+    # write a small NETCDF4_CLASSIC file with a variable (time, lat, lon)
+    def make_netcdf(name, data=None, chunksizes=None, data_model='NETCDF4_CLASSIC'):
+        if data is None:
+            data = np.ones((4, 3, 6), dtype=np.float32)
+
+        file_path = tmp_path / name
+        with netCDF4.Dataset(file_path, 'w', format=data_model) as dataset:
+            for dimension, size in zip(['time', 'lat', 'lon'], data.shape):
+                dataset.createDimension(dimension, None if dimension == 'time' else size)
+            dataset.createVariable('lat', 'f8', ('lat', ))[:] = np.linspace(90, -90, data.shape[1])
+            dataset.createVariable('lon', 'f8', ('lon', ))[:] = np.linspace(-180, 180, data.shape[2])
+            variable = dataset.createVariable(file_path.stem, data.dtype, ('time', 'lat', 'lon'),
+                                              fill_value=1e20, chunksizes=chunksizes,
+                                              zlib=data_model == 'NETCDF4_CLASSIC')
+            variable[:] = data
+
+        return file_path
+
+    return make_netcdf
@@ -0,0 +1,71 @@
+import netCDF4
+import numpy as np
+import pytest
+
+from isimip_qc.checks import dataset
+from isimip_qc.models import File
+from isimip_qc.utils import chunkindex
+from isimip_qc.utils.chunkindex import get_chunk_index
+
+pytest.importorskip('h5py')
+
+
+def test_chunk_index(make_netcdf):
+    index = get_chunk_index(make_netcdf('tas.nc', chunksizes=(1, 3, 6)), 'tas')
+
+    assert index.shape == (4, 3, 6)
+    assert index.chunk_shape == (1, 3, 6)
+    assert index.compressed
+    assert (index.chunks, index.chunks_total, index.empty_chunks) == (4, 4, 0)
+    assert index.uncompressed_bytes == index.data_bytes == 4 * 3 * 6 * 4
+    assert 0 < index.stored_bytes < index.uncompressed_bytes
+    assert index.ratio == index.uncompressed_bytes / index.stored_bytes
+    assert 0 < index.minmax_time < index.fix_datamodel_time
+
+
+def test_chunk_index_uncompressed(make_netcdf):
+    index = get_chunk_index(make_netcdf('tas.nc', chunksizes=(2, 3, 6), data_model='NETCDF4'), 'tas')
+
+    assert not index.compressed
+    assert (index.chunks, index.chunks_total) == (2, 2)
+    assert index.stored_bytes == index.uncompressed_bytes
+    assert index.ratio == 1.0
+
+
+def test_chunk_index_empty_chunks(tmp_path):
+    # only the first and the last time step are written, the chunks in between are empty
+    file_path = tmp_path / 'tas.nc'
+    with netCDF4.Dataset(file_path, 'w') as ds:
+        ds.createDimension('time', None)
+        ds.createDimension('lat', 3)
+        ds.createDimension('lon', 6)
+        variable = ds.createVariable('tas', 'f4', ('time', 'lat', 'lon'), chunksizes=(1, 3, 6), zlib=True)
+        variable[0] = variable[3] = np.ones((3, 6))
+
+    index = get_chunk_index(file_path, 'tas')
+
+    assert (index.chunks, index.chunks_total, index.empty_chunks) == (2, 4, 2)
+    assert index.uncompressed_bytes == index.data_bytes / 2
+
+
+def test_chunk_index_not_available(make_netcdf, monkeypatch):
+    assert get_chunk_index(make_netcdf('tas.nc'), 'pr') is None
+    assert get_chunk_index(make_netcdf('pr.nc', data_model='NETCDF3_64BIT_OFFSET'), 'pr') is None
+
+    monkeypatch.setattr(chunkindex, 'h5py', None)
+    assert get_chunk_index(make_netcdf('tas.nc'), 'tas') is None
+
+
+def test_check_chunk_index(cli_settings, make_netcdf):
+    file = File(make_netcdf('tas.nc', chunksizes=(1, 3, 6)))
+    file.open_log()
+    file.open_dataset()
+    file.variable_name = 'tas'
+    try:
+        dataset.check_chunk_index(file)
+    finally:
+        file.close_dataset()
+        file.close_log()
+
+    assert file.chunk_index.chunks == 4
+    assert [finding.args[:3] for finding in file.infos[:1]] == [('tas', 4, 4)]
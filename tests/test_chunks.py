@@ -0,0 +1,77 @@
+import netCDF4
+import numpy as np
+import pytest
+
+from isimip_qc.utils.chunks import get_chunk_reader
+
+pytest.importorskip('h5py')
+
+
+@pytest.fixture
+def make_variable(tmp_path):
+    # write a variable with the given storage and open it with netCDF4
+    datasets = []
+
+    def make_variable(data_model='NETCDF4_CLASSIC', attrs={}, **kwargs):
+        file_path = tmp_path / 'tas.nc'
+        with netCDF4.Dataset(file_path, 'w', format=data_model) as dataset:
+            dataset.createDimension('time', 8)
+            dataset.createDimension('lat', 7)
+            dataset.createDimension('lon', 10)
+            variable = dataset.createVariable('tas', 'f4', ('time', 'lat', 'lon'), fill_value=1e20, **kwargs)
+            variable.setncatts(attrs)
+
+            data = np.arange(5 * 7 * 10, dtype=np.float32).reshape(5, 7, 10)
+            data[1, 2, 3] = 1e20
+            # the chunks after the 5th time step are not written
+            variable[:5] = data
+
+        dataset = netCDF4.Dataset(file_path)
+        datasets.append(dataset)
+        return file_path, dataset.variables['tas']
+
+    yield make_variable
+
+    for dataset in datasets:
+        dataset.close()
+
+
+@pytest.mark.parametrize('kwargs', [
+    {'zlib': True, 'chunksizes': (1, 7, 10)},
+    {'zlib': True, 'shuffle': True, 'chunksizes': (2, 3, 4)},
+    {'zlib': True, 'shuffle': False, 'fletcher32': True, 'chunksizes': (5, 1, 1)},
+    {'chunksizes': (3, 7, 10)}
+])
+@pytest.mark.parametrize('index', [
+    (slice(None), slice(None), slice(None)),
+    (slice(1, 2), slice(None), slice(None)),
+    (slice(1, 4), slice(2, 6), slice(3, 9)),
+    (slice(4, 8), slice(None), slice(None))
+])
+def test_chunk_reader(make_variable, kwargs, index):
+    # the slabs are the same as with netCDF4, including the mask of the missing values
+    file_path, variable = make_variable(**kwargs)
+
+    reader = get_chunk_reader(file_path, variable, 2)
+    assert reader is not None
+    try:
+        data = reader.read(index)
+    finally:
+        reader.close()
+
+    expected = variable[index]
+    assert (np.ma.getmaskarray(data) == np.ma.getmaskarray(expected)).all()
+    assert (data == expected).all()
+
+
+@pytest.mark.parametrize('threads, data_model, attrs, kwargs', [
+    (0, 'NETCDF4_CLASSIC', {}, {'zlib': True}),
+    (2, 'NETCDF3_CLASSIC', {}, {}),
+    (2, 'NETCDF4_CLASSIC', {}, {'contiguous': True}),
+    (2, 'NETCDF4_CLASSIC', {'scale_factor': 2.0}, {'zlib': True})
+])
+def test_get_chunk_reader_unsupported(make_variable, threads, data_model, attrs, kwargs):
+    # these variables are read using netCDF4
+    file_path, variable = make_variable(data_model, attrs, **kwargs)
+
+    assert get_chunk_reader(file_path, variable, threads) is None
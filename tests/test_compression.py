@@ -0,0 +1,82 @@
+import numpy as np
+import pytest
+
+from isimip_qc import models
+from isimip_qc.models import File
+from isimip_qc.utils.compression import COMPLEVELS, get_advice, get_candidates, quantize
+
+
+def test_get_candidates():
+    candidates = get_candidates()
+    assert len(candidates) == 2 * len(COMPLEVELS)
+    assert {candidate.shuffle for candidate in candidates} == {False, True}
+
+    candidates = get_candidates(2, shuffle=False)
+    assert len(candidates) == len(COMPLEVELS) + 1
+    assert not any(candidate.shuffle for candidate in candidates)
+    assert [candidate.is_lossy for candidate in candidates].count(True) == 1
+
+
+@pytest.mark.parametrize('shuffle', [True, False])
+def test_get_advice(make_netcdf, shuffle):
+    data = np.linspace(0, 1, 8 * 30 * 60, dtype=np.float32).reshape(8, 30, 60)
+    advice = get_advice(make_netcdf('tas.nc', data), 'tas', shuffle=shuffle)
+
+    assert advice.sample_size == 8
+    assert not advice.chosen.is_lossy
+    assert advice.chosen in advice.candidates
+    assert all(candidate.size > 0 for candidate in advice.candidates)
+    if not shuffle:
+        assert not advice.chosen.shuffle
+
+
+def test_get_advice_missing_variable(make_netcdf):
+    assert get_advice(make_netcdf('tas.nc'), 'pr') is None
+
+
+def test_quantize():
+    data = np.array([0.123456, 1e20], dtype=np.float32)
+    quantized = quantize(data, np.array([False, True]), 2)
+
+    assert abs(quantized[0] - data[0]) < 0.01
+    assert quantized[1] == data[1]
+
+
+@pytest.fixture
+def fix_file(make_netcdf, cli_settings, monkeypatch):
+    monkeypatch.setattr(cli_settings, 'TUNE_COMPRESSION', True)
+
+    file = File(make_netcdf('tas.nc'))
+    file.open_log()
+    file.variable_name = 'tas'
+    file.warn('Data model is wrong.', fix_datamodel=True)
+    yield file
+    file.close_log()
+
+
+def test_fix_datamodel_cdo(fix_file, cli_settings, monkeypatch):
+    # cdo can not apply the shuffle filter, so no candidate with shuffle is chosen
+    calls = []
+    monkeypatch.setattr(cli_settings, 'FIX_DATAMODEL', 'cdo')
+    monkeypatch.setattr(models.shutil, 'which', lambda tool: '/usr/bin/' + tool)
+    monkeypatch.setattr(models, 'call_cdo', lambda args, input_file, output_file: calls.append(args))
+
+    fix_file.fix_datamodel()
+
+    assert len(calls) == 1
+    assert not any(finding.args and 'shuffle' in str(finding.args[0]) for finding in fix_file.infos)
+
+
+@pytest.mark.parametrize('fix_datamodel, which', [
+    ('cdo', None),
+    ('nccopy', None),
+    ('ncks', '/usr/bin/ncks')
+])
+def test_fix_datamodel_not_available(fix_file, cli_settings, monkeypatch, fix_datamodel, which):
+    # the compression is only tuned if the file can be rewritten
+    monkeypatch.setattr(cli_settings, 'FIX_DATAMODEL', fix_datamodel)
+    monkeypatch.setattr(models.shutil, 'which', lambda tool: which)
+    monkeypatch.setattr(File, 'tune_compression', lambda file, shuffle=True: pytest.fail('tuned'))
+
+    assert fix_file.fix_datamodel() is False
+    assert len(fix_file.errors) == 1
@@ -0,0 +1,64 @@
+from pathlib import Path
+
+import pytest
+
+from isimip_qc.config import Settings
+
+SCHEMA_PATHS = [
+    Path('ISIMIP3b/OutputData/water_global'),
+    Path('ISIMIP3b/InputData/climate/atmosphere/obsclim'),
+    Path('ISIMIP2b/OutputData/water_global')
+]
+
+
+@pytest.fixture
+def auto_settings(monkeypatch):
+    fetched = []
+
+    def fetch_protocol(schema_path):
+        # only the SCHEMA_PATHS have a protocol
+        fetched.append(schema_path)
+        protocol = dict.fromkeys(['DEFINITIONS', 'PATTERN', 'SCHEMA'], {} if schema_path in SCHEMA_PATHS else None)
+        protocol['SCHEMA_PATH'] = schema_path
+        return protocol
+
+    settings = Settings(shared=False)
+    settings.PROTOCOLS = {}
+    settings.SCHEMA_PATHS = {}
+    monkeypatch.setattr(settings, 'fetch_protocol', fetch_protocol)
+    settings.fetched = fetched
+    return settings
+
+
+@pytest.mark.parametrize('file_path, schema_path', [
+    ('/data/ISIMIP3b/OutputData/water_global/H08/gfdl-esm4/historical/file.nc', SCHEMA_PATHS[0]),
+    ('/data/ISIMIP3b/InputData/climate/atmosphere/obsclim/global/file.nc', SCHEMA_PATHS[1]),
+    ('/data/ISIMIP2b/OutputData/water_global/H08/file.nc', SCHEMA_PATHS[2]),
+    ('ISIMIP3b/OutputData/water_global/file.nc', SCHEMA_PATHS[0]),
+    ('/data/ISIMIP3b/OutputData/file.nc', None),
+    ('/data/ISIMIP3b/OutputData/biomes/LPJmL/file.nc', None),
+    ('/data/water_global/H08/file.nc', None),
+    ('/ISIMIP3b/ISIMIP3b/OutputData/water_global/file.nc', SCHEMA_PATHS[0])
+])
+def test_detect(auto_settings, file_path, schema_path):
+    assert auto_settings.detect(file_path) == schema_path
+
+
+def test_detect_cache(auto_settings):
+    dir_path = Path('/data/ISIMIP3b/OutputData/water_global/H08')
+    assert auto_settings.detect(dir_path / 'a.nc') == SCHEMA_PATHS[0]
+    assert auto_settings.fetched == [Path('ISIMIP3b/OutputData/water_global')]
+
+    # the schema_path is detected once per directory and the protocol is fetched once per schema_path
+    assert auto_settings.detect(dir_path / 'b.nc') == SCHEMA_PATHS[0]
+    assert auto_settings.detect(dir_path.parent / 'LPJmL' / 'c.nc') == SCHEMA_PATHS[0]
+    assert auto_settings.fetched == [Path('ISIMIP3b/OutputData/water_global')]
+    assert set(auto_settings.SCHEMA_PATHS) == {dir_path, dir_path.parent / 'LPJmL'}
+
+
+def test_activate(auto_settings):
+    assert auto_settings.activate(SCHEMA_PATHS[0]) is True
+    assert auto_settings.SCHEMA_PATH == SCHEMA_PATHS[0]
+
+    assert auto_settings.activate('ISIMIP3b/OutputData') is False
+    assert auto_settings.SCHEMA is None
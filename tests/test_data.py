@@ -0,0 +1,181 @@
+import threading
+import tracemalloc
+
+import numpy as np
+import pytest
+
+from isimip_qc.checks.variables import data
+from isimip_qc.models import File
+from isimip_qc.utils.landseamask import LandSeaMask
+
+
+class Reader(object):
+
+    closed = False
+
+    def read(self, index):
+        raise OSError('read failed')
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def values(request):
+    # the data of the file, ones by default
+    return getattr(request, 'param', None)
+
+
+@pytest.fixture
+def data_file(make_netcdf, cli_settings, monkeypatch, values):
+    monkeypatch.setattr(cli_settings, 'MINMAX', 10)
+    monkeypatch.setattr(cli_settings, 'MEMORY_LIMIT', 1024 ** 2)
+    monkeypatch.setattr(cli_settings, 'READ_THREADS', 2)
+    monkeypatch.setattr(cli_settings, 'DEFINITIONS', {'variable': {'tas': {'valid_min': 0, 'valid_max': 200}}})
+
+    file = File(make_netcdf('tas.nc', values))
+    file.open_log()
+    file.open_dataset()
+    file.specifiers = {'variable': 'tas'}
+    file.variable_name = 'tas'
+    yield file
+    file.close_dataset()
+    file.close_log()
+
+
+def test_check_data(data_file):
+    data.check_data(data_file)
+
+    assert not tracemalloc.is_tracing()
+    assert data_file.peak_memory is not None
+    assert 'Values are within valid range (%.2E to %.2E).' in [finding.message for finding in data_file.infos]
+
+
+def test_check_data_read_fails(data_file, monkeypatch):
+    # the reader is closed and the tracing is stopped, also if reading fails
+    reader = Reader()
+    monkeypatch.setattr(data, 'get_chunk_reader', lambda *args: reader)
+
+    with pytest.raises(OSError):
+        data.check_data(data_file)
+
+    assert reader.closed
+    assert not tracemalloc.is_tracing()
+
+
+def get_values(shift):
+    values = np.random.default_rng(0).normal(100, 1, size=(60, 3, 6)).astype(np.float32)
+    values[30:] += shift
+    return values
+
+
+@pytest.mark.parametrize('values, steps', [
+    (get_values(0), []),
+    (get_values(20), [31])
+], indirect=['values'])
+def test_check_data_discontinuities(data_file, steps):
+    data.check_data(data_file)
+
+    warnings = [finding for finding in data_file.warnings if finding.message.startswith('Discontinuity')]
+    assert [finding.args[1] for finding in warnings] == steps
+
+
+def get_out_of_range(time_steps):
+    values = np.ones((40, 3, 6), dtype=np.float32)
+    values[time_steps, 0, 0] = 300
+    return values
+
+
+@pytest.mark.parametrize('values', [get_out_of_range([0, 39])], indirect=True)
+def test_check_data_sample(data_file, monkeypatch):
+    monkeypatch.setattr(data_file.settings, 'SAMPLE', 10)
+    data.check_data(data_file)
+
+    # only the sample is read, the first and the last time step are always part of it
+    warnings = {finding.message: finding.args for finding in data_file.warnings}
+    assert warnings['%i sampled values are higher than the valid maximum (%.2E %s).'][0] == 2
+
+    infos = {finding.message: finding.args for finding in data_file.infos}
+    assert infos['Sampled %i time steps of "%s": %.1f MB of %.1f MB of data (%.1f%%).'][::4] == (10, 25.0)
+    flagged, sampled, lower, upper = infos['%i of %i sampled time steps have values out of the valid range, '
+                                           'estimated share of all time steps: %.1f%% to %.1f%% (95%% confidence).']
+    assert (flagged, sampled) == (2, 10)
+    assert lower < 20 < upper
+
+
+def get_land():
+    land = np.zeros((3, 6), dtype=bool)
+    land[1:, :3] = True
+    return land
+
+
+def test_mismatches():
+    land = get_land()
+    landseamask = LandSeaMask(np.linspace(90, -90, 3), np.linspace(-180, 180, 6), land)
+    valid = np.ones((4, 3, 6), dtype=bool)
+    valid[2] = land
+    valid[3, 1, 1] = False
+
+    full = data.Mismatches(landseamask, landseamask.bits, (4, ))
+    full.update((slice(0, 4), slice(None), slice(None)), valid)
+
+    # slabs with parts of the fields, in any order
+    parts = data.Mismatches(landseamask, landseamask.bits, (4, ))
+    for index in [(slice(2, 4), slice(0, 3), slice(3, 6)), (slice(0, 2), slice(0, 3), slice(0, 3)),
+                  (slice(2, 4), slice(0, 3), slice(0, 3)), (slice(0, 2), slice(0, 3), slice(3, 6))]:
+        parts.update(index, valid[index])
+
+    for mismatches in [full, parts]:
+        assert mismatches.fields == 4
+        assert (mismatches.ocean_fields, mismatches.ocean_values, mismatches.ocean_first) == (3, 12, 0)
+        assert (mismatches.land_fields, mismatches.land_missing, mismatches.land_first) == (1, 1, 3)
+
+
+@pytest.mark.parametrize('minmax', [None, 10])
+def test_check_landseamask(data_file, monkeypatch, minmax):
+    landseamask = LandSeaMask(np.linspace(90, -90, 3), np.linspace(-180, 180, 6), get_land())
+    monkeypatch.setattr(data, 'get_landseamask', lambda mask_path: landseamask)
+    monkeypatch.setattr(data_file.settings, 'LANDSEAMASK', 'landseamask.nc')
+    monkeypatch.setattr(data_file.settings, 'SECTOR', 'water_global', raising=False)
+    monkeypatch.setattr(data_file.settings, 'MINMAX', minmax)
+
+    # without --minmax, only the first and the last time step are compared
+    data.check_data(data_file)
+    data.check_landseamask(data_file)
+
+    warnings = [finding.args for finding in data_file.warnings if 'ocean cells' in finding.message]
+    assert warnings == [(4 if minmax else 2, 'tas', 12, 1)]
+
+
+def test_check_data_unlocked(data_file, monkeypatch):
+    # with the lock of the Checker API, the slabs are processed without holding it
+    data_file.lock = threading.RLock()
+    free = []
+
+    def get_offset(index):
+        free.append(acquire_in_thread(data_file.lock))
+        return tuple(i.start or 0 for i in index)
+
+    monkeypatch.setattr(data, 'get_offset', get_offset)
+
+    with data_file.locked():
+        data.check_data(data_file)
+        assert not acquire_in_thread(data_file.lock)
+
+    assert free and all(free)
+    assert acquire_in_thread(data_file.lock)
+
+
+def acquire(lock):
+    if lock.acquire(blocking=False):
+        lock.release()
+        return True
+    return False
+
+
+def acquire_in_thread(lock):
+    result = []
+    thread = threading.Thread(target=lambda: result.append(acquire(lock)))
+    thread.start()
+    thread.join()
+    return result[0]
@@ -0,0 +1,80 @@
+import re
+from pathlib import Path
+
+import pytest
+
+from isimip_qc.utils.files import filter_files, glob_files, list_files, walk_files
+
+PATTERN = re.compile(r'^(?P<model>\w+)_(?P<variable>\w+)\.nc$')
+
+
+@pytest.fixture
+def tree(tmp_path):
+    for path in ['b/h08_qtot.nc', 'b/h08_dis.nc', 'a/c/h08_evap.nc', 'a/h08_qtot.nc', 'h08_dis.nc', 'readme.txt']:
+        file_path = tmp_path / path
+        file_path.parent.mkdir(parents=True, exist_ok=True)
+        file_path.touch()
+
+    return tmp_path
+
+
+@pytest.mark.parametrize('threads', [0, 4])
+def test_walk_files(tree, threads):
+    # the files of a directory first, then the subdirectories, all in sorted order
+    assert [file_path.relative_to(tree).as_posix() for file_path in walk_files(tree, threads)] == [
+        'h08_dis.nc', 'readme.txt', 'a/h08_qtot.nc', 'a/c/h08_evap.nc', 'b/h08_dis.nc', 'b/h08_qtot.nc'
+    ]
+
+
+def test_walk_files_symlink(tree):
+    (tree / 'link').symlink_to(tree / 'a', target_is_directory=True)
+
+    assert not any('link' in file_path.parts for file_path in walk_files(tree))
+
+
+def test_walk_files_missing(tmp_path):
+    assert list(walk_files(tmp_path / 'missing')) == []
+
+
+def test_list_files(tree, tmp_path):
+    list_path = tmp_path / 'files.txt'
+    list_path.write_text('# a comment\nb/h08_dis.nc\n\n  a/h08_qtot.nc  \n../outside.nc\n{}\n'.format(tree / 'h08_dis.nc'))
+
+    assert list(list_files(list_path, tree)) == [tree / 'b/h08_dis.nc', tree / 'a/h08_qtot.nc', tree / 'h08_dis.nc']
+
+
+def test_glob_files(tree):
+    assert sorted(glob_files(tree, '**/*_qtot.nc')) == [tree / 'a/h08_qtot.nc', tree / 'b/h08_qtot.nc']
+
+
+@pytest.mark.parametrize('include, exclude, variables', [
+    (None, None, ['dis', 'qtot', 'evap', None]),
+    ('qtot,dis', None, ['dis', 'qtot', None]),
+    (None, 'dis', ['qtot', 'evap', None]),
+    ('qtot', 'qtot', [None])
+])
+def test_filter_files(tree, include, exclude, variables):
+    # files which do not match the pattern are passed on, so that they are reported
+    file_paths = [tree / 'h08_dis.nc', tree / 'a/h08_qtot.nc', tree / 'a/c/h08_evap.nc', tree / 'readme.txt']
+    filtered = filter_files(file_paths, PATTERN, include, exclude)
+
+    assert [PATTERN.match(file_path.name).group('variable') if PATTERN.match(file_path.name) else None
+            for file_path in filtered] == variables
+
+
+def test_filter_files_callable(tree):
+    # the pattern can depend on the file, e.g. for schema_path auto
+    file_paths = [tree / 'h08_dis.nc', tree / 'a/h08_qtot.nc']
+
+    def get_pattern(file_path):
+        return PATTERN if file_path.parent == tree else None
+
+    assert list(filter_files(file_paths, get_pattern, include='qtot')) == [tree / 'a/h08_qtot.nc']
+
+
+def test_list_files_relative_base(tree, tmp_path, monkeypatch):
+    monkeypatch.chdir(tree)
+    list_path = tmp_path / 'files.txt'
+    list_path.write_text('b/h08_dis.nc\n../h08_dis.nc\n')
+
+    assert list(list_files(list_path, Path('a/..'))) == [Path('a/../b/h08_dis.nc')]
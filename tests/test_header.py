@@ -0,0 +1,81 @@
+import netCDF4
+import numpy as np
+import pytest
+
+from isimip_qc.utils.header import HEADER_FIELDS, get_changed_fields, get_header, reads
+
+
+def set_units(dataset):
+    dataset.variables['tas'].units = 'K'
+
+
+def set_title(dataset):
+    dataset.title = 'tas'
+
+
+def set_missing_value(dataset):
+    dataset.variables['tas'].missing_value = np.float32(-999)
+
+
+def set_lat(dataset):
+    dataset.variables['lat'][0] = 89.75
+
+
+def set_data(dataset):
+    dataset.variables['tas'][0] = 2
+
+
+def rename_lon(dataset):
+    dataset.renameVariable('lon', 'longitude')
+
+
+@pytest.mark.parametrize('change, changed_fields', [
+    (set_units, {'attributes'}),
+    (set_title, {'global_attributes'}),
+    (set_missing_value, {'attributes', 'fill_values'}),
+    (set_lat, {'coordinates'}),
+    (set_data, set()),
+    (rename_lon, {'variables', 'attributes', 'storage', 'fill_values', 'coordinates'})
+])
+def test_get_changed_fields(make_netcdf, change, changed_fields):
+    file_path = make_netcdf('tas.nc')
+    with netCDF4.Dataset(file_path) as dataset:
+        header = get_header(dataset)
+
+    with netCDF4.Dataset(file_path, 'a') as dataset:
+        change(dataset)
+
+    with netCDF4.Dataset(file_path) as dataset:
+        assert get_changed_fields(header, get_header(dataset)) == changed_fields
+
+
+def test_get_changed_fields_data_model(make_netcdf):
+    with netCDF4.Dataset(make_netcdf('tas.nc')) as dataset:
+        header = get_header(dataset)
+    with netCDF4.Dataset(make_netcdf('tas.nc', data_model='NETCDF3_64BIT_OFFSET')) as dataset:
+        new_header = get_header(dataset)
+
+    assert get_changed_fields(header, new_header) == {'data_model', 'storage'}
+    assert get_changed_fields({}, new_header) == set(HEADER_FIELDS)
+
+
+def test_get_header_fill_values(make_netcdf):
+    file_path = make_netcdf('tas.nc')
+    with netCDF4.Dataset(file_path, 'a') as dataset:
+        dataset.variables['tas'].missing_value = np.float32(1e20)
+        dataset.variables['lat'].missing_value = -999.0
+
+    with netCDF4.Dataset(file_path) as dataset:
+        fill_values = get_header(dataset)['fill_values']
+
+    # the values are comparable, also if they are read as numpy scalars
+    assert fill_values['tas'] == [float(np.float32(1e20))]
+    assert fill_values['lat'] == [netCDF4.default_fillvals['f8'], -999.0]
+
+
+def test_reads():
+    @reads('attributes', 'fill_values')
+    def check_units(file):
+        pass
+
+    assert check_units.reads == ('attributes', 'fill_values')
@@ -0,0 +1,68 @@
+import netCDF4
+import numpy as np
+import pytest
+
+from isimip_qc.utils.landseamask import LandSeaMask, get_landseamask
+
+LAT = np.linspace(90, -90, 3)
+LON = np.linspace(-180, 180, 7)
+
+
+@pytest.fixture
+def land():
+    return np.random.default_rng(0).random((3, 7)) > 0.5
+
+
+@pytest.mark.parametrize('bitwise_count', [True, False])
+def test_count(land, bitwise_count, monkeypatch):
+    if not bitwise_count:
+        # numpy < 2.0
+        monkeypatch.delattr(np, 'bitwise_count', raising=False)
+
+    landseamask = LandSeaMask(LAT, LON, land)
+    valid = np.random.default_rng(1).random((4, 2, 3, 7)) > 0.5
+    valid[0, 0] = land
+
+    ocean_values, land_missing = landseamask.count(landseamask.bits, valid)
+
+    assert ocean_values.shape == land_missing.shape == (4, 2)
+    assert (ocean_values == (valid & ~land).sum(axis=(-2, -1))).all()
+    assert (land_missing == (~valid & land).sum(axis=(-2, -1))).all()
+    assert ocean_values[0, 0] == land_missing[0, 0] == 0
+
+
+def test_get_bits(land):
+    landseamask = LandSeaMask(LAT, LON, land)
+
+    assert landseamask.get_bits(LAT, LON) is landseamask.bits
+    assert landseamask.get_bits(LAT[::-1], LON) is landseamask.bits_reversed
+    assert landseamask.get_bits(LAT, LON[::-1]) is None
+    assert landseamask.get_bits(LAT[:2], LON) is None
+
+    # the reversed bitset matches a file ordered S to N
+    assert (landseamask.get_land(landseamask.bits_reversed) == land[::-1]).all()
+    assert landseamask.count(landseamask.bits_reversed, land[::-1])[0] == 0
+
+
+def test_get_landseamask(tmp_path, land):
+    mask_path = tmp_path / 'landseamask.nc'
+    with netCDF4.Dataset(mask_path, 'w') as dataset:
+        dataset.createDimension('lat', 3)
+        dataset.createDimension('lon', 7)
+        dataset.createVariable('lat', 'f8', ('lat', ))[:] = LAT
+        dataset.createVariable('lon', 'f8', ('lon', ))[:] = LON
+        variable = dataset.createVariable('mask', 'f4', ('lat', 'lon'), fill_value=1e20)
+        data = np.ma.masked_array(land.astype(np.float32), mask=~land)
+        data[0, 0] = 0
+        variable[:] = data
+
+    landseamask = get_landseamask(mask_path)
+    expected = land.copy()
+    expected[0, 0] = False
+
+    assert (landseamask.get_land(landseamask.bits) == expected).all()
+    assert landseamask.land_count == expected.sum()
+
+    # the mask is read once per process
+    assert get_landseamask(mask_path) is landseamask
+    assert get_landseamask(tmp_path / 'missing.nc') is None
@@ -0,0 +1,58 @@
+import logging
+
+from isimip_qc.utils import logs
+from isimip_qc.utils.logs import LogSink
+
+
+def test_log_file(tmp_path):
+    log_path = tmp_path / 'logs' / 'tas.log'
+    sink = LogSink('tas.nc', 'CRITICAL', log_path)
+    sink.log(logging.DEBUG, 'debug %s', ('message', ))
+    sink.log(logging.INFO, 'info %s', ('message', ))
+    sink.log(logging.ERROR, 'error %i', (2, ))
+    sink.close()
+    sink.close()
+
+    assert log_path.read_text() == ' INFO     : info message\n ERROR    : error 2\n'
+    assert 'tas.nc' not in logging.Logger.manager.loggerDict
+
+
+def test_console(capsys, monkeypatch):
+    # the console handler is created once and shared by all files
+    monkeypatch.setattr(logs, 'console_handler', None)
+    sink = LogSink('tas.nc', 'WARNING')
+    sink.log(logging.INFO, 'info', ())
+    sink.log(logging.WARNING, 'warning %s', ('message', ))
+    sink.close()
+
+    assert capsys.readouterr().err.count('warning message') == 1
+
+
+def test_no_records(monkeypatch):
+    # without handlers for a level, no records are created
+    records = []
+    monkeypatch.setattr(logging, 'LogRecord', lambda *args: records.append(args))
+
+    sink = LogSink('tas.nc', 'ERROR')
+    sink.log(logging.INFO, 'info', ())
+    assert not sink.is_enabled_for(logging.WARNING)
+
+    sink = LogSink('tas.nc', 'INFO', console=False)
+    sink.log(logging.CRITICAL, 'critical', ())
+
+    assert records == []
+
+
+def test_file_handlers_are_reused(tmp_path):
+    first = LogSink('a.nc', 'CRITICAL', tmp_path / 'a.log', console=False)
+    handler = first.file_handler
+    first.close()
+
+    second = LogSink('b.nc', 'CRITICAL', tmp_path / 'b.log', console=False)
+    assert second.file_handler is handler
+    second.log(logging.WARNING, 'b', ())
+    second.close()
+
+    assert handler in logs.file_handlers
+    assert (tmp_path / 'a.log').read_text() == ''
+    assert (tmp_path / 'b.log').read_text() == ' WARNING  : b\n'
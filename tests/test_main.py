@@ -0,0 +1,217 @@
+import sys
+
+import numpy as np
+import pytest
+
+from isimip_qc import checker, fixes, main
+from isimip_qc.checker import OPEN_FAILED
+from isimip_qc.config import settings
+from isimip_qc.main import NO_SCHEMA_PATH, check_file, check_path, fix_file, process_file, schedule_files
+from isimip_qc.models import File
+from isimip_qc.utils.header import reads
+from isimip_qc.utils.schedule import Timings
+from isimip_qc.utils.throttle import IOGovernor
+
+
+@pytest.fixture
+def garbage_file(tmp_path, cli_settings):
+    file_path = tmp_path / 'garbage.nc'
+    file_path.write_bytes(b'CDF\x01' + bytes(range(256)) * 4)
+    return file_path
+
+
+@pytest.mark.parametrize('fix, fix_datamodel', [
+    (True, False),
+    (False, 'nccopy'),
+    (True, 'cdo')
+])
+def test_process_file_open_failed(garbage_file, monkeypatch, fix, fix_datamodel):
+    monkeypatch.setattr(settings, 'FIX', fix)
+    monkeypatch.setattr(settings, 'FIX_DATAMODEL', fix_datamodel)
+
+    file = process_file(garbage_file)
+
+    assert [finding.message for finding in file.criticals] == [OPEN_FAILED]
+    assert file.header is None
+
+
+def test_fix_file_verify_open_failed(garbage_file, monkeypatch):
+    # the file could be opened in the first pass, but not after it was rewritten
+    monkeypatch.setattr(settings, 'FIX_DATAMODEL', 'nccopy')
+    monkeypatch.setattr(File, 'fix_datamodel', lambda file: True)
+
+    file = File(garbage_file)
+    file.open_log()
+    file.header = {}
+    file.warn('Variable "%s" is not compressed.', 'garbage', fix_datamodel=True)
+
+    fix_file(file)
+
+    assert [finding.message for finding in file.criticals] == [OPEN_FAILED]
+
+
+def test_fix_file_without_fix(garbage_file, monkeypatch):
+    # without a rewrite, the file is not opened again
+    monkeypatch.setattr(settings, 'FIX_DATAMODEL', 'nccopy')
+    monkeypatch.setattr(File, 'fix_datamodel', lambda file: False)
+
+    file = File(garbage_file)
+    file.open_log()
+    file.header = {}
+    file.warn('Variable "%s" is not compressed.', 'garbage', fix_datamodel=True)
+
+    fix_file(file)
+
+    assert not file.criticals
+
+
+def test_process_file_check_raises(cli_settings, make_netcdf, monkeypatch):
+    # the slot of --max-opens is released if a check raises, so the next file does not wait for it
+    governor = IOGovernor(max_opens=1)
+    monkeypatch.setattr(settings, 'IO_GOVERNOR', governor)
+
+    def check_raises(file):
+        raise ValueError('broken file')
+
+    monkeypatch.setattr(main, 'checks', [check_raises])
+    with pytest.raises(ValueError):
+        process_file(make_netcdf('broken.nc'))
+
+    assert list(governor.slots) == [0]
+
+    monkeypatch.setattr(main, 'checks', [])
+    file = process_file(make_netcdf('clean.nc'))
+
+    assert file.is_clean
+    assert file.dataset.isopen() is False
+    assert list(governor.slots) == [0]
+
+
+def test_verify_fixes(cli_settings, make_netcdf, monkeypatch):
+    # after --fix, only the checks which read a changed part of the header are performed again
+    calls = []
+
+    @reads('attributes')
+    def check_units(file):
+        calls.append('check_units')
+        if 'units' not in file.dataset.variables['tas'].ncattrs():
+            file.warn('Attribute units is missing.', fix={
+                'func': fixes.fix_set_variable_attr,
+                'args': (file, 'tas', 'units', 'K')
+            })
+
+    @reads('coordinates')
+    def check_lat(file):
+        calls.append('check_lat')
+        file.info('Latitudes are fine.')
+
+    def check_other(file):
+        calls.append('check_other')
+
+    monkeypatch.setattr(settings, 'FIX', True)
+    monkeypatch.setattr(main, 'checks', [check_units, check_lat, check_other])
+
+    file = process_file(make_netcdf('tas.nc'))
+
+    assert calls == ['check_units', 'check_lat', 'check_other', 'check_units', 'check_other']
+    # the findings of the checks which were not performed again are kept
+    assert not file.warnings
+    assert [info.check for info in file.infos if info.check] == ['check_lat']
+    assert 'Setting attribute "%s.%s=%s"' in [info.message for info in file.infos]
+
+
+def test_check_file_auto(cli_settings, make_netcdf, monkeypatch, tmp_path):
+    # with --schema-path auto, the protocol is activated for each file
+    activated = []
+    monkeypatch.setattr(settings, 'AUTO_SCHEMA', True)
+    monkeypatch.setattr(settings, 'detect', lambda file_path: 'ISIMIP3b/OutputData/water_global'
+                        if file_path.name == 'qtot.nc' else None)
+    monkeypatch.setattr(settings, 'activate', activated.append)
+    monkeypatch.setattr(main, 'checks', [])
+
+    path, result, stop = check_file(make_netcdf('qtot.nc'))
+    assert path.as_posix() == 'qtot.nc'
+    assert result['specifiers'] == {'variable': 'qtot'}
+    assert activated == ['ISIMIP3b/OutputData/water_global']
+
+    path, result, stop = check_file(make_netcdf('dis.nc'))
+    assert [finding.message for finding in result['findings']] == [NO_SCHEMA_PATH]
+    assert not stop
+    assert activated == ['ISIMIP3b/OutputData/water_global']
+
+
+def test_schedule_files(cli_settings, make_netcdf, tmp_path):
+    small = make_netcdf('small.nc')
+    large = make_netcdf('large.nc', np.random.default_rng(0).random((400, 3, 6), dtype=np.float32))
+    timings = Timings(tmp_path / 'timings.json', 'header')
+
+    # the files with the longest predicted duration are checked first
+    assert schedule_files([small, large], timings)[0] == [large, small]
+
+    timings.record(small, 1, 100)
+    file_paths, costs = schedule_files([small, large], timings)
+    assert file_paths == [small, large]
+    assert costs[small][1] == 100
+
+
+@pytest.fixture
+def serve_settings(cli_settings, monkeypatch):
+    monkeypatch.setattr(cli_settings, 'activate', lambda schema_path: True)
+    return cli_settings
+
+
+def test_check_path(serve_settings, make_netcdf, monkeypatch, tmp_path):
+    # a request only checks the file, also if --fix or --move were set
+    checked_path = tmp_path / 'checked'
+    checked_path.mkdir()
+    monkeypatch.setattr(serve_settings, 'FIX', True)
+    monkeypatch.setattr(serve_settings, 'MOVE', True)
+    monkeypatch.setattr(serve_settings, 'CHECKED_PATH', checked_path)
+    monkeypatch.setattr(checker, 'checks', [])
+
+    file_path = make_netcdf('tas.nc')
+    status, result = check_path('ISIMIP3b/OutputData/water_global', 'tas.nc')
+
+    assert status == 200
+    assert result['path'] == 'tas.nc'
+    assert result['specifiers'] == {'variable': 'tas'}
+    assert file_path.exists()
+    assert not list(checked_path.iterdir())
+
+
+def test_check_path_not_below(serve_settings):
+    assert check_path('ISIMIP3b/OutputData/water_global', '../tas.nc')[0] == 403
+    assert check_path('ISIMIP3b/OutputData/water_global', 'missing.nc')[0] == 404
+
+
+def test_check_path_check_raises(serve_settings, make_netcdf, monkeypatch):
+    # after a failed request, the slot of --max-opens is free for the next one
+    governor = IOGovernor(max_opens=1)
+    monkeypatch.setattr(serve_settings, 'IO_GOVERNOR', governor)
+
+    def check_raises(file):
+        raise ValueError('broken file')
+
+    make_netcdf('broken.nc')
+    make_netcdf('tas.nc')
+
+    monkeypatch.setattr(checker, 'checks', [check_raises])
+    for i in range(3):
+        with pytest.raises(ValueError):
+            check_path('ISIMIP3b/OutputData/water_global', 'broken.nc')
+        assert list(governor.slots) == [0]
+
+    monkeypatch.setattr(checker, 'checks', [])
+    assert check_path('ISIMIP3b/OutputData/water_global', 'tas.nc')[0] == 200
+
+
+@pytest.mark.parametrize('option', ['--fix', '--fix-datamodel', '--move', '--copy'])
+def test_serve_rejects_fix_and_move(option, tmp_path, monkeypatch, capsys):
+    monkeypatch.setattr(settings, '__dict__', dict(settings.__dict__))
+    monkeypatch.setattr(main, 'serve', lambda: pytest.fail('served'))
+    monkeypatch.setattr(sys, 'argv', ['isimip-qc', 'serve', '--unchecked-path', str(tmp_path), option])
+
+    with pytest.raises(SystemExit):
+        main.main()
+
+    assert 'can not be used with serve' in capsys.readouterr().err
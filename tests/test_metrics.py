@@ -0,0 +1,104 @@
+import urllib.error
+import urllib.request
+
+import pytest
+
+from isimip_qc.models import Finding
+from isimip_qc.utils.metrics import CONTENT_TYPE, Histogram, Metrics, format_bar
+from isimip_qc.utils.throttle import IOGovernor
+
+
+def test_histogram():
+    histogram = Histogram([1, 10])
+    for value in [0.5, 1, 5, 100]:
+        histogram.observe(value)
+
+    # the buckets are cumulative
+    assert histogram.render('duration') == [
+        'duration_bucket{le="1"} 2',
+        'duration_bucket{le="10"} 3',
+        'duration_bucket{le="+Inf"} 4',
+        'duration_sum 106.5',
+        'duration_count 4'
+    ]
+    assert histogram.render('duration', 'check="check_zip"')[-1] == 'duration_count{check="check_zip"} 4'
+
+
+def get_result(*findings):
+    return {'findings': list(findings), 'size': 1024, 'duration': 2.0, 'check_durations': {'check_zip': 0.01}}
+
+
+def test_render():
+    governor = IOGovernor()
+    governor.consume(4096)
+
+    metrics = Metrics(governor=governor)
+    metrics.set_files_left(3)
+    metrics.add(get_result(Finding('warnings', 'check_zip', 'Not compressed.')))
+    metrics.add(get_result())
+    metrics.add_prefetch(True)
+    metrics.set_queue_counts({'pending': 5, 'done': 2})
+
+    lines = metrics.render().splitlines()
+    assert 'isimip_qc_files_total 2' in lines
+    assert 'isimip_qc_bytes_total 2048' in lines
+    assert 'isimip_qc_files_left 1' in lines
+    assert 'isimip_qc_findings_total{level="warnings"} 1' in lines
+    assert 'isimip_qc_findings_total{level="errors"} 0' in lines
+    assert 'isimip_qc_queue_files{status="done"} 2' in lines
+    assert 'isimip_qc_prefetch_total{result="hit"} 1' in lines
+    assert 'isimip_qc_file_duration_seconds_count 2' in lines
+    assert 'isimip_qc_check_duration_seconds_bucket{check="check_zip",le="0.01"} 2' in lines
+    assert 'isimip_qc_io_read_bytes_total 4096.0' in lines
+    assert '# TYPE isimip_qc_files_total counter' in lines
+
+    # metrics without a value are left out
+    assert not any(line.startswith('isimip_qc_files_left') for line in Metrics().render().splitlines())
+    assert not any(line.startswith('isimip_qc_last_file') for line in Metrics().render().splitlines())
+
+
+def test_write(tmp_path, monkeypatch):
+    textfile_path = tmp_path / 'isimip_qc.prom'
+    metrics = Metrics(textfile_path)
+
+    # the textfile is written at most every WRITE_INTERVAL seconds and when the run is finished
+    metrics.add(get_result())
+    assert 'isimip_qc_files_total 1' in textfile_path.read_text().splitlines()
+    metrics.add(get_result())
+    assert 'isimip_qc_files_total 1' in textfile_path.read_text().splitlines()
+
+    metrics.close()
+    assert 'isimip_qc_files_total 2' in textfile_path.read_text().splitlines()
+    assert [path.name for path in tmp_path.iterdir()] == ['isimip_qc.prom']
+
+    # errors when writing the textfile do not stop the run
+    monkeypatch.setattr(metrics, 'textfile_path', tmp_path / 'missing' / 'isimip_qc.prom')
+    metrics.write(force=True)
+
+
+def test_server():
+    metrics = Metrics()
+    metrics.add(get_result())
+    metrics.start_server('127.0.0.1', 0)
+    try:
+        url = 'http://127.0.0.1:%i' % metrics.server.server_address[1]
+        with urllib.request.urlopen(url + '/metrics') as response:
+            assert response.headers['Content-Type'] == CONTENT_TYPE
+            assert 'isimip_qc_files_total 1' in response.read().decode().splitlines()
+
+        with pytest.raises(urllib.error.HTTPError) as e:
+            urllib.request.urlopen(url + '/other')
+        assert e.value.code == 404
+    finally:
+        metrics.close()
+
+
+@pytest.mark.parametrize('done, total, bar', [
+    (0, 10, '[--------------------]   0%'),
+    (5, 10, '[##########----------]  50%'),
+    (10, 10, '[####################] 100%'),
+    (0, 0, '[####################] 100%')
+])
+def test_format_bar(done, total, bar):
+    assert format_bar(done, total) == bar
+
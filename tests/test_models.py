@@ -0,0 +1,97 @@
+import pickle
+from pathlib import Path
+
+import netCDF4
+import pytest
+
+from isimip_qc import fixes
+from isimip_qc.checker import Result
+from isimip_qc.models import File, Finding
+
+
+@pytest.fixture
+def file(cli_settings, make_netcdf):
+    file = File(make_netcdf('tas.nc'))
+    file.open_log()
+    file.check = 'check_units'
+    yield file
+    file.close_log()
+
+
+def test_finding():
+    finding = Finding('warnings', 'check_units', 'Units of "%s" are "%s".', ('tas', 'K'),
+                      ('fix_set_variable_attr', ('tas', 'units', 'degC')))
+
+    assert finding.key == ('warnings', 'check_units', 'Units of "%s" are "%s".')
+    assert finding.text == 'Units of "tas" are "K".'
+    assert repr(finding) == '<Finding warnings check_units: Units of "tas" are "K".>'
+
+    # findings are small, since they have no __dict__
+    assert not hasattr(finding, '__dict__')
+
+    copy = pickle.loads(pickle.dumps(finding))
+    assert (copy.key, copy.args, copy.fix, copy.fix_datamodel) == (finding.key, finding.args, finding.fix, False)
+
+
+def test_file_findings(file):
+    file.info('Variable "%s" found.', 'tas')
+    file.warn('Attribute "%s" is missing.', 'units', fix={
+        'func': fixes.fix_set_variable_attr,
+        'args': (file, 'tas', 'units', 'K')
+    })
+    file.warn('Data model is %s.', 'NETCDF4', fix_datamodel=True)
+    file.error('Variable "%s" is broken.', 'tas')
+
+    # the fix refers to the function by name and not to the file, so the result can be pickled
+    assert file.warnings[0].fix == ('fix_set_variable_attr', ('tas', 'units', 'K'))
+    assert file.warnings[1].fix_datamodel
+    assert [finding.level for finding in file.findings] == ['infos', 'warnings', 'warnings', 'errors']
+    assert all(finding.check == 'check_units' for finding in file.findings)
+
+    result = pickle.loads(pickle.dumps(file.result))
+    assert [finding.text for finding in result['findings']] == [finding.text for finding in file.findings]
+
+    # fixes are applied with the file they are applied to
+    file.open_dataset(write=True)
+    try:
+        file.warnings[0].apply(file)
+    finally:
+        file.close_dataset()
+
+    with netCDF4.Dataset(file.abs_path) as dataset:
+        assert dataset.variables['tas'].units == 'K'
+
+
+def not_a_fix(file, variable_name):
+    pass
+
+
+def test_file_findings_invalid_fix(file, make_netcdf):
+    with pytest.raises(ValueError):
+        file.warn('Invalid fix.', fix={'func': not_a_fix, 'args': (file, 'tas')})
+
+    other_file = File(make_netcdf('pr.nc'))
+    with pytest.raises(ValueError):
+        file.warn('Fix for another file.', fix={'func': fixes.fix_set_variable_attr,
+                                                'args': (other_file, 'tas', 'units', 'K')})
+
+
+def test_result():
+    result = Result(Path('tas.nc'), Path('ISIMIP3b/OutputData/water_global'), {
+        'specifiers': {'variable': 'tas'},
+        'findings': [
+            Finding('infos', 'check_units', 'Units are "%s".', ('K', )),
+            Finding('warnings', None, 'Variable "%s" is not compressed.', ('tas', ))
+        ]
+    }, 1.5)
+
+    assert result.infos == ['Units are "K".']
+    assert result.warnings == ['Variable "tas" is not compressed.']
+    assert not result.errors and not result.criticals
+    assert not result.is_clean
+
+    json = result.json
+    assert json['schema_path'] == 'ISIMIP3b/OutputData/water_global'
+    assert json['warnings'] == ['Variable "tas" is not compressed.']
+    assert json['findings'] == [('infos', 'check_units', 'Units are "%s".'),
+                                ('warnings', None, 'Variable "%s" is not compressed.')]
@@ -0,0 +1,81 @@
+import warnings
+
+import netCDF4
+import numpy as np
+import pytest
+
+from isimip_qc.utils import netcdf3
+from isimip_qc.utils.netcdf3 import get_mmap_reader
+
+pytest.importorskip('scipy')
+
+
+@pytest.fixture
+def make_variable(tmp_path):
+    # write a variable (time, lat, lon) and open it with netCDF4
+    datasets = []
+
+    def make_variable(data_model='NETCDF3_64BIT_OFFSET', attrs={}, fill_value=1e20):
+        file_path = tmp_path / 'tas.nc'
+        with netCDF4.Dataset(file_path, 'w', format=data_model) as dataset:
+            dataset.createDimension('time', None)
+            dataset.createDimension('lat', 3)
+            dataset.createDimension('lon', 6)
+            variable = dataset.createVariable('tas', 'f4', ('time', 'lat', 'lon'), fill_value=fill_value)
+            variable.setncatts(attrs)
+
+            data = np.arange(4 * 3 * 6, dtype=np.float32).reshape(4, 3, 6)
+            data[1, 2, 3] = 1e20 if fill_value is not None else netCDF4.default_fillvals['f4']
+            data[2, 0, 0] = -999
+            variable[:] = data
+
+        dataset = netCDF4.Dataset(file_path)
+        datasets.append(dataset)
+        return file_path, dataset.variables['tas']
+
+    yield make_variable
+
+    for dataset in datasets:
+        dataset.close()
+
+
+@pytest.mark.parametrize('attrs, fill_value', [
+    ({}, 1e20),
+    ({}, None),
+    ({'missing_value': np.float32(-999)}, 1e20)
+])
+def test_mmap_reader(make_variable, attrs, fill_value):
+    file_path, variable = make_variable(attrs=attrs, fill_value=fill_value)
+    reader = get_mmap_reader(file_path, variable)
+
+    for index in [(slice(1, 3), slice(None), slice(2, 5)), (slice(0, 4), )]:
+        data = reader.read(index)
+        expected = variable[index]
+
+        # the values are a view on the mapped file, with the same mask as netCDF4
+        assert np.shares_memory(data.data, reader.data)
+        assert (data.mask == np.ma.getmaskarray(expected)).all()
+        assert (data.data == expected.data).all()
+
+    assert data.mask.sum() == (2 if 'missing_value' in attrs else 1)
+
+    # slabs which are still used do not cause a warning when the reader is closed
+    with warnings.catch_warnings():
+        warnings.simplefilter('error')
+        reader.close()
+    assert data.max() == 4 * 3 * 6 - 1
+
+
+@pytest.mark.parametrize('data_model, attrs', [
+    ('NETCDF4_CLASSIC', {}),
+    ('NETCDF4', {}),
+    ('NETCDF3_CLASSIC', {'scale_factor': 2.0}),
+    ('NETCDF3_CLASSIC', {'valid_max': 100.0})
+])
+def test_mmap_reader_unsupported(make_variable, data_model, attrs):
+    assert get_mmap_reader(*make_variable(data_model, attrs)) is None
+
+
+def test_mmap_reader_without_scipy(make_variable, monkeypatch):
+    monkeypatch.setattr(netcdf3, 'netcdf_file', None)
+    assert get_mmap_reader(*make_variable()) is None
@@ -0,0 +1,57 @@
+import threading
+import time
+
+from isimip_qc.utils import prefetch
+from isimip_qc.utils.metrics import Metrics
+from isimip_qc.utils.prefetch import prefetch_file, prefetch_files
+
+
+def test_prefetch_files_order(tmp_path):
+    file_paths = [tmp_path / '{}.nc'.format(i) for i in range(10)]
+    for file_path in file_paths:
+        file_path.write_bytes(b'CDF\x01')
+
+    assert list(prefetch_files(iter(file_paths), 3)) == file_paths
+    assert list(prefetch_files(iter(file_paths), 0)) == file_paths
+
+
+def test_prefetch_files_ahead(tmp_path, monkeypatch):
+    # the next `size` files are prefetched before the current one is yielded
+    prefetched = []
+    lock = threading.Lock()
+
+    def prefetch_file(file_path, data=False):
+        with lock:
+            prefetched.append(file_path)
+
+    monkeypatch.setattr(prefetch, 'prefetch_file', prefetch_file)
+
+    file_paths = prefetch_files(iter(range(10)), 3)
+    assert next(file_paths) == 0
+
+    # the generator is suspended, so not more than 4 files are prefetched
+    for i in range(100):
+        if len(prefetched) == 4:
+            break
+        time.sleep(0.01)
+    time.sleep(0.05)
+    assert sorted(prefetched) == [0, 1, 2, 3]
+
+    # the rest is cancelled when the consumer stops
+    file_paths.close()
+    assert len(prefetched) <= 10
+
+
+def test_prefetch_files_metrics(tmp_path):
+    file_path = tmp_path / 'tas.nc'
+    file_path.write_bytes(b'CDF\x01')
+
+    metrics = Metrics()
+    assert list(prefetch_files([file_path] * 5, 2, metrics=metrics)) == [file_path] * 5
+    assert sum(metrics.prefetch.values()) == 5
+
+
+def test_prefetch_file_missing(tmp_path):
+    # errors are left to the check of the file
+    prefetch_file(tmp_path / 'missing.nc')
+    prefetch_file(tmp_path, data=True)
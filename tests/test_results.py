@@ -0,0 +1,101 @@
+import sqlite3
+
+import pytest
+
+from isimip_qc.models import Finding
+from isimip_qc.utils import results
+from isimip_qc.utils.results import ResultsDatabase
+
+NOT_COMPRESSED = Finding('warnings', 'check_zip', 'Variable "%s" is not compressed.', ('tas', ))
+WRONG_UNITS = Finding('errors', 'check_units', 'Units of "%s" are wrong.', ('tas', ))
+INFO = Finding('infos', 'check_units', 'Units are "%s".', ('K', ))
+
+
+def get_result(model, *findings):
+    return {'specifiers': {'model': model, 'variable': 'tas', 'start_year': 1850}, 'findings': list(findings),
+            'duration': 1.0}
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = ResultsDatabase(tmp_path / 'results.sqlite')
+    yield db
+    db.close()
+
+
+def test_changes(db):
+    run_id = db.start_run('ISIMIP3b/OutputData/water_global', '/data', ['--minmax'])
+    db.add_file(run_id, 'a.nc', get_result('h08', NOT_COMPRESSED, INFO))
+    db.add_file(run_id, 'b.nc', get_result('h08', INFO))
+    db.add_file(run_id, 'd.nc', get_result('lpjml', WRONG_UNITS))
+    db.finish_run(run_id)
+
+    assert db.get_changes(run_id) == {'worse': [], 'better': [], 'new': ['a.nc', 'b.nc', 'd.nc']}
+
+    run_id = db.start_run()
+    db.add_file(run_id, 'a.nc', get_result('h08'))
+    db.add_file(run_id, 'b.nc', get_result('h08', WRONG_UNITS))
+    db.add_file(run_id, 'c.nc', get_result('lpjml'))
+    db.add_file(run_id, 'd.nc', get_result('lpjml', WRONG_UNITS, INFO))
+
+    # the files are compared with their previous result, infos do not count
+    assert db.get_last_run() == run_id
+    assert db.get_changes(run_id) == {
+        'worse': [('b.nc', [('errors', 'check_units', 'Units of "%s" are wrong.', 'Units of "tas" are wrong.')])],
+        'better': [('a.nc', [('warnings', 'check_zip', 'Variable "%s" is not compressed.',
+                              'Variable "tas" is not compressed.')])],
+        'new': ['c.nc']
+    }
+
+
+def test_runs(db):
+    first = db.start_run()
+    db.add_file(first, 'a.nc', get_result('h08', NOT_COMPRESSED, WRONG_UNITS))
+    db.add_file(first, 'b.nc', get_result('h08', NOT_COMPRESSED))
+    db.finish_run(first)
+    second = db.start_run()
+
+    runs = list(db.get_runs())
+    assert [run[0] for run in runs] == [first, second]
+    assert runs[0][2] is not None and runs[1][2] is None
+    assert runs[0][4:] == (2, {'warnings': 2, 'errors': 1, 'criticals': 0})
+    assert runs[1][4:] == (0, {'warnings': 0, 'errors': 0, 'criticals': 0})
+    assert [run[0] for run in db.get_runs(limit=1)] == [second]
+
+
+def test_failing(db):
+    run_id = db.start_run()
+    db.add_file(run_id, 'a.nc', get_result('h08', NOT_COMPRESSED))
+    db.add_file(run_id, 'b.nc', get_result('h08', NOT_COMPRESSED))
+    db.add_file(run_id, 'c.nc', get_result('lpjml', NOT_COMPRESSED))
+    db.add_file(run_id, 'd.nc', get_result('lpjml'))
+    db.add_file(run_id, 'e.nc', get_result('watergap', WRONG_UNITS))
+
+    # only the latest result of every file counts
+    run_id = db.start_run()
+    db.add_file(run_id, 'b.nc', get_result('h08'))
+
+    assert db.get_failing('check_zip') == [('h08', 1, 2), ('lpjml', 1, 2)]
+    assert db.get_failing('check_zip', by='variable') == [('tas', 2, 5)]
+    assert db.get_failing('check_units', by='model') == [('watergap', 1, 1)]
+
+    with pytest.raises(ValueError):
+        db.get_failing('check_zip', by='start_year')
+
+
+def test_commit_interval(db, monkeypatch):
+    monkeypatch.setattr(results, 'COMMIT_INTERVAL', 2)
+    run_id = db.start_run()
+
+    def count_files():
+        with sqlite3.connect(str(db.db_path)) as connection:
+            return connection.execute('SELECT COUNT(*) FROM files').fetchone()[0]
+
+    # the files are committed in batches
+    db.add_file(run_id, 'a.nc', get_result('h08'))
+    assert count_files() == 0
+    db.add_file(run_id, 'b.nc', get_result('h08'))
+    assert count_files() == 2
+    db.add_file(run_id, 'c.nc', get_result('h08'))
+    db.finish_run(run_id)
+    assert count_files() == 3
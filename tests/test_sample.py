@@ -0,0 +1,92 @@
+from collections import Counter
+
+import numpy as np
+import pytest
+
+from isimip_qc.utils.sample import get_samples, iter_samples, wilson_interval
+
+
+@pytest.mark.parametrize('shape, size, steps', [
+    ((100, 3, 6), 10, 10),
+    ((100, 3, 6), 2, 2),
+    ((100, 3, 6), 1, 2),
+    ((5, 3, 6), 10, 5),
+    ((2, 3, 6), 10, 2),
+    ((1, 3, 6), 10, 1)
+])
+def test_get_samples(shape, size, steps):
+    samples = get_samples(shape, size, 'file.nc')
+    time_steps = [index[0].start for index in samples]
+
+    # the first and the last time step are always part of the sample
+    assert len(samples) == steps
+    assert time_steps == sorted(set(time_steps))
+    assert time_steps[0] == 0
+    assert time_steps[-1] == shape[0] - 1
+    for index in samples:
+        assert index[0].stop == index[0].start + 1
+        assert index[1:] == (slice(None), slice(None))
+
+
+def test_get_samples_seed():
+    shape = (1000, 3, 6)
+    assert get_samples(shape, 20, 'a.nc') == get_samples(shape, 20, 'a.nc')
+    assert get_samples(shape, 20, 'a.nc') != get_samples(shape, 20, 'b.nc')
+
+
+def test_get_samples_levels():
+    samples = get_samples((1000, 4, 3, 6), 42, 'file.nc')
+
+    # the first and the last time step are read completely, the levels of the others are stratified
+    assert samples[0][1] == samples[-1][1] == slice(None)
+    levels = Counter(index[1].start for index in samples[1:-1])
+    assert sorted(levels) == [0, 1, 2, 3]
+    assert sorted(levels.values()) == [10, 10, 10, 10]
+
+
+class Variable(object):
+
+    name = 'tas'
+
+    def __init__(self, data):
+        self.data = data
+        self.shape = data.shape
+
+    def __getitem__(self, index):
+        return self.data[index]
+
+
+class Reader(object):
+
+    def __init__(self, data):
+        self.data = data
+        self.reads = []
+
+    def read(self, index):
+        self.reads.append(index)
+        return self.data[index]
+
+
+def test_iter_samples():
+    data = np.arange(20 * 3 * 6).reshape(20, 3, 6)
+    variable = Variable(data)
+    samples = list(iter_samples(variable, 5, 'file.nc'))
+
+    assert [index for index, _ in samples] == get_samples(data.shape, 5, 'file.nc')
+    for index, values in samples:
+        assert (values == data[index]).all()
+
+    # with a reader (e.g. --read-threads), the sample is read by the reader
+    reader = Reader(data)
+    assert [index for index, _ in iter_samples(variable, 5, 'file.nc', reader)] == reader.reads
+
+
+@pytest.mark.parametrize('count, total, lower, upper', [
+    (0, 0, 0.0, 1.0),
+    (0, 10, 0.0, 0.2775),
+    (10, 10, 0.7225, 1.0),
+    (5, 10, 0.2366, 0.7634),
+    (50, 100, 0.4038, 0.5962)
+])
+def test_wilson_interval(count, total, lower, upper):
+    assert wilson_interval(count, total) == pytest.approx((lower, upper), abs=1e-4)
@@ -0,0 +1,93 @@
+import json
+import os
+
+import pytest
+
+from isimip_qc.utils.schedule import HEADER_TIME, Progress, Timings, estimate_cost, format_duration
+
+
+def test_estimate_cost(make_netcdf, tmp_path):
+    file_path = make_netcdf('tas.nc', chunksizes=(1, 3, 6))
+
+    header = estimate_cost(file_path)
+    assert HEADER_TIME < header < HEADER_TIME + 0.001
+    assert estimate_cost(file_path, 'tas', data=True) > header
+    assert estimate_cost(file_path, None, data=True) > header
+    assert estimate_cost(tmp_path / 'missing.nc', 'tas', data=True) == HEADER_TIME
+
+
+@pytest.fixture
+def files(tmp_path):
+    file_paths = [tmp_path / 'a.nc', tmp_path / 'b.nc']
+    for file_path in file_paths:
+        file_path.write_bytes(b'data')
+    return file_paths
+
+
+def test_timings(tmp_path, files):
+    timings_path = tmp_path / 'timings.json'
+    a, b = files
+
+    timings = Timings(timings_path, 'minmax')
+    assert timings.predict(a, 10) == 10
+    timings.record(a, 10, 20)
+    assert timings.predict(b, 10) == 20
+    timings.save()
+
+    # in the next run, unchanged files are predicted with their last duration,
+    # the others with the ratio of the previous run
+    timings = Timings(timings_path, 'minmax')
+    assert timings.predict(a, 10) == 20
+    assert timings.predict(b, 10) == 20
+    a.write_bytes(b'more data')
+    assert timings.predict(a, 5) == 10
+    b.write_bytes(b'data')
+    os.utime(b, (0, 0))
+    assert timings.predict(b, 5) == 10
+
+    # the ratio is kept per mode and merged with the ratio of the current run
+    assert Timings(timings_path, 'header').predict(b, 10) == 10
+    timings.record(b, 10, 40)
+    timings.save()
+    assert json.loads(timings_path.read_text())['ratios'] == {'minmax': 3.0}
+    assert not list(tmp_path.glob('.timings.json*'))
+
+
+def test_timings_broken(tmp_path, files):
+    timings_path = tmp_path / 'timings.json'
+    timings_path.write_text('{')
+
+    timings = Timings(timings_path, 'minmax')
+    assert timings.predict(files[0], 10) == 10
+
+    # without --timings nothing is written
+    timings = Timings(None, 'minmax')
+    timings.record(files[0], 10, 20)
+    timings.save()
+    assert timings.predict(files[1], 10) == 20
+
+
+def test_progress():
+    progress = Progress([10, 20, 30, 40], jobs=2)
+    assert progress.eta == 50
+
+    # the remaining prediction is corrected by the ratio of the files done so far
+    progress.update(10, 20)
+    assert progress.eta == 90
+    progress.update(20, 15)
+    assert progress.eta == 70 * 35 / 30 / 2
+
+    progress.update(30, 30)
+    progress.update(40, 40)
+    progress.update(10, 10)
+    assert progress.eta == 0
+
+
+@pytest.mark.parametrize('seconds, duration', [
+    (0, '0:00:00'),
+    (59.6, '0:01:00'),
+    (3725, '1:02:05'),
+    (90000, '25:00:00')
+])
+def test_format_duration(seconds, duration):
+    assert format_duration(seconds) == duration
@@ -0,0 +1,155 @@
+from functools import reduce
+from operator import mul
+
+import netCDF4
+import numpy as np
+import pytest
+
+from isimip_qc.utils.slabs import (SLAB_OVERHEAD, ReadPlan, get_chunk_shape, get_chunk_slabs, get_offset,
+                                  get_read_plan, get_slabs, iter_slabs, parse_size)
+
+
+def get_coverage(shape, slabs):
+    coverage = np.zeros(shape, dtype=int)
+    for index in slabs:
+        coverage[index] += 1
+    return coverage
+
+
+def get_bytes(index, shape, itemsize):
+    return reduce(mul, (len(range(*i.indices(size))) for i, size in zip(index, shape)), 1) * itemsize
+
+
+@pytest.mark.parametrize('size, result', [
+    (1024, 1024),
+    ('512', 512 * 1024 ** 2),
+    ('512K', 512 * 1024),
+    ('1.5g', int(1.5 * 1024 ** 3)),
+    ('2GB', 2 * 1024 ** 3),
+    (' 1 T ', 1024 ** 4)
+])
+def test_parse_size(size, result):
+    assert parse_size(size) == result
+
+
+@pytest.mark.parametrize('size', ['', 'G', '-1G', '2X', '1 2'])
+def test_parse_size_invalid(size):
+    with pytest.raises(ValueError):
+        parse_size(size)
+
+
+@pytest.mark.parametrize('shape, chunk_shape, max_bytes', [
+    ((12, 6, 8), (1, 6, 8), 4 * 48 * 3),
+    ((12, 6, 8), (12, 6, 8), 4 * 48 * 5),
+    ((3, 6, 8), (1, 6, 8), 4 * 5)
+])
+def test_get_slabs(shape, chunk_shape, max_bytes):
+    slabs = list(get_slabs(shape, chunk_shape, 4, max_bytes))
+
+    assert (get_coverage(shape, slabs) == 1).all()
+    for index in slabs:
+        assert get_bytes(index, shape, 4) <= max_bytes
+
+
+
+
+def test_get_slabs_rows():
+    # a single time step exceeds the budget, so the slabs are rows of a time step
+    slabs = list(get_slabs((2, 6, 8), (1, 6, 8), 4, 4 * 8 * 2))
+
+    assert slabs[:3] == [(slice(0, 1), slice(0, 2), slice(None)), (slice(0, 1), slice(2, 4), slice(None)),
+                         (slice(0, 1), slice(4, 6), slice(None))]
+    assert len(slabs) == 6
+
+
+def test_get_slabs_chunks():
+    # the slabs are multiples of the chunk size, where the budget permits
+    slabs = list(get_slabs((12, 6, 8), (4, 6, 8), 4, 4 * 48 * 10))
+
+    assert [index[0] for index in slabs] == [slice(0, 8), slice(8, 12)]
+
+
+@pytest.mark.parametrize('shape, chunk_shape, max_bytes', [
+    ((12, 6, 8), (1, 6, 8), 4 * 48 * 3),
+    ((12, 6, 8), (12, 1, 1), 4 * 12 * 5),
+    ((10, 7, 9), (4, 3, 4), 4 * 4 * 3 * 4 * 2),
+    ((10, 7, 9), (10, 7, 9), 10 ** 6),
+    ((5, 7, 9), (1, 1, 1), 4)
+])
+def test_get_chunk_slabs(shape, chunk_shape, max_bytes):
+    slabs = list(get_chunk_slabs(shape, chunk_shape, 4, max_bytes))
+
+    # every element is part of exactly one slab
+    assert (get_coverage(shape, slabs) == 1).all()
+
+    for index in slabs:
+        assert get_bytes(index, shape, 4) <= max_bytes
+        # the slabs consist of whole chunks (or the remainder at the end of an axis)
+        for i, size, chunk_size in zip(index, shape, chunk_shape):
+            assert i.start % chunk_size == 0
+            assert i.stop == size or i.stop % chunk_size == 0
+
+
+def test_get_chunk_slabs_time_series():
+    # for time series chunks, a slab spans all time steps of a few rows
+    slabs = list(get_chunk_slabs((12, 6, 8), (12, 1, 1), 4, 4 * 12 * 8 * 2))
+
+    assert slabs == [(slice(0, 12), slice(start, start + 2), slice(0, 8)) for start in range(0, 6, 2)]
+
+
+def test_read_plan_aligned():
+    plan = ReadPlan((12, 6, 8), (12, 1, 1), 4, 4 * 12 * 8 * 2 * SLAB_OVERHEAD)
+
+    assert plan.aligned
+    assert plan.reads == 1.0
+    assert plan.cache_size is None
+    assert (get_coverage(plan.shape, plan.slabs) == 1).all()
+
+
+def test_read_plan_cache():
+    # a chunk does not fit into a slab, but a row of chunks fits into the chunk cache
+    plan = ReadPlan((24, 6, 8), (12, 6, 8), 4, 4 * 12 * 6 * 8 * 2)
+
+    assert not plan.aligned
+    assert plan.cache_chunks == 1
+    assert plan.cache_size == 4 * 12 * 6 * 8
+    assert plan.max_bytes == 4 * 4 * 6 * 8
+    assert plan.reads == 1.0
+    assert (get_coverage(plan.shape, plan.slabs) == 1).all()
+
+
+def test_read_plan_reads():
+    # neither a chunk nor a row of chunks fits, chunks are decompressed several times
+    plan = ReadPlan((12, 6, 8), (12, 6, 8), 4, 4 * 48 * SLAB_OVERHEAD)
+
+    assert not plan.aligned
+    assert plan.cache_size is None
+    assert plan.reads == 12.0
+    assert (get_coverage(plan.shape, plan.slabs) == 1).all()
+
+
+@pytest.mark.parametrize('chunksizes, data_model, chunk_shape', [
+    ((1, 3, 6), 'NETCDF4_CLASSIC', (1, 3, 6)),
+    (None, 'NETCDF3_CLASSIC', (1, 1, 1))
+])
+def test_get_chunk_shape(make_netcdf, chunksizes, data_model, chunk_shape):
+    with netCDF4.Dataset(make_netcdf('tas.nc', chunksizes=chunksizes, data_model=data_model)) as dataset:
+        assert get_chunk_shape(dataset.variables['tas']) == chunk_shape
+
+
+def test_iter_slabs(make_netcdf):
+    data = np.arange(4 * 3 * 6, dtype=np.float32).reshape(4, 3, 6)
+    data[1, 1, 1] = 1e20
+
+    with netCDF4.Dataset(make_netcdf('tas.nc', data, chunksizes=(1, 3, 6))) as dataset:
+        variable = dataset.variables['tas']
+        plan = get_read_plan(variable, 4 * 18 * 2 * SLAB_OVERHEAD)
+
+        result = np.ma.zeros(variable.shape)
+        for index, values in iter_slabs(variable, plan):
+            assert values.shape[0] == 2
+            assert get_offset(index) == (index[0].start, 0, 0)
+            result[index] = values
+
+    assert (result == np.ma.masked_values(data, 1e20)).all()
+    assert result.mask[1, 1, 1]
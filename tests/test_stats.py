@@ -0,0 +1,71 @@
+import numpy as np
+import pytest
+
+from isimip_qc.utils.stats import THRESHOLD, TimeSeries, get_weights, get_z_scores
+
+
+def get_steps(series):
+    return list(np.flatnonzero(np.abs(np.nan_to_num(get_z_scores(series))) > THRESHOLD))
+
+
+@pytest.mark.parametrize('seed', range(10))
+def test_get_z_scores_noise(seed):
+    # a long series of independent noise has no discontinuities
+    assert get_steps(np.random.default_rng(seed).normal(size=36500)) == []
+
+
+def test_get_z_scores_outliers():
+    # single outliers change the level only for one time step
+    series = np.random.default_rng(0).normal(size=300)
+    series[100] += 50
+    series[200] -= 50
+
+    assert get_steps(series) == []
+
+
+def test_get_z_scores_step():
+    series = np.random.default_rng(0).normal(size=300)
+    series[150:] += 20
+
+    assert get_steps(series) == [150]
+
+
+def test_get_z_scores_seasonal_cycle():
+    steps = np.arange(600)
+    series = 10 * np.sin(2 * np.pi * steps / 12) + np.random.default_rng(0).normal(size=600) * 0.3
+    assert get_steps(series) == []
+
+    series[300:] += 40
+    assert get_steps(series) == [300]
+
+
+def test_get_z_scores_trend():
+    # a constant trend is no discontinuity, a jump on top of it is
+    series = 0.1 * np.arange(200)
+    assert get_steps(series) == []
+
+    series[120:] += 5
+    assert get_steps(series) == [120]
+
+
+def test_get_z_scores_short():
+    assert np.isnan(get_z_scores(np.array([1.0]))).all()
+    assert np.isnan(get_z_scores(np.arange(8.0))).all()
+
+
+def test_time_series():
+    # slabs with several time steps and with parts of a time step
+    values = np.arange(4 * 3 * 2, dtype=np.float32).reshape(4, 3, 2)
+    valid = np.ones(values.shape, dtype=bool)
+    valid[1, 0, 0] = False
+
+    series = TimeSeries(4, get_weights(np.array([0.0, 60.0, 90.0])))
+    series.update((slice(0, 2), slice(None), slice(None)), values[:2], valid[:2])
+    series.update((slice(2, 3), slice(0, 2), slice(None)), values[2:3, :2], valid[2:3, :2])
+    series.update((slice(2, 3), slice(2, 3), slice(None)), values[2:3, 2:], valid[2:3, 2:])
+
+    assert list(series.count) == [6, 5, 6, 0]
+    assert list(series.minimum[:3]) == [0, 7, 12]
+    assert list(series.maximum[:3]) == [5, 11, 17]
+    assert series.mean[0] == pytest.approx((1 * 0.5 + 0.5 * 2.5) / 1.5)
+    assert np.isnan(series.mean[3])
@@ -0,0 +1,58 @@
+from isimip_qc.utils.summary import Summary
+
+NOT_COMPRESSED = ('warnings', 'check_zip', 'Variable "%s" is not compressed.')
+WRONG_UNITS = ('errors', 'check_units', 'Units of "%s" are wrong.')
+
+
+def test_add():
+    summary = Summary()
+    summary.add('a.nc', {'model': 'h08', 'variable': 'qtot'}, [NOT_COMPRESSED, NOT_COMPRESSED, WRONG_UNITS])
+    summary.add('b.nc', {'model': 'lpjml', 'variable': 'qtot'}, [NOT_COMPRESSED], bytes_saved=1024)
+    summary.add('c.nc', {}, [])
+
+    assert summary.files == 3
+    assert summary.files_by_level == {'criticals': 0, 'errors': 1, 'warnings': 2, 'infos': 0}
+    assert (summary.bytes_saved, summary.files_rewritten) == (1024, 1)
+
+    # findings are counted every time, files and specifiers only once per file
+    group = summary.groups[NOT_COMPRESSED]
+    assert (group.count, group.files) == (3, 2)
+    assert group.examples == ['a.nc', 'b.nc']
+    assert group.specifiers == {'model': {'h08', 'lpjml'}, 'variable': {'qtot'}}
+
+
+def test_bounds():
+    # the memory is bounded independent of the number of files and findings
+    summary = Summary()
+    summary.MAX_GROUPS = 2
+
+    for i in range(100):
+        summary.add('{}.nc'.format(i), {'model': 'model{}'.format(i)},
+                    [NOT_COMPRESSED, WRONG_UNITS, ('infos', None, 'Message {}'.format(i))])
+
+    assert len(summary.groups) == 2
+    assert summary.dropped == 100
+    for group in summary.groups.values():
+        assert (group.count, group.files) == (100, 100)
+        assert len(group.examples) == Summary.MAX_EXAMPLES
+        assert len(group.specifiers['model']) == Summary.MAX_VALUES
+        assert group.truncated == {'model'}
+
+
+def test_print(capsys):
+    summary = Summary()
+    summary.MAX_GROUPS = 1
+    summary.add('a.nc', {'model': 'h08'}, [NOT_COMPRESSED, WRONG_UNITS], bytes_saved=2 * 1024 ** 2)
+    summary.add('b.nc', {'model': 'lpjml'}, [NOT_COMPRESSED])
+    summary.print()
+
+    assert capsys.readouterr().out.splitlines() == [
+        'SUMMARY   : 2 files checked, 0 with criticals, 1 with errors, 2 with warnings',
+        '            2.0 MB saved by rewriting 1 files with --fix-datamodel',
+        ' WARNING  : Variable "%s" is not compressed.',
+        '            2 times in 2 files (check_zip)',
+        '            model: h08, lpjml',
+        '            e.g. a.nc',
+        '            e.g. b.nc',
+        ' 1 further findings were not aggregated (more than 1 different messages).'
+    ]
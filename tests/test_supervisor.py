@@ -0,0 +1,70 @@
+import os
+import time
+
+from isimip_qc.utils.supervisor import Supervisor
+
+
+def get_pid(item):
+    return os.getpid()
+
+
+def sleep(item):
+    time.sleep(item)
+    return item
+
+
+def fail(item):
+    if item == 'fail':
+        raise ValueError(item)
+    return os.getpid()
+
+
+def crash(item):
+    if item == 'crash':
+        os._exit(3)
+    return item
+
+
+def allocate(item):
+    return len(bytearray(item))
+
+
+def run(supervisor, function, items):
+    return {item: (status, value) for item, status, value, duration in supervisor.map(function, items)}
+
+
+def test_done_reuses_worker():
+    results = run(Supervisor(1), get_pid, ['a', 'b', 'c'])
+
+    assert {status for status, value in results.values()} == {'done'}
+    assert len({value for status, value in results.values()}) == 1
+
+
+def test_timeout():
+    results = run(Supervisor(2, timeout=0.5), sleep, [0, 10, 0.1])
+
+    assert results[0] == ('done', 0)
+    assert results[10] == ('timeout', 0.5)
+    assert results[0.1] == ('done', 0.1)
+
+
+def test_error_replaces_worker():
+    results = run(Supervisor(1), fail, ['a', 'fail', 'b'])
+
+    assert results['fail'] == ('error', "ValueError('fail')")
+    assert results['a'][0] == results['b'][0] == 'done'
+    assert results['a'][1] != results['b'][1]
+
+
+def test_crashed():
+    results = run(Supervisor(1), crash, ['crash', 'a'])
+
+    assert results['crash'] == ('crashed', 'exit code 3')
+    assert results['a'] == ('done', 'a')
+
+
+def test_memory():
+    results = run(Supervisor(1, memory_limit=512 * 1024 * 1024), allocate, [2 * 1024 * 1024 * 1024, 1024])
+
+    assert results[2 * 1024 * 1024 * 1024] == ('memory', 512 * 1024 * 1024)
+    assert results[1024] == ('done', 1024)
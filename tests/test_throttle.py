@@ -0,0 +1,126 @@
+import multiprocessing
+import os
+import threading
+
+import netCDF4
+import numpy as np
+import pytest
+
+from isimip_qc.config import Settings
+from isimip_qc.utils import throttle
+from isimip_qc.utils.throttle import IOGovernor, get_storage_ratio
+
+
+class Clock(object):
+
+    def __init__(self):
+        self.now = 1000.0
+        self.slept = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(throttle, 'time', clock)
+    return clock
+
+
+def test_consume(clock):
+    governor = IOGovernor(rate=100)
+
+    # the bucket holds one second of the rate
+    assert governor.consume(60) == 0
+    assert governor.consume(60) == pytest.approx(0.2)
+    assert governor.consume(50) == pytest.approx(0.5)
+    assert clock.slept == [pytest.approx(0.2), pytest.approx(0.5)]
+
+    # the bucket is refilled while no bytes are read, but not beyond the rate
+    clock.now += 10
+    assert governor.consume(100) == 0
+    assert governor.consume(10) == pytest.approx(0.1)
+
+    assert governor.total_bytes == 280
+    assert governor.total_waited == pytest.approx(0.8)
+    assert governor.throughput == pytest.approx(280 / (10 + 0.8))
+
+
+def test_consume_without_rate(clock):
+    governor = IOGovernor(max_opens=1)
+
+    assert governor.consume(1024 ** 3) == 0
+    assert governor.total_bytes == 1024 ** 3
+    assert not clock.slept
+
+
+def test_acquire_release():
+    assert IOGovernor().acquire() is None
+
+    governor = IOGovernor(max_opens=2)
+    first, second = governor.acquire(), governor.acquire()
+    assert {first, second} == {0, 1}
+
+    # a third reader waits until a slot is released
+    acquired = []
+    thread = threading.Thread(target=lambda: acquired.append(governor.acquire()))
+    thread.start()
+    thread.join(0.2)
+    assert not acquired
+
+    governor.release(second)
+    thread.join(5)
+    assert acquired == [second]
+
+    governor.release(first)
+    governor.release(None)
+    with governor.opened():
+        assert list(governor.slots).count(0) == 0
+    assert list(governor.slots).count(0) == 1
+
+
+def test_acquire_dead_process():
+    # the slot of a process which was killed while holding it is freed
+    governor = IOGovernor(max_opens=1)
+    process = multiprocessing.get_context('fork').Process(target=governor.acquire)
+    process.start()
+    process.join()
+
+    assert governor.slots[0] == process.pid
+    assert governor.acquire() == 0
+    assert governor.slots[0] == os.getpid()
+
+
+def test_get_storage_ratio(make_netcdf, tmp_path):
+    data = np.zeros((100, 30, 60), dtype=np.float32)
+    for name, data_model, compressed in [('tas.nc', 'NETCDF4_CLASSIC', True), ('pr.nc', 'NETCDF4', False)]:
+        file_path = make_netcdf(name, data, data_model=data_model)
+        with netCDF4.Dataset(file_path) as dataset:
+            ratio = get_storage_ratio(file_path, dataset.variables[file_path.stem])
+            assert (ratio < 0.5) if compressed else (ratio == 1.0)
+
+            assert get_storage_ratio(tmp_path / 'missing.nc', dataset.variables[file_path.stem]) == 1.0
+
+
+@pytest.mark.parametrize('io_limit, max_opens, rate', [
+    (None, None, None),
+    ('100', None, 100 * 1024 ** 2),
+    ('500K/s', '4', 500 * 1024),
+    ('0', None, 0),
+    (None, '4', 0)
+])
+def test_setup_governor(io_limit, max_opens, rate):
+    settings = Settings(shared=False)
+    settings.IO_LIMIT, settings.MAX_OPENS = io_limit, max_opens
+    settings.setup_governor()
+
+    if rate is None:
+        assert settings.IO_GOVERNOR is None
+    else:
+        assert settings.IO_GOVERNOR.rate == rate
+        assert settings.IO_GOVERNOR.max_opens == int(max_opens or 0)
@@ -0,0 +1,103 @@
+import pytest
+
+from isimip_qc.utils import watch
+from isimip_qc.utils.watch import watch_files
+
+
+class Idle(Exception):
+    pass
+
+
+class Clock(object):
+    # a fake time module, sleep advances the time and raises Idle when
+    # nothing was yielded for a while
+
+    def __init__(self):
+        self.now = 1000.0
+        self.idle = 0
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+        self.idle += seconds
+        if self.idle > 300:
+            raise Idle()
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(watch, 'time', clock)
+    return clock
+
+
+def next_file(files, clock):
+    clock.idle = 0
+    start = clock.now
+    file_path = next(files)
+    return file_path.name, clock.now - start
+
+
+def test_settle(tmp_path, clock):
+    (tmp_path / 'a.nc').write_bytes(b'a')
+    (tmp_path / '.a.nc.partial').write_bytes(b'a')
+
+    files = watch_files(tmp_path, settle=5, interval=20, poll=True)
+
+    # the file is yielded once it was unchanged for settle seconds
+    file_name, seconds = next_file(files, clock)
+    assert file_name == 'a.nc'
+    assert 5 <= seconds < 10
+
+    # the hidden file is ignored and the checked file is not yielded again
+    with pytest.raises(Idle):
+        next_file(files, clock)
+
+
+def test_changed(tmp_path, clock, monkeypatch):
+    file_path = tmp_path / 'a.nc'
+    file_path.write_bytes(b'a')
+
+    files = watch_files(tmp_path, settle=5, interval=20, poll=True)
+    assert next_file(files, clock)[0] == 'a.nc'
+
+    # changes during the check (e.g. by --fix) do not trigger a second check
+    file_path.write_bytes(b'aa')
+    with pytest.raises(Idle):
+        next_file(files, clock)
+
+    # changes after the check and new files are found by the next scan
+    files = watch_files(tmp_path, settle=5, interval=20, poll=True)
+    assert next_file(files, clock)[0] == 'a.nc'
+
+    sleep = clock.sleep
+
+    def change(seconds):
+        sleep(seconds)
+        if not (tmp_path / 'b.nc').exists():
+            file_path.write_bytes(b'aaa')
+            (tmp_path / 'b.nc').write_bytes(b'b')
+
+    monkeypatch.setattr(clock, 'sleep', change)
+    assert next_file(files, clock)[0] == 'a.nc'
+    assert next_file(files, clock)[0] == 'b.nc'
+
+
+def test_growing(tmp_path, clock, monkeypatch):
+    file_path = tmp_path / 'a.nc'
+    file_path.write_bytes(b'a')
+
+    # the file grows during the first 10 seconds, e.g. while it is uploaded
+    sleep = clock.sleep
+
+    def upload(seconds):
+        sleep(seconds)
+        if clock.now <= 1010:
+            file_path.write_bytes(b'a' * int(clock.now))
+
+    monkeypatch.setattr(clock, 'sleep', upload)
+
+    files = watch_files(tmp_path, settle=5, interval=20, poll=True)
+    assert next_file(files, clock) == ('a.nc', 15.0)
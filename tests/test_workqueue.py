@@ -0,0 +1,114 @@
+import time
+
+import pytest
+
+from isimip_qc.utils import workqueue
+from isimip_qc.utils.workqueue import WorkQueue
+
+
+class Clock(object):
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(workqueue, 'time', clock)
+    return clock
+
+
+@pytest.fixture
+def queues(tmp_path, clock):
+    # two workers of the same queue
+    queue_path = tmp_path / 'queue.sqlite'
+    first, second = WorkQueue(queue_path, lease=60), WorkQueue(queue_path, lease=60)
+    first.worker, second.worker = 'node1:1', 'node2:1'
+    return first, second
+
+
+def test_submit_claim_complete(queues):
+    first, second = queues
+
+    assert first.submit(['a.nc', 'b.nc']) == 2
+    assert first.submit(['a.nc', 'c.nc']) == 1
+
+    assert first.claim() == 'a.nc'
+    assert second.claim() == 'b.nc'
+    assert first.counts() == {'claimed': 2, 'pending': 1}
+
+    first.complete('a.nc', {'findings': []})
+    second.complete('b.nc', {'findings': ['x']})
+    assert first.claim() == 'c.nc'
+    first.complete('c.nc', {'findings': []})
+
+    assert second.claim() is None
+    assert second.is_finished
+    assert list(second.results()) == [
+        ('a.nc', 'done', 1, {'findings': []}),
+        ('b.nc', 'done', 1, {'findings': ['x']}),
+        ('c.nc', 'done', 1, {'findings': []})
+    ]
+
+
+def test_lease_expiry(queues, clock):
+    # the file of a crashed worker is claimed again after the lease expired
+    first, second = queues
+    first.submit(['a.nc'])
+
+    assert first.claim() == 'a.nc'
+    assert second.claim() is None
+    assert not second.is_finished
+
+    clock.now += 61
+    assert second.claim() == 'a.nc'
+
+    # the result of the first worker is discarded
+    first.complete('a.nc', {'worker': 'first'})
+    second.complete('a.nc', {'worker': 'second'})
+    assert list(first.results()) == [('a.nc', 'done', 2, {'worker': 'second'})]
+
+
+def test_renew(queues, clock):
+    first, second = queues
+    first.submit(['a.nc'])
+    first.claim()
+
+    clock.now += 50
+    first.renew('a.nc')
+    clock.now += 50
+    assert second.claim() is None
+
+    # only the worker which holds the lease can renew it
+    clock.now += 11
+    second.renew('a.nc')
+    assert second.claim() == 'a.nc'
+
+
+def test_max_attempts(queues, clock):
+    first, second = queues
+    first.submit(['a.nc'])
+
+    for i in range(WorkQueue.MAX_ATTEMPTS):
+        assert first.claim() == 'a.nc'
+        clock.now += 61
+
+    assert second.claim() is None
+    assert first.counts() == {'failed': 1}
+    assert first.is_finished
+
+
+def test_heartbeat(tmp_path):
+    queue = WorkQueue(tmp_path / 'queue.sqlite', lease=0.3)
+    queue.submit(['a.nc'])
+    queue.claim()
+
+    with queue.heartbeat('a.nc'):
+        expires = queue.connection.execute('SELECT lease_expires FROM files').fetchone()[0]
+        time.sleep(0.25)
+
+    assert queue.connection.execute('SELECT lease_expires FROM files').fetchone()[0] > expires